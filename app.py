@@ -1,29 +1,42 @@
 #!/usr/bin/env python3
 import asyncio
+import hmac
+import json
 import logging
 import os
-import sys
+import signal
 import time
 import traceback
-from typing import List
+from typing import List, Optional
 
 import uvicorn
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, File, Request, UploadFile, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel
 
-from models.asr_model import SpeechModel
-from utils.audio_processor import AudioProcessor
-from utils.command_handler import CommandHandler
+from models.asr_model import DEFAULT_MODEL_PATH, SpeechModel
+from models.backends import BACKEND_KWS, BACKEND_SCRIPTED, BACKEND_VOSK
+from utils.batch_transcriber import BatchRunner, BatchSummary
+from utils.decode_executor import DecodeExecutor, OrderedDecoder
+from utils.ingest import AudioIngest
+from utils.log_pipeline import configure_logging, dropped_records
+from utils.metrics import MetricsRegistry
+from utils.model_loader import ModelLoader
+from utils.commit_policy import CommitPolicy
+from utils.model_manager import ModelManager
+from utils.outbound import MessageSender
+from utils.opus_codec import OPUS_AVAILABLE, OpusStreamDecoder
+from utils.stream_protocol import CODEC_OPUS, CODEC_PCM, ArrivalTracker, StreamConfig, is_end_message, split_frame
+from utils.worker_board import memory_usage
 
-# Configure logging
+# Configure logging: records are queued and written by a background thread
 log_level = os.environ.get("LOGLEVEL", "INFO").upper()
-logging.basicConfig(
-    level=getattr(logging, log_level),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[logging.StreamHandler(sys.stdout)]
-)
+log_format = os.environ.get("LOG_FORMAT", "text").lower()  # "text" or "json"
+log_queue_size = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+log_sample_every = int(os.environ.get("LOG_SAMPLE_EVERY", "50"))  # per-chunk DEBUG events kept, 1 in N
+configure_logging(log_level, fmt=log_format, queue_size=log_queue_size)
 logger = logging.getLogger(__name__)
 
 # Print startup confirmation
@@ -45,23 +58,107 @@ app.add_middleware(
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# Initialize models and utilities
-try:
-    logger.info("Initializing speech model...")
-    speech_model = SpeechModel()
-    logger.info("Speech model initialized successfully")
-    
-    logger.info("Initializing audio processor...")
-    audio_processor = AudioProcessor()
-    logger.info("Audio processor initialized successfully")
-    
-    logger.info("Initializing command handler...")
-    command_handler = CommandHandler()
-    logger.info("Command handler initialized successfully")
-except Exception as e:
-    logger.error(f"Error initializing models: {e}")
-    logger.error(traceback.format_exc())
-    speech_model, audio_processor, command_handler = None, None, None
+# Vosk model directory, defaults to models/data/vosk-model-small-en-us-0.15.
+# With the scripted backend a JSON script, defaults to the built-in one, and
+# with the keyword spotter its .npz model, defaults to models/data/kws-commands.npz.
+model_path = os.environ.get("MODEL_PATH") or None
+
+# "vosk", "kws" for the NumPy keyword spotter, or "scripted" for the deterministic
+# stand-in used in load tests without a model
+recognizer_backend = os.environ.get("RECOGNIZER_BACKEND", BACKEND_VOSK).lower()
+
+# CPU the stand-in burns per second of audio, and the silence after which it ends an utterance
+backend_options = {}
+if recognizer_backend == BACKEND_SCRIPTED:
+    backend_options = {
+        "cpu_per_second": float(os.environ.get("STANDIN_CPU_PER_SECOND", "0")),
+        "endpoint_seconds": float(os.environ.get("STANDIN_ENDPOINT_MS", "500")) / 1000,
+    }
+elif recognizer_backend == BACKEND_KWS:
+    # Keyword probability that reports a command, and how windows of all sessions are batched
+    backend_options = {
+        "threshold": float(os.environ.get("KWS_THRESHOLD", "0.8")),
+        "max_batch": int(os.environ.get("KWS_MAX_BATCH", "256")),
+        "max_delay_ms": float(os.environ.get("KWS_BATCH_DELAY_MS", "5")),
+    }
+
+# "full" for large-vocabulary decoding, "keyword" to restrict decoding to the command vocabulary
+recognizer_mode = os.environ.get("RECOGNIZER_MODE", SpeechModel.MODE_FULL).lower()
+
+# Optional JSON file with the command vocabulary, defaults to play/pause
+commands_config = os.environ.get("COMMANDS_CONFIG")
+
+# Maximum number of concurrent recognition sessions
+max_sessions = int(os.environ.get("MAX_SESSIONS", "100"))
+preload_sessions = int(os.environ.get("PRELOAD_SESSIONS", "0"))
+
+# Decoding runs on a worker pool so the event loop only moves bytes
+decode_workers = int(os.environ.get("DECODE_WORKERS", "0")) or None
+decode_queue_size = int(os.environ.get("DECODE_QUEUE_SIZE", "8"))
+
+# Ingest batches small frames and sheds audio only after waiting this long
+ingest_batch_bytes = int(os.environ.get("INGEST_BATCH_BYTES", "3200"))
+ingest_max_wait = float(os.environ.get("INGEST_MAX_WAIT", "2.0"))
+ingest_max_age = float(os.environ.get("INGEST_MAX_AGE_MS", "200")) / 1000 or None
+
+# Commands are sent from partial results once a word survives this many partials or reaches
+# the confidence, and the recognizer is made to finalize when the voice activity detector sees speech end
+commit_stable_partials = int(os.environ.get("COMMIT_STABLE_PARTIALS", "2"))
+commit_min_confidence = float(os.environ["COMMIT_MIN_CONFIDENCE"]) if os.environ.get("COMMIT_MIN_CONFIDENCE") else None
+finalize_on_silence = os.environ.get("FINALIZE_ON_SILENCE", "true").lower() in ("1", "true", "yes")
+commit_policy = CommitPolicy(commit_stable_partials, commit_min_confidence, finalize_on_silence)
+
+# Partial results are merged into at most one frame per window, finals and commands go out at once
+partial_window = float(os.environ.get("PARTIAL_WINDOW_MS", "100")) / 1000
+
+# Audio encodings clients may negotiate in their hello, Opus needs opuslib and libopus
+audio_codecs = (CODEC_OPUS, CODEC_PCM) if OPUS_AVAILABLE else (CODEC_PCM,)
+
+# Worker processes for POST /transcribe, started on first use
+batch_workers = int(os.environ.get("BATCH_WORKERS", "0")) or None
+batch_runner = None
+
+# Set by serve.py in each forked worker, None when running as a single process
+worker_board = None
+worker_index = None
+worker_core = None
+
+# Per-session counters and histograms, aggregated when /metrics is scraped
+metrics = MetricsRegistry()
+metrics.add_callback("speech_log_records_dropped_total", "counter",
+                     "Log records dropped because the log queue was full", dropped_records)
+
+# Seconds a WebSocket waits for the model to finish loading before it is refused
+model_wait = float(os.environ.get("MODEL_WAIT_SECONDS", "0"))
+
+# Poll the model directory and vocabulary file this often and reload them when they change, 0 to disable
+model_watch = float(os.environ.get("MODEL_WATCH_SECONDS", "0"))
+
+# Bearer token for the /admin endpoints, which are disabled when unset
+admin_token = os.environ.get("ADMIN_TOKEN")
+
+decode_executor = DecodeExecutor(decode_workers)
+
+# Current model and vocabulary, replaced at runtime by reloads
+model_manager = ModelManager(
+    model_path,
+    commands_config,
+    mode=recognizer_mode,
+    max_sessions=max_sessions,
+    preload=preload_sessions,
+    metrics=metrics,
+    log_sample_every=log_sample_every,
+    commit_policy=commit_policy,
+    backend=recognizer_backend,
+    backend_options=backend_options,
+)
+metrics.add_callback("speech_model_generation", "gauge", "Generation number of the model serving new sessions",
+                     lambda: model_manager.current.generation if model_manager.current else 0)
+metrics.add_callback("speech_model_reloads_total", "counter", "Model and vocabulary reloads completed",
+                     lambda: model_manager.reloads)
+
+# The model loads in the background so the server answers /health and /ready at once
+model_loader = ModelLoader(model_manager.load)
 
 # Connection manager for WebSockets
 class ConnectionManager:
@@ -94,26 +191,264 @@ async def get():
 @app.get("/health")
 async def health():
     """Health check endpoint"""
-    return {"status": "ok", "message": "Server is running"}
+    return {
+        "status": "ok",
+        "message": "Server is running",
+        "model": model_loader.state,
+        "worker": worker_index,
+        "pid": os.getpid(),
+        "active_sessions": model_manager.active_sessions,
+        "max_sessions": max_sessions,
+    }
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 with model metadata once loaded, 503 with progress until then"""
+    status = model_loader.status()
+    current = model_manager.current
+    if current is not None:
+        # Describe the model serving new sessions, which changes with reloads
+        status["model"] = current.metadata
+        status["generation"] = current.generation
+    return JSONResponse(status, status_code=200 if model_loader.ready else 503)
+
+@app.on_event("startup")
+def start_model_loading():
+    """Load the model in the background, unless serve.py already loaded it"""
+    model_loader.start()
+
+@app.on_event("startup")
+def start_model_reloading():
+    """Watch the model files if configured, and reload them on SIGHUP"""
+    model_manager.watch(model_watch)
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, reload_on_signal)
+    except (AttributeError, NotImplementedError, RuntimeError):
+        pass
+
+def reload_on_signal():
+    """Reload the configured model and vocabulary from disk"""
+    logger.info("SIGHUP received, reloading model")
+    if not model_manager.reload():
+        logger.warning("Reload already in progress, ignoring SIGHUP")
+
+@app.on_event("shutdown")
+def stop_model_watch():
+    model_manager.stop_watching()
+
+class ReloadRequest(BaseModel):
+    """Body of POST /admin/reload, every field optional"""
+    model_path: Optional[str] = None       # new model directory, defaults to the current one
+    commands_config: Optional[str] = None  # new vocabulary file, defaults to the current one
+    wait: bool = False                     # answer once the reload has finished
+
+def admin_error(request: Request) -> Optional[JSONResponse]:
+    """Reject admin requests unless ADMIN_TOKEN is set and matches the bearer token"""
+    if not admin_token:
+        return JSONResponse({"error": "Admin API disabled, set ADMIN_TOKEN"}, status_code=403)
+    supplied = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+    if not hmac.compare_digest(supplied.encode(), admin_token.encode()):
+        return JSONResponse({"error": "Invalid admin token"}, status_code=401)
+    return None
+
+@app.get("/admin/models")
+async def admin_models(request: Request):
+    """Current and retiring model generations and the state of the last reload"""
+    error = admin_error(request)
+    if error is not None:
+        return error
+    return {"worker": worker_index, **model_manager.status()}
+
+@app.post("/admin/reload")
+async def admin_reload(request: Request, body: Optional[ReloadRequest] = None):
+    """
+    Load a new model and/or vocabulary in the background and switch new sessions to it
+    
+    Without a model_path the current model is reused and only the vocabulary
+    is rebuilt, unless neither field is given, which reloads both from disk.
+    Under serve.py only the worker answering the request reloads; send
+    SIGHUP to serve.py or use MODEL_WATCH_SECONDS to reload every worker.
+    """
+    error = admin_error(request)
+    if error is not None:
+        return error
+    body = body or ReloadRequest()
+    
+    model_check = os.path.isdir if recognizer_backend == BACKEND_VOSK else os.path.isfile
+    for path, check in ((body.model_path, model_check), (body.commands_config, os.path.isfile)):
+        if path is not None and not check(path):
+            return JSONResponse({"error": f"Not found: {path}"}, status_code=400)
+    
+    if not model_loader.ready:
+        return JSONResponse({"error": f"Model {model_loader.state}, nothing to replace yet"}, status_code=409)
+    
+    reload_model = body.model_path is not None or body.commands_config is None
+    started = model_manager.reload(body.model_path, body.commands_config, reload_model=reload_model)
+    if not started:
+        return JSONResponse({"error": "Reload already in progress", **model_manager.status()}, status_code=409)
+    
+    if body.wait:
+        await asyncio.get_running_loop().run_in_executor(None, model_manager.wait_reload)
+        status = model_manager.status()
+        return JSONResponse({"worker": worker_index, **status},
+                            status_code=500 if status["reload"] == ModelManager.FAILED else 200)
+    return JSONResponse({"worker": worker_index, **model_manager.status()}, status_code=202)
+
+@app.get("/workers")
+async def workers():
+    """Health and load of every worker process, read from shared memory"""
+    if worker_board is None:
+        return {"workers": [{
+            "worker": 0,
+            "pid": os.getpid(),
+            "healthy": True,
+            "active_sessions": model_manager.active_sessions,
+            "max_sessions": max_sessions,
+            **memory_usage(include_pss=True),
+        }]}
+    return {"answered_by": worker_index, "workers": worker_board.snapshot()}
+
+async def report_worker_load(interval: float = 1.0, pss_every: int = 5):
+    """Publish this worker's heartbeat and load to the shared worker board"""
+    started_at = time.time()
+    beat = 0
+    while True:
+        try:
+            values = {
+                "pid": os.getpid(),
+                "core": worker_core if worker_core is not None else -1,
+                "started_at": started_at,
+                "heartbeat_at": time.time(),
+                "active_sessions": model_manager.active_sessions,
+                "max_sessions": max_sessions,
+                "decode_queue_depth": metrics.queue_depth(),
+                "sessions_served": model_manager.sessions_served,
+            }
+            # PSS needs a walk over the memory map, so it is refreshed less often
+            usage = memory_usage(include_pss=beat % pss_every == 0)
+            values["rss_bytes"] = usage["rss_bytes"]
+            if usage["pss_bytes"]:
+                values["pss_bytes"] = usage["pss_bytes"]
+            worker_board.update(worker_index, **values)
+        except Exception as e:
+            logger.error(f"Error reporting worker load: {e}")
+        beat += 1
+        await asyncio.sleep(interval)
+
+@app.on_event("startup")
+async def start_worker_reporting():
+    """Start the heartbeat when running as a worker under serve.py"""
+    if worker_board is not None:
+        app.state.load_reporter = asyncio.create_task(report_worker_load())
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus metrics for the streaming pipeline"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def get_batch_runner() -> BatchRunner:
+    """Start the batch transcription pool on first use"""
+    global batch_runner
+    if batch_runner is None:
+        batch_runner = BatchRunner(batch_workers, model_path=model_path, mode=recognizer_mode, commands_config=commands_config,
+                                   backend=recognizer_backend, backend_options=backend_options,
+                                   commit_policy=commit_policy)
+        logger.info(f"Batch transcription pool started with {batch_runner.workers} workers")
+    return batch_runner
+
+@app.on_event("shutdown")
+def shutdown_workers():
+    """Stop worker pools when the server exits"""
+    if batch_runner is not None:
+        batch_runner.shutdown()
+    if decode_executor is not None:
+        decode_executor.shutdown()
+
+@app.post("/transcribe")
+async def transcribe_files(files: List[UploadFile] = File(...)):
+    """
+    Transcribe recorded audio files offline
+    
+    Accepts WAV (16 kHz mono 16-bit) or raw PCM uploads, transcribes them on
+    the batch worker pool and streams one JSON line per file as results
+    complete, followed by a summary line with the throughput.
+    """
+    if model_loader.state == ModelLoader.FAILED:
+        # The workers would fail to load the same model
+        return JSONResponse(model_loader.status(), status_code=503)
+    
+    runner = get_batch_runner()
+    summary = BatchSummary()
+    futures = [asyncio.wrap_future(runner.submit_bytes(f.filename, await f.read())) for f in files]
+    
+    async def results():
+        for future in asyncio.as_completed(futures):
+            record = await future
+            summary.add(record)
+            yield json.dumps(record) + "\n"
+        yield json.dumps({"summary": summary.finish()}) + "\n"
+    
+    return StreamingResponse(results(), media_type="application/x-ndjson")
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket endpoint for real-time audio processing"""
     logger.info("WebSocket connection request received")
     
-    # Check if models are initialized properly
-    if speech_model is None or audio_processor is None or command_handler is None:
-        logger.error("Critical components not initialized properly")
+    # Optionally hold the connection while the model is still loading
+    if not model_loader.ready and model_loader.state == ModelLoader.LOADING and model_wait > 0:
+        await model_loader.wait_ready(model_wait)
+    
+    if not model_loader.ready:
+        # 1013: try again later, 1011: the server can't serve this request
+        failed = model_loader.state == ModelLoader.FAILED
+        logger.warning(f"Refusing WebSocket, model {model_loader.state}")
+        await websocket.accept()
+        await websocket.close(code=1011 if failed else 1013,
+                              reason="Model failed to load" if failed else "Model loading")
+        return
+    
+    # Each connection gets its own recognizer session, on the current model
+    generation, session = model_manager.acquire()
+    if session is None:
+        # 1013: try again later
+        await websocket.accept()
+        await websocket.close(code=1013, reason="Server at session capacity")
         return
     
+    # Results are sent as JSON messages, batched into one frame when they pile up
+    # and with bursts of partials merged
+    sender = MessageSender(websocket.send_text, metrics=session.metrics, partial_window=partial_window)
+    
+    # Decode on the worker pool, in order, with a bounded backlog
+    decoder = OrderedDecoder(
+        decode_executor,
+        session.process_chunk,
+        sender.push,
+        max_pending=decode_queue_size,
+    )
+    ingest = AudioIngest(decoder, batch_bytes=ingest_batch_bytes, max_wait=ingest_max_wait, max_age=ingest_max_age)
+    session.metrics.ingest = ingest.stats
+    session.metrics.queue_depth = lambda: decoder.pending
+    
+    # Every log line of this connection carries the session's trace ID
+    log = session.log
+    
+    # Raw PCM unless the client opens with a hello declaring another framing
+    stream = StreamConfig()
+    hello_seen = False
+    arrivals = None
+    opus = None
+    
+    # Set when the client ends its stream with {"type": "end"} and still waits for the last results
+    graceful = False
+    
     try:
         await manager.connect(websocket)
+        sender.start()
+        decoder.start()
         
-        # Last processed time to limit processing frequency
-        last_processed_time = 0
-        audio_process_count = 0
-        
-        logger.info("Starting WebSocket loop")
+        log.info("Starting WebSocket loop for session %s", session.session_id)
         
         while True:
             try:
@@ -123,175 +458,115 @@ async def websocket_endpoint(websocket: WebSocket):
                 # Process binary audio data
                 if "bytes" in data:
                     audio_data = data["bytes"]
-                    audio_process_count += 1
-                    
-                    # Log occasionally for debugging
-                    if audio_process_count % 100 == 0:
-                        logger.debug(f"Processed {audio_process_count} audio chunks")
-                    
-                    # Rate limiting
-                    current_time = int(time.time() * 1000)
-                    if current_time - last_processed_time < 50:
-                        continue
-                        
-                    last_processed_time = current_time
-                    
-                    # Process audio
-                    processed_audio = audio_processor.process_audio(audio_data)
-                    
-                    # Only process if we have enough audio data
-                    if processed_audio is not None and len(processed_audio) > 1600:
-                        # Get transcription
-                        text = speech_model.transcribe(processed_audio)
-                        
-                        # Process transcription results
-                        if text:
-                            logger.info(f"Transcription: {text}")
-                            
-                            # Check for commands
-                            command = command_handler.process_command(text)
-                            
-                            if command:
-                                logger.info(f"Command detected: {command}")
-                                await websocket.send_text(command)
-                            else:
-                                await websocket.send_text(text)
-                
-                # Handle disconnect message
-                elif "type" in data and data["type"] == "websocket.disconnect":
-                    logger.info("Received disconnect message from WebSocket")
-                    break
                     
-            except WebSocketDisconnect:
-                logger.info("WebSocket disconnected during receive")
-                break
-                
-            except RuntimeError as e:
-                if "disconnect message has been received" in str(e):
-                    logger.info("WebSocket already disconnected")
-                    break
-                else:
-                    logger.error(f"RuntimeError in websocket: {e}")
-                    logger.error(traceback.format_exc())
+                    seq = None
+                    if stream.framed:
+                        try:
+                            seq, sent_ms, audio_data = split_frame(audio_data)
+                        except ValueError as e:
+                            log.warning("Skipping malformed frame: %s", e)
+                            continue
+                        arrivals.observe(seq, sent_ms)
                     
-            except Exception as e:
-                logger.error(f"Error processing data: {e}")
-                logger.error(traceback.format_exc())
-                # Don't break on error, try to continue
-    
-    except Exception as e:
-        logger.error(f"Error in websocket connection: {e}")
-        logger.error(traceback.format_exc())
-    finally:
-        # Always clean up
-        manager.disconnect(websocket)
-        logger.info("WebSocket connection closed and cleaned up")
-
-
-    """WebSocket endpoint for real-time audio processing"""
-    logger.info("WebSocket connection request received")
-    
-    # Check if models are initialized properly
-    if speech_model is None or audio_processor is None or command_handler is None:
-        logger.error("Critical components not initialized properly")
-        return
-    
-    try:
-        await manager.connect(websocket)
-        
-        # Last processed time to limit processing frequency
-        last_processed_time = 0
-        audio_process_count = 0
-        
-        logger.info("Starting WebSocket loop")
-        websocket_active = True
-        
-        while websocket_active:
-            try:
-                # Receive data with timeout
-                data = await asyncio.wait_for(websocket.receive(), timeout=1.0)
+                    # Batch audio for decoding, waits if this session is backlogged.
+                    # Opus packets are queued whole and decoded on the decode thread.
+                    await ingest.feed(audio_data, seq)
                 
-                # Process binary audio data
-                if "bytes" in data:
-                    audio_data = data["bytes"]
-                    audio_process_count += 1
-                    
-                    # Log occasionally for debugging
-                    if audio_process_count % 100 == 0:
-                        logger.debug(f"Processed {audio_process_count} audio chunks")
-                    
-                    # Rate limiting
-                    current_time = int(time.time() * 1000)
-                    if current_time - last_processed_time < 50:
+                # A hello before any audio declares how the audio is framed
+                elif "text" in data:
+                    if is_end_message(data["text"]):
+                        log.info("Client ended the stream")
+                        graceful = True
+                        break
+                    if ingest.stats.frames_received:
+                        log.warning("Ignoring text message after audio started")
                         continue
-                        
-                    last_processed_time = current_time
-                    
-                    # Process audio
-                    processed_audio = audio_processor.process_audio(audio_data)
-                    
-                    # Only process if we have enough audio data
-                    if processed_audio is not None and len(processed_audio) > 1600:
-                        # Get transcription
-                        text = speech_model.transcribe(processed_audio)
-                        
-                        # Process transcription results
-                        if text:
-                            logger.info(f"Transcription: {text}")
-                            
-                            # Check for commands
-                            command = command_handler.process_command(text)
-                            
-                            if command:
-                                logger.info(f"Command detected: {command}")
-                                await websocket.send_text(command)
-                            else:
-                                await websocket.send_text(text)
+                    if hello_seen:
+                        # The stream state was set up for the first hello, a second one can't redefine it
+                        log.warning("Rejecting second client hello")
+                        await websocket.close(code=1003, reason="Only one hello is allowed")
+                        break
+                    hello_seen = True
+                    try:
+                        stream = StreamConfig.from_hello(data["text"], audio_codecs)
+                    except (ValueError, TypeError) as e:
+                        log.warning("Rejecting client hello: %s", e)
+                        await websocket.close(code=1003, reason=str(e)[:120])
+                        break
+                    if stream.framed:
+                        arrivals = ArrivalTracker(session.metrics)
+                        sender.captured_at = arrivals.captured_at
+                    if stream.codec == CODEC_OPUS:
+                        opus = OpusStreamDecoder(metrics=session.metrics)
+                        session.audio_processor.set_packet_decoder(opus)
+                        # Batches of whole packets, about as long as a PCM batch
+                        batch_ms = ingest_batch_bytes * 1000 / 32000
+                        ingest.set_packets(round(batch_ms / (stream.frame_ms or 20)))
+                    elif not stream.native:
+                        # Native-rate PCM is converted on the decode thread; batches keep the same duration
+                        session.audio_processor.set_input_format(stream.sample_rate, stream.channels,
+                                                                 stream.sample_format)
+                        ingest.frame_bytes = stream.frame_bytes
+                        ingest.batch_bytes = ingest_batch_bytes * stream.bytes_per_second // 32000
+                    log.info("Client hello: %s", stream.as_dict())
+                    await sender.push({"type": "hello", "session": session.trace_id, **stream.as_dict()})
                 
                 # Handle disconnect message
                 elif "type" in data and data["type"] == "websocket.disconnect":
-                    logger.info("Received disconnect message from WebSocket")
-                    websocket_active = False
-                    break
-                    
-            except asyncio.TimeoutError:
-                # Check connection with ping
-                try:
-                    pong_waiter = await websocket.ping()
-                    await asyncio.wait_for(pong_waiter, timeout=0.5)
-                except Exception:
-                    logger.info("WebSocket ping failed, connection seems broken")
-                    websocket_active = False
+                    log.info("Received disconnect message from WebSocket")
                     break
                     
             except WebSocketDisconnect:
-                logger.info("WebSocket disconnected during receive")
-                websocket_active = False
+                log.info("WebSocket disconnected during receive")
                 break
                 
             except RuntimeError as e:
                 if "disconnect message has been received" in str(e):
-                    logger.info("WebSocket already disconnected")
-                    websocket_active = False
+                    log.info("WebSocket already disconnected")
                     break
                 else:
-                    logger.error(f"RuntimeError in websocket: {e}")
+                    log.error("RuntimeError in websocket: %s", e)
+                    log.error(traceback.format_exc())
                     
             except Exception as e:
-                logger.error(f"Error processing data: {e}")
-                logger.error(traceback.format_exc())
+                log.error("Error processing data: %s", e)
+                log.error(traceback.format_exc())
+                # Don't break on error, try to continue
     
     except Exception as e:
-        logger.error(f"Error in websocket connection: {e}")
+        log.error("Error in websocket connection: %s", e)
+        log.error(traceback.format_exc())
     finally:
-        manager.disconnect(websocket)
-        logger.info("WebSocket connection closed and cleaned up")
+        # Always clean up and hand the session back for reuse, even if cleanup fails
+        try:
+            manager.disconnect(websocket)
+            if graceful:
+                # Audio short of a batch still belongs to the last utterance; decode it and deliver the results
+                await ingest.flush()
+                await decoder.close(drain=True)
+                await sender.close(flush=True)
+                await websocket.close(code=1000)
+            else:
+                # No one is left to receive results, so don't spend decode time on them
+                ingest.discard()
+                await decoder.close()
+                await sender.close()
+            log.info("Session %s ingest stats: %s", session.session_id, ingest.stats.as_dict())
+            log.info("Session %s speech ratio: %.2f", session.session_id, session.audio_processor.vad.speech_ratio)
+            if arrivals is not None:
+                log.info("Session %s network: %s", session.session_id, arrivals.as_dict())
+            if opus is not None:
+                log.info("Session %s Opus: %s", session.session_id, opus.as_dict())
+        except Exception as e:
+            log.error("Error cleaning up session %s: %s", session.session_id, e)
+        finally:
+            model_manager.release(generation, session)
+        log.info("WebSocket connection closed and cleaned up")
 
 if __name__ == "__main__":
     # Check for model
-    model_path = "models/data/vosk-model-small-en-us-0.15"
-    if not os.path.exists(model_path):
-        logger.warning(f"Vosk model not found at {model_path}")
+    if recognizer_backend == BACKEND_VOSK and not os.path.exists(model_path or DEFAULT_MODEL_PATH):
+        logger.warning(f"Vosk model not found at {model_path or DEFAULT_MODEL_PATH}")
         logger.warning("Download from https://alphacephei.com/vosk/models")
         logger.warning("Install with these commands:")
         logger.warning("  mkdir -p models/data")
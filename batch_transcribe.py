@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Offline batch transcription of recorded audio
+
+Streams WAV (16 kHz mono 16-bit) or raw PCM files through the same pipeline
+as the live server, spread across a pool of worker processes, and writes one
+JSON line per file with its transcripts and detected commands.
+
+Usage:
+    python batch_transcribe.py recordings/ -o results.jsonl -j 8
+"""
+import argparse
+import json
+import sys
+from concurrent.futures.process import BrokenProcessPool
+
+from models.backends import BACKEND_KWS, BACKEND_SCRIPTED, BACKEND_VOSK
+from utils.batch_transcriber import BatchRunner, find_audio_files
+from utils.commit_policy import CommitPolicy
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="Audio files or directories to transcribe")
+    parser.add_argument("-o", "--output", help="JSONL output file (default: stdout)")
+    parser.add_argument("-j", "--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--model", help="Vosk model directory, or the keyword spotter's model or stand-in's script file")
+    parser.add_argument("--backend", choices=[BACKEND_VOSK, BACKEND_KWS, BACKEND_SCRIPTED], default=BACKEND_VOSK,
+                        help="Recognizer backend, as RECOGNIZER_BACKEND")
+    parser.add_argument("--mode", choices=["full", "keyword"], default="full", help="Recognizer mode")
+    parser.add_argument("--commands", help="JSON command vocabulary")
+    parser.add_argument("--stable-partials", type=int, default=2,
+                        help="Partials a command word must survive to count early, as COMMIT_STABLE_PARTIALS")
+    parser.add_argument("--min-confidence", type=float, help="Word confidence that counts a command early, as COMMIT_MIN_CONFIDENCE")
+    parser.add_argument("--no-finalize-on-silence", action="store_true",
+                        help="Wait for the recognizer's own endpointing, as FINALIZE_ON_SILENCE=false")
+    args = parser.parse_args()
+    commit_policy = CommitPolicy(args.stable_partials, args.min_confidence, not args.no_finalize_on_silence)
+
+    paths = find_audio_files(args.inputs)
+    if not paths:
+        print("No audio files found", file=sys.stderr)
+        sys.exit(1)
+
+    runner = BatchRunner(args.workers, args.model, args.mode, args.commands, backend=args.backend,
+                         commit_policy=commit_policy)
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        print(f"Transcribing {len(paths)} files with {runner.workers} workers...", file=sys.stderr)
+        summary = runner.run(paths, output)
+    except BrokenProcessPool:
+        print("Worker processes failed to load the model, see the errors above", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        runner.shutdown()
+        if output is not sys.stdout:
+            output.close()
+
+    print(json.dumps(summary), file=sys.stderr)
+    print(f"Throughput: {summary['audio_hours_per_wall_hour']} audio-hours per wall-hour", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
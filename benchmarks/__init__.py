@@ -0,0 +1 @@
+"""Benchmarks for the speech command pipeline. Run modules with ``python -m benchmarks.<name>``."""
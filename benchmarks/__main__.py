@@ -0,0 +1,31 @@
+"""
+Benchmark suite entry point
+
+Usage:
+    python -m benchmarks list
+    python -m benchmarks compare BASELINE.json CANDIDATE.json
+"""
+import argparse
+import pkgutil
+
+import benchmarks
+from benchmarks.results import compare
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="List the available benchmarks")
+    compare_parser = sub.add_parser("compare", help="Compare two saved result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for module in pkgutil.iter_modules(benchmarks.__path__):
+            if module.name.startswith("bench_"):
+                print(f"python -m benchmarks.{module.name}")
+    elif args.command == "compare":
+        print(compare(args.baseline, args.candidate))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Command matching cost at 10, 100 and 1000 keywords: nested substring scans vs compiled index
+
+The scan path reproduces the previous CommandHandler.process_command, which
+re-split the transcript and ran several substring checks per keyword. The
+compiled path is CommandMatcher, which walks the transcript once.
+
+Usage:
+    python -m benchmarks.bench_command_matcher [--sizes 10 100 1000] [--transcripts 2000]
+"""
+import argparse
+import json
+import random
+import time
+
+from utils.command_matcher import CommandMatcher
+
+def scan_match(commands, text):
+    """Matching logic of the previous CommandHandler, without logging and cooldown"""
+    text = text.lower().strip()
+    for command in commands:
+        if command in text:
+            return command
+    for command, keywords in commands.items():
+        for keyword in keywords:
+            if keyword in text.split() or f" {keyword} " in f" {text} ":
+                return command
+            if keyword in text:
+                return command
+    if "clay" in text or "lay" in text:
+        return "play"
+    if "paws" in text or "cause" in text or "post" in text:
+        return "pause"
+    return None
+
+def make_vocabulary(size: int, rng: random.Random):
+    """Build a vocabulary of `size` made-up keywords spread over size/5 commands"""
+    letters = "bcdfghjkmnpqrstvwxz"
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(letters) + rng.choice("aeiou") for _ in range(3)))
+    words = sorted(words)
+    commands = {}
+    for i, word in enumerate(words):
+        commands.setdefault(f"command{i // 5}", []).append(word)
+    return commands, words
+
+def make_transcripts(words, count: int, rng: random.Random):
+    """Ten-word transcripts of filler, a quarter of which contain one keyword"""
+    filler = ["the", "a", "music", "please", "now", "can", "you", "turn", "it", "up", "ok", "right"]
+    transcripts = []
+    for _ in range(count):
+        tokens = [rng.choice(filler) for _ in range(10)]
+        if rng.random() < 0.25:
+            tokens[rng.randrange(10)] = rng.choice(words)
+        transcripts.append(" ".join(tokens))
+    return transcripts
+
+def time_per_call(fn, transcripts) -> float:
+    """Average nanoseconds per call"""
+    start = time.perf_counter_ns()
+    for text in transcripts:
+        fn(text)
+    return (time.perf_counter_ns() - start) / len(transcripts)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="Vocabulary sizes")
+    parser.add_argument("--transcripts", type=int, default=2000, help="Transcripts matched per size")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    results = []
+    for size in args.sizes:
+        commands, words = make_vocabulary(size, rng)
+        transcripts = make_transcripts(words, args.transcripts, rng)
+
+        build_start = time.perf_counter()
+        matcher = CommandMatcher(commands)
+        build_ms = (time.perf_counter() - build_start) * 1000
+
+        results.append({
+            "keywords": size,
+            "scan_ns_per_call": time_per_call(lambda text: scan_match(commands, text), transcripts),
+            "compiled_ns_per_call": time_per_call(matcher.match, transcripts),
+            "compile_ms": build_ms,
+        })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for r in results:
+        print(f"{r['keywords']:>6} keywords: scan {r['scan_ns_per_call']:10.0f} ns/call, "
+              f"compiled {r['compiled_ns_per_call']:8.0f} ns/call (compile {r['compile_ms']:.1f} ms)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Real-time factor and latency: full-vocabulary decoding vs grammar-restricted keyword spotting
+
+Each WAV fixture is streamed through a fresh recognizer in 0.1 s chunks, as
+the server does, once per recognizer mode.
+
+Usage:
+    python -m benchmarks.bench_keyword_mode [--model DIR] [WAV ...]
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.common import SAMPLE_RATE, iter_chunks, load_wav, percentiles, synthetic_audio
+from models.asr_model import SpeechModel
+from utils.command_handler import CommandHandler
+
+CHUNK_SAMPLES = SAMPLE_RATE // 10
+
+def run(model: SpeechModel, fixtures) -> dict:
+    """Stream every fixture through a new recognizer and collect timings"""
+    chunk_latencies = []
+    final_latencies = []
+    decode_wall = 0.0
+    decode_cpu = 0.0
+    audio_seconds = 0.0
+    transcripts = []
+
+    for audio in fixtures:
+        recognizer = model.create_recognizer()
+        audio_seconds += len(audio) / SAMPLE_RATE
+        for chunk in iter_chunks(audio, CHUNK_SAMPLES):
+            wall, cpu = time.perf_counter(), time.process_time()
+            model.transcribe(np.frombuffer(chunk, dtype=np.int16), recognizer)
+            elapsed = time.perf_counter() - wall
+            decode_cpu += time.process_time() - cpu
+            decode_wall += elapsed
+            chunk_latencies.append(elapsed)
+
+        # Time from the last chunk to the final hypothesis
+        wall = time.perf_counter()
+        transcripts.append(json.loads(recognizer.FinalResult()).get("text", ""))
+        final_latencies.append(time.perf_counter() - wall)
+
+    return {
+        "mode": model.mode,
+        "audio_seconds": audio_seconds,
+        "real_time_factor": decode_wall / audio_seconds,
+        "cpu_real_time_factor": decode_cpu / audio_seconds,
+        "chunk_latency_ms": {k: v * 1000 for k, v in percentiles(chunk_latencies).items()},
+        "final_latency_ms": {k: v * 1000 for k, v in percentiles(final_latencies).items()},
+        "transcripts": transcripts,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("wavs", nargs="*", help="16 kHz mono WAV fixtures (default: synthetic audio)")
+    parser.add_argument("--model", help="Vosk model directory")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    fixtures = [load_wav(path) for path in args.wavs] or [synthetic_audio(10, seed=i) for i in range(3)]
+    vocabulary = CommandHandler().vocabulary()
+
+    results = {}
+    for mode in (SpeechModel.MODE_FULL, SpeechModel.MODE_KEYWORD):
+        try:
+            model = SpeechModel(args.model, mode=mode, vocabulary=vocabulary)
+        except (FileNotFoundError, ImportError) as e:
+            print(f"A Vosk model is required for this benchmark: {e}", file=sys.stderr)
+            sys.exit(1)
+        results[mode] = run(model, fixtures)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for mode, r in results.items():
+        print(f"{mode:>8}: RTF {r['real_time_factor']:.3f} (CPU {r['cpu_real_time_factor']:.3f}), "
+              f"chunk p50/p95 {r['chunk_latency_ms']['p50']:.1f}/{r['chunk_latency_ms']['p95']:.1f} ms, "
+              f"final p50 {r['final_latency_ms']['p50']:.1f} ms")
+
+if __name__ == "__main__":
+    main()
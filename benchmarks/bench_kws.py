@@ -0,0 +1,164 @@
+"""
+NumPy keyword spotter against the Vosk path: accuracy, CPU and micro-batching
+
+Accuracy: each fixture is streamed through AudioProcessor and a recognizer
+of each backend, and the commands in its final results are compared with
+the commands among the fixture's annotated words (hits, misses and false
+alarms, per fixture as counts). Vosk runs in keyword mode on the same
+command vocabulary and is skipped when no Vosk model is installed. The
+synthetic default fixtures carry no real speech, so meaningful accuracy
+needs --fixtures with recorded commands.
+
+Throughput: CPU per second of audio for feature extraction and for the
+whole spotter, the classifier's cost per window at several batch sizes,
+and N concurrent streams decoded on a thread pool in lockstep, where the
+shared MicroBatcher stacks their windows into one matrix multiply.
+
+Usage:
+    python -m benchmarks.bench_kws [--kws-model FILE] [--vosk-model DIR] [--fixtures DIR] [--save [PATH]]
+"""
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.common import SAMPLE_RATE, synthetic_audio
+from benchmarks.fixtures import get_fixtures
+from benchmarks.results import save_results
+from models.asr_model import SpeechModel
+from models.kws import DEFAULT_KWS_MODEL_PATH, KeywordSpotterBackend
+from utils.audio_processor import AudioProcessor
+from utils.command_matcher import CommandMatcher
+from utils.features import LogMelFeatures
+
+CHUNK_SAMPLES = SAMPLE_RATE // 10
+
+def commands_in(text: str, matcher: CommandMatcher) -> list:
+    """Commands of every word of a transcript"""
+    found = [matcher.match(word) for word in text.split()]
+    return [match[0] for match in found if match]
+
+def accuracy(model: SpeechModel, fixtures, matcher: CommandMatcher) -> dict:
+    """Stream every fixture through the server's processing and count detected commands"""
+    hits = misses = false_alarms = 0
+    cpu = 0.0
+    audio_seconds = 0.0
+    for fixture in fixtures:
+        recognizer = model.create_recognizer()
+        processor = AudioProcessor()
+        detected = []
+        start = time.process_time()
+        for offset in range(0, len(fixture.audio), CHUNK_SAMPLES):
+            audio = processor.process_audio(fixture.audio[offset:offset + CHUNK_SAMPLES].tobytes())
+            if audio is None:
+                continue
+            result = model.decode(audio, recognizer)
+            if result.is_final:
+                detected.extend(commands_in(result.text, matcher))
+        detected.extend(commands_in(model.finalize(recognizer), matcher))
+        cpu += time.process_time() - start
+        audio_seconds += fixture.duration
+
+        expected = [match[0] for match in (matcher.match(w["word"]) for w in fixture.words) if match]
+        for command in set(expected) | set(detected):
+            want, got = expected.count(command), detected.count(command)
+            hits += min(want, got)
+            misses += max(0, want - got)
+            false_alarms += max(0, got - want)
+
+    return {
+        "hits": hits,
+        "misses": misses,
+        "false_alarms": false_alarms,
+        "recall": hits / (hits + misses) if hits + misses else None,
+        "precision": hits / (hits + false_alarms) if hits + false_alarms else None,
+        "cpu_per_audio_second": cpu / audio_seconds,
+    }
+
+def feature_cost(audio: np.ndarray) -> float:
+    """CPU seconds per second of audio for streaming MFCC extraction"""
+    features = LogMelFeatures()
+    start = time.process_time()
+    for offset in range(0, len(audio), CHUNK_SAMPLES):
+        features.process(audio[offset:offset + CHUNK_SAMPLES])
+    return (time.process_time() - start) / (len(audio) / SAMPLE_RATE)
+
+def classifier_cost(backend: KeywordSpotterBackend, batch_sizes: list, repeats: int = 200) -> dict:
+    """Microseconds per scored window when windows are scored batch_size at a time"""
+    model = backend.model
+    width = model.context * LogMelFeatures(**model.feature_config).dims
+    windows = np.random.default_rng(0).normal(0, 1, (max(batch_sizes), width)).astype(np.float32)
+    results = {}
+    for size in batch_sizes:
+        batch = windows[:size]
+        model.score(batch)
+        start = time.process_time()
+        for _ in range(repeats):
+            model.score(batch)
+        results[str(size)] = (time.process_time() - start) / (repeats * size) * 1e6
+    return results
+
+def concurrent_streams(backend: KeywordSpotterBackend, streams: int, threads: int, audio: np.ndarray) -> dict:
+    """Decode the same audio on many streams at once, one chunk per stream per round"""
+    sessions = [backend.create_stream(SAMPLE_RATE) for _ in range(streams)]
+    chunks = [audio[offset:offset + CHUNK_SAMPLES].tobytes() for offset in range(0, len(audio), CHUNK_SAMPLES)]
+    backend.batcher.batches = backend.batcher.rows = 0
+
+    start = time.process_time()
+    with ThreadPoolExecutor(threads) as pool:
+        for chunk in chunks:
+            list(pool.map(lambda stream: stream.AcceptWaveform(chunk), sessions))
+    cpu = time.process_time() - start
+
+    audio_seconds = streams * len(audio) / SAMPLE_RATE
+    return {
+        "threads": threads,
+        "mean_batch_rows": backend.batcher.mean_batch_rows,
+        "cpu_per_stream_audio_second": cpu / audio_seconds,
+        "streams_per_core": audio_seconds / cpu if cpu else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kws-model", default=DEFAULT_KWS_MODEL_PATH, help="Keyword model file")
+    parser.add_argument("--vosk-model", help="Vosk model directory for the comparison")
+    parser.add_argument("--fixtures", help="Directory of WAV fixtures with word sidecars (default: synthetic)")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 64, 256], help="Classifier batch sizes")
+    parser.add_argument("--streams", type=int, nargs="+", default=[1, 16, 64, 256], help="Concurrent stream counts")
+    parser.add_argument("--threads", type=int, default=64, help="Most decode threads for the concurrent runs")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Audio per stream in the throughput runs")
+    parser.add_argument("--save", nargs="?", const="", metavar="PATH", help="Store results as JSON")
+    args = parser.parse_args()
+
+    try:
+        backend = KeywordSpotterBackend(args.kws_model)
+    except FileNotFoundError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+
+    fixtures = get_fixtures(args.fixtures)
+    matcher = CommandMatcher.default()
+    audio = synthetic_audio(args.seconds)
+
+    results = {"keywords": backend.model.keywords, "fixtures": len(fixtures), "accuracy": {}}
+    kws = SpeechModel(args.kws_model, mode=SpeechModel.MODE_KEYWORD, vocabulary=matcher.vocabulary(), backend="kws")
+    results["accuracy"]["kws"] = accuracy(kws, fixtures, matcher)
+    try:
+        vosk = SpeechModel(args.vosk_model, mode=SpeechModel.MODE_KEYWORD, vocabulary=matcher.vocabulary())
+        results["accuracy"]["vosk"] = accuracy(vosk, fixtures, matcher)
+    except (FileNotFoundError, ImportError):
+        results["accuracy"]["vosk"] = None  # no Vosk model to compare with
+
+    results["feature_cpu_per_audio_second"] = feature_cost(audio)
+    results["classifier_us_per_window"] = classifier_cost(backend, args.batch_sizes)
+    results["concurrent"] = {str(n): concurrent_streams(backend, n, min(n, args.threads), audio) for n in args.streams}
+
+    print(json.dumps(results, indent=2))
+    if args.save is not None:
+        print(f"Saved to {save_results('kws', results, args.save or None)}")
+
+if __name__ == "__main__":
+    main()
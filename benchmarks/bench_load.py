@@ -0,0 +1,330 @@
+"""
+Multi-client WebSocket load test against the running server
+
+Simulated clients stream fixture audio to /ws at real-time pace. Command
+latency is measured from the end of each annotated word (on the client's
+clock, relative to when it started streaming) to the moment the command
+message arrives. With --ramp the test is repeated at increasing client
+counts to find the largest load the server sustains.
+
+With --standin-cpu the spawned server runs the scripted stand-in backend
+instead of Vosk, replaying the first fixture's annotated words and burning
+the given CPU seconds per second of decoded audio. Every client then streams that
+fixture. Results are reproducible on a machine without a model, for
+capacity planning and regression runs.
+
+Usage:
+    python -m benchmarks.bench_load --spawn-server --clients 8 --duration 30
+    python -m benchmarks.bench_load --url ws://host:8080/ws --ramp 1 2 4 8 16 32
+    python -m benchmarks.bench_load --spawn-server --server-workers 4 --ramp 4 8 16 32 64
+    python -m benchmarks.bench_load --spawn-server --standin-cpu 0.05 --ramp 8 16 32 64
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from typing import List, Optional
+
+import websockets
+
+from benchmarks.common import SAMPLE_RATE, percentiles
+from benchmarks.fixtures import Fixture, get_fixtures
+from benchmarks.results import save_results
+from utils.audio_processor import AudioProcessor
+from utils.command_matcher import CommandMatcher
+
+# A word counts as recognized if its command arrives within this many seconds of its end
+MATCH_WINDOW = 3.0
+
+class ClientResult:
+    """What one simulated client sent and received"""
+
+    def __init__(self):
+        self.audio_seconds = 0.0
+        self.latencies: List[float] = []
+        self.commands = 0
+        self.spurious = 0
+        self.missed = 0
+        self.max_send_lag = 0.0
+        self.error: Optional[str] = None
+
+def commands_in(frame: str) -> List[str]:
+    """Return the commands carried by a server frame, which holds one JSON message or a list of them"""
+    messages = json.loads(frame)
+    if isinstance(messages, dict):
+        messages = [messages]
+    return [m["command"] for m in messages if m.get("type") == "command"]
+
+async def run_client(url: str, fixture: Fixture, duration: float, chunk_samples: int,
+                     matcher: CommandMatcher) -> ClientResult:
+    """Stream a fixture (looped to `duration` seconds) and time the commands that come back"""
+    result = ClientResult()
+    chunk_seconds = chunk_samples / SAMPLE_RATE
+    audio = fixture.audio
+    loops = max(1, int(duration // fixture.duration))
+
+    # Expected command words on the stream timeline
+    expected = []
+    for loop in range(loops):
+        for word in fixture.words:
+            match = matcher.match(word["word"])
+            if match:
+                expected.append((loop * fixture.duration + word["end"], match[0]))
+
+    received = []
+
+    try:
+        # Stagger clients so they don't send in lockstep
+        await asyncio.sleep(random.uniform(0, chunk_seconds))
+        async with websockets.connect(url, max_size=None) as ws:
+            async def receive():
+                async for frame in ws:
+                    if isinstance(frame, str):
+                        arrival = time.monotonic()
+                        received.extend((arrival, command) for command in commands_in(frame))
+
+            receiver = asyncio.create_task(receive())
+            t0 = time.monotonic()
+
+            for loop in range(loops):
+                for i, start in enumerate(range(0, len(audio), chunk_samples)):
+                    target = t0 + (loop * len(audio) + start) / SAMPLE_RATE
+                    delay = target - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    else:
+                        result.max_send_lag = max(result.max_send_lag, -delay)
+                    await ws.send(audio[start:start + chunk_samples].tobytes())
+            result.audio_seconds = loops * fixture.duration
+
+            # Give trailing commands time to arrive
+            await asyncio.sleep(MATCH_WINDOW)
+            receiver.cancel()
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+        return result
+
+    # Pair each command with the latest unmatched expected word for that command
+    unmatched = list(expected)
+    for arrival, command in received:
+        t = arrival - t0
+        candidates = [w for w in unmatched if w[1] == command and 0 <= t - w[0] <= MATCH_WINDOW]
+        if candidates:
+            word = max(candidates)
+            unmatched.remove(word)
+            result.latencies.append(t - word[0])
+        else:
+            result.spurious += 1
+    result.commands = len(received)
+    result.missed = len(unmatched)
+    return result
+
+def process_cpu_seconds(pid: int) -> Optional[float]:
+    """User plus system CPU time of a process and its live children, read from /proc on Linux"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        total = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return None
+
+    # Workers forked by serve.py
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(child) for child in f.read().split()]
+    except (OSError, ValueError):
+        children = []
+    for child in children:
+        total += process_cpu_seconds(child) or 0.0
+    return total
+
+async def run_level(url: str, clients: int, fixtures, duration: float, chunk_samples: int,
+                    server_pid: Optional[int]) -> dict:
+    """Run one load level and summarize it"""
+    matcher = CommandMatcher.default()
+    cpu_start = process_cpu_seconds(server_pid) if server_pid else None
+    wall_start = time.monotonic()
+
+    results = await asyncio.gather(*[
+        run_client(url, fixtures[i % len(fixtures)], duration, chunk_samples, matcher) for i in range(clients)
+    ])
+
+    wall = time.monotonic() - wall_start
+    cpu_end = process_cpu_seconds(server_pid) if server_pid else None
+    cpu = cpu_end - cpu_start if cpu_start is not None and cpu_end is not None else None
+
+    latencies = [lat for r in results for lat in r.latencies]
+    audio_seconds = sum(r.audio_seconds for r in results)
+    errors = [r.error for r in results if r.error]
+    return {
+        "clients": clients,
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "audio_seconds": audio_seconds,
+        "commands": sum(r.commands for r in results),
+        "missed_words": sum(r.missed for r in results),
+        "spurious_commands": sum(r.spurious for r in results),
+        "command_latency_ms": {k: (v * 1000 if v is not None else None) for k, v in percentiles(latencies).items()},
+        "max_send_lag_ms": max((r.max_send_lag for r in results), default=0.0) * 1000,
+        "server_cpu_seconds": cpu,
+        "real_time_factor": cpu / audio_seconds if cpu is not None and audio_seconds else None,
+        "cpu_per_stream": cpu / (clients * wall) if cpu is not None else None,
+    }
+
+def sustainable(level: dict, max_p95_ms: float) -> bool:
+    """A level is sustained if nothing failed, clients kept pace and p95 latency is within budget"""
+    p95 = level["command_latency_ms"]["p95"]
+    return (level["errors"] == 0 and level["max_send_lag_ms"] < 100
+            and (p95 is None or p95 <= max_p95_ms))
+
+def free_port() -> int:
+    """Pick an unused TCP port"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def standin_script(fixture: Fixture, duration: float, chunk_samples: int) -> str:
+    """
+    Write a stand-in backend script replaying a fixture's words, returning its path
+
+    The stand-in times words in audio the recognizer has accepted, which
+    the server's voice activity gating makes shorter than the stream. The
+    fixture is run through an AudioProcessor the way a session would, and
+    each word's start and end are moved to the amount of audio decoded by
+    the time the stream reached them.
+    """
+    processor = AudioProcessor()
+    loops = max(1, int(duration // fixture.duration))
+    fed, decoded = [], []
+    total = 0
+    for loop in range(loops):
+        for start in range(0, len(fixture.audio), chunk_samples):
+            audio = processor.process_audio(fixture.audio[start:start + chunk_samples].tobytes())
+            total += len(audio) if audio is not None else 0
+            fed.append(loop * fixture.duration + (start + chunk_samples) / SAMPLE_RATE)
+            decoded.append(total / SAMPLE_RATE)
+
+    def decoded_at(t: float) -> float:
+        return decoded[min(bisect.bisect_left(fed, t), len(decoded) - 1)]
+
+    words = [{"word": word["word"],
+              "start": decoded_at(loop * fixture.duration + word["start"]),
+              "end": decoded_at(loop * fixture.duration + word["end"])}
+             for loop in range(loops) for word in fixture.words]
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump({"words": words}, f)
+    return f.name
+
+def spawn_server(port: int, workers: int = 0, env_overrides: Optional[dict] = None) -> subprocess.Popen:
+    """Start app.py under uvicorn, or under serve.py with several workers, and wait until /ready answers"""
+    env = dict(os.environ, LOGLEVEL=os.environ.get("LOGLEVEL", "WARNING"), **(env_overrides or {}))
+    if workers:
+        command = [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+                   "--log-level", "warning"]
+    process = subprocess.Popen(command, env=env)
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=1)
+            return process
+        except urllib.error.HTTPError as e:
+            status = json.loads(e.read() or b"{}")
+            if status.get("state") == "failed":
+                process.terminate()
+                raise RuntimeError(f"Server failed to load its model: {status.get('error')}; "
+                                   "use --standin-cpu to run without a Vosk model")
+            time.sleep(0.5)
+        except Exception:
+            if process.poll() is not None:
+                raise RuntimeError("Server exited during startup")
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("Server did not become ready in time")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="WebSocket URL of a running server")
+    parser.add_argument("--spawn-server", action="store_true", help="Start app.py locally for the test")
+    parser.add_argument("--server-workers", type=int, default=0,
+                        help="With --spawn-server, run serve.py with this many worker processes")
+    parser.add_argument("--server-pid", type=int, help="PID of the server, for CPU measurements")
+    parser.add_argument("--standin-cpu", type=float, metavar="SECONDS",
+                        help="With --spawn-server, use the scripted stand-in backend burning this much CPU per audio second")
+    parser.add_argument("--fixtures", help="Fixture directory (default: synthetic fixtures)")
+    parser.add_argument("--clients", type=int, default=4, help="Concurrent clients")
+    parser.add_argument("--ramp", type=int, nargs="+", help="Client counts to step through instead of --clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of audio per client")
+    parser.add_argument("--chunk-ms", type=float, default=100.0, help="Audio per WebSocket message")
+    parser.add_argument("--max-p95-ms", type=float, default=1000.0, help="Latency budget for a sustainable level")
+    parser.add_argument("--save", nargs="?", const="", metavar="PATH", help="Store results as JSON")
+    args = parser.parse_args()
+
+    if not args.url and not args.spawn_server:
+        parser.error("give --url or --spawn-server")
+    if args.standin_cpu is not None and not args.spawn_server:
+        parser.error("--standin-cpu needs --spawn-server")
+
+    random.seed(0)
+    fixtures = get_fixtures(args.fixtures)
+    chunk_samples = int(SAMPLE_RATE * args.chunk_ms / 1000)
+
+    overrides = {}
+    script = None
+    if args.standin_cpu is not None:
+        # The stand-in ignores the audio, so every client streams the fixture it replays
+        fixtures = fixtures[:1]
+        script = standin_script(fixtures[0], args.duration, chunk_samples)
+        overrides = {"RECOGNIZER_BACKEND": "scripted", "MODEL_PATH": script,
+                     "STANDIN_CPU_PER_SECOND": str(args.standin_cpu)}
+
+    server = None
+    server_pid = args.server_pid
+    url = args.url
+    if args.spawn_server:
+        port = free_port()
+        server = spawn_server(port, args.server_workers, overrides)
+        server_pid = server.pid
+        url = f"ws://127.0.0.1:{port}/ws"
+
+    levels = []
+    try:
+        for clients in args.ramp or [args.clients]:
+            level = asyncio.run(run_level(url, clients, fixtures, args.duration, chunk_samples, server_pid))
+            level["sustainable"] = sustainable(level, args.max_p95_ms)
+            levels.append(level)
+            print(f"{clients:>4} clients: p50/p95/p99 "
+                  + "/".join(f"{v:.0f}" if v is not None else "-" for v in level["command_latency_ms"].values())
+                  + f" ms, errors {level['errors']}, send lag {level['max_send_lag_ms']:.0f} ms, "
+                  + f"sustainable={level['sustainable']}", file=sys.stderr)
+            if args.ramp and not level["sustainable"]:
+                break
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+        if script is not None:
+            os.unlink(script)
+
+    results = {
+        "levels": levels,
+        "max_sustainable_sessions": max((lvl["clients"] for lvl in levels if lvl["sustainable"]), default=0),
+    }
+    if args.standin_cpu is not None:
+        results["standin_cpu_per_second"] = args.standin_cpu
+    print(json.dumps(results, indent=2))
+    if args.save is not None:
+        print(f"Saved to {save_results('load', results, args.save or None)}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
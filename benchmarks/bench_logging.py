@@ -0,0 +1,126 @@
+"""
+Logging overhead on the decode hot path: synchronous print/INFO vs the queued pipeline
+
+Decode threads emit the log traffic of one transcription per chunk. The
+"sync" configuration reproduces the previous behaviour: a print() per
+result from SpeechModel plus f-string INFO lines from the session and
+command handler, all written by the calling thread. The "queued"
+configurations use utils.log_pipeline: lazily formatted, sampled DEBUG
+events and a background writer thread, with the root level at INFO (the
+production default) and at DEBUG.
+
+Reported per configuration: time the decode threads spend in logging per
+event, and how long the writer needed to drain afterwards.
+
+Usage:
+    python -m benchmarks.bench_logging [--threads 8] [--events 20000] [--output FILE] [--save [PATH]]
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from benchmarks.results import save_results
+from utils.log_pipeline import TEXT_FORMAT, LogPipeline, LogSampler, session_logger
+
+# One in this many transcriptions is a command
+COMMAND_EVERY = 20
+
+def sync_events(stream, count: int, session_id: int):
+    """The previous per-chunk logging: prints and eager INFO lines"""
+    log = logging.getLogger("bench.session")
+    for i in range(count):
+        text = f"play the next song {i}"
+        print(f"[VOSK PARTIAL] {text}", file=stream)
+        log.info(f"[session {session_id}] Transcription: {text}")
+        if i % COMMAND_EVERY == 0:
+            log.info("[COMMAND PROCESSOR] Command 'play' accepted!")
+            log.info(f"[session {session_id}] Command detected: play")
+
+def queued_events(stream, count: int, session_id: int, sample_every: int = 50):
+    """Current per-chunk logging: guarded, sampled DEBUG and a lazy INFO per command"""
+    log = session_logger(logging.getLogger("bench.session"), f"{session_id}-bench")
+    sampler = LogSampler(sample_every)
+    for i in range(count):
+        text = f"play the next song {i}"
+        if log.isEnabledFor(logging.DEBUG) and sampler.sample():
+            log.debug("Transcription (%s): %s", "partial", text)
+        if i % COMMAND_EVERY == 0:
+            log.info("Command detected: %s", "play")
+
+def run_threads(target, stream, threads: int, events: int) -> float:
+    """Run `target` on several threads at once and return the wall time in seconds"""
+    workers = [threading.Thread(target=target, args=(stream, events, n)) for n in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start
+
+def measure_sync(path: str, threads: int, events: int) -> dict:
+    """Log synchronously from the decode threads"""
+    with open(path, "w", buffering=1) as stream:
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT.replace(" [%(trace_id)s]", "")))
+        root.addHandler(handler)
+        root.setLevel(logging.INFO)
+
+        wall = run_threads(sync_events, stream, threads, events)
+        root.removeHandler(handler)
+    return summarize(wall, 0.0, threads, events, path)
+
+def measure_queued(path: str, threads: int, events: int, level: str) -> dict:
+    """Log through the queued pipeline from the decode threads"""
+    with open(path, "w", buffering=1) as stream:
+        pipeline = LogPipeline(level, queue_size=100000, stream=stream)
+        wall = run_threads(queued_events, stream, threads, events)
+        start = time.perf_counter()
+        pipeline.stop()
+        drain = time.perf_counter() - start
+        logging.getLogger().removeHandler(pipeline.handler)
+        result = summarize(wall, drain, threads, events, path)
+        result["dropped_records"] = pipeline.dropped
+    return result
+
+def summarize(wall: float, drain: float, threads: int, events: int, path: str) -> dict:
+    """Per-event cost of one configuration"""
+    return {
+        "hot_path_seconds": wall,
+        "ns_per_event": wall / (threads * events) * 1e9,
+        "writer_drain_seconds": drain,
+        "bytes_written": os.path.getsize(path),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8, help="Concurrent decode threads")
+    parser.add_argument("--events", type=int, default=20000, help="Transcriptions per thread")
+    parser.add_argument("--output", help="File the logs are written to (default: a temporary file)")
+    parser.add_argument("--save", nargs="?", const="", metavar="PATH", help="Store results as JSON")
+    args = parser.parse_args()
+
+    path = args.output or os.path.join(tempfile.mkdtemp(), "bench_logging.log")
+    results = {
+        "threads": args.threads,
+        "events_per_thread": args.events,
+        "sync": measure_sync(path, args.threads, args.events),
+        "queued_info": measure_queued(path, args.threads, args.events, "INFO"),
+        "queued_debug": measure_queued(path, args.threads, args.events, "DEBUG"),
+    }
+    baseline = results["sync"]["ns_per_event"]
+    for name in ("queued_info", "queued_debug"):
+        results[name]["overhead_removed"] = 1 - results[name]["ns_per_event"] / baseline
+
+    print(json.dumps(results, indent=2))
+    if args.save is not None:
+        print(f"Saved to {save_results('logging', results, args.save or None)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Opus ingest: server decode CPU against the bandwidth it saves over raw PCM
+
+Each fixture is encoded the way the browser client sends it (16 kHz mono,
+20 ms packets) at several bitrates, then decoded packet by packet with the
+server's per-session OpusStreamDecoder. Bandwidth counts the 12-byte frame
+header on every message, for PCM as well.
+
+Reported per bitrate: wire kbit/s, bandwidth saved against PCM, decode CPU
+per second of audio, microseconds per packet, and how many streams one
+core could decode.
+
+Usage:
+    python -m benchmarks.bench_opus [--bitrates 12 16 24 32] [--fixtures DIR] [--save [PATH]]
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.common import SAMPLE_RATE
+from benchmarks.fixtures import get_fixtures
+from benchmarks.results import save_results
+from utils.opus_codec import OPUS_AVAILABLE, OpusStreamDecoder
+from utils.stream_protocol import FRAME_HEADER
+
+FRAME_MS = 20
+FRAME_SAMPLES = SAMPLE_RATE * FRAME_MS // 1000
+
+def encode(audio: np.ndarray, bitrate: int) -> list:
+    """Encode audio into 20 ms Opus packets at the given bitrate"""
+    import opuslib
+
+    encoder = opuslib.Encoder(SAMPLE_RATE, 1, opuslib.APPLICATION_VOIP)
+    encoder.bitrate = bitrate
+    usable = len(audio) - len(audio) % FRAME_SAMPLES
+    return [encoder.encode(audio[i:i + FRAME_SAMPLES].tobytes(), FRAME_SAMPLES)
+            for i in range(0, usable, FRAME_SAMPLES)]
+
+def measure(streams: list, audio_seconds: float, repeats: int) -> dict:
+    """Decode every stream with a fresh decoder and time it"""
+    wire_bytes = sum(len(packet) + FRAME_HEADER.size for packets in streams for packet in packets)
+    packets = sum(len(p) for p in streams)
+
+    cpu = 0.0
+    for _ in range(repeats):
+        for stream in streams:
+            decoder = OpusStreamDecoder()
+            start = time.process_time()
+            for packet in stream:
+                decoder.decode(packet)
+            cpu += time.process_time() - start
+    cpu /= repeats
+
+    return {
+        "kbit_per_second": wire_bytes * 8 / audio_seconds / 1000,
+        "decode_cpu_per_audio_second": cpu / audio_seconds,
+        "decode_us_per_packet": cpu / packets * 1e6,
+        "streams_per_core": audio_seconds / cpu if cpu else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bitrates", type=int, nargs="+", default=[12, 16, 24, 32], help="Opus bitrates in kbit/s")
+    parser.add_argument("--fixtures", help="Directory of WAV fixtures (default: synthetic speech)")
+    parser.add_argument("--repeats", type=int, default=3, help="Decode passes to average over")
+    parser.add_argument("--save", nargs="?", const="", metavar="PATH", help="Store results as JSON")
+    args = parser.parse_args()
+
+    if not OPUS_AVAILABLE:
+        print("opuslib and libopus are required for this benchmark (pip install opuslib)", file=sys.stderr)
+        sys.exit(1)
+
+    fixtures = get_fixtures(args.fixtures)
+    audio_seconds = sum(len(f.audio) // FRAME_SAMPLES * FRAME_SAMPLES for f in fixtures) / SAMPLE_RATE
+    pcm_kbps = (FRAME_SAMPLES * 2 + FRAME_HEADER.size) * 8 / (FRAME_MS / 1000) / 1000
+
+    results = {
+        "audio_seconds": audio_seconds,
+        "frame_ms": FRAME_MS,
+        "pcm": {"kbit_per_second": pcm_kbps, "decode_cpu_per_audio_second": 0.0},
+    }
+    for kbps in args.bitrates:
+        streams = [encode(f.audio, kbps * 1000) for f in fixtures]
+        result = measure(streams, audio_seconds, args.repeats)
+        result["bandwidth_saved"] = 1 - result["kbit_per_second"] / pcm_kbps
+        results[f"opus_{kbps}k"] = result
+
+    print(json.dumps(results, indent=2))
+    if args.save is not None:
+        print(f"Saved to {save_results('opus', results, args.save or None)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Per-component cost of the recognition pipeline on replayed fixture audio
+
+Each fixture is replayed in client-sized chunks through AudioProcessor,
+SpeechModel and CommandHandler, timing every stage in isolation. Without a
+Vosk model the scripted stand-in is used, which still exercises the processor and
+command handler.
+
+Usage:
+    python -m benchmarks.bench_pipeline [--fixtures DIR] [--model DIR] [--backend scripted] [--save [PATH]]
+"""
+import argparse
+import json
+import sys
+import time
+
+from benchmarks.common import CHUNK_SAMPLES, SAMPLE_RATE, iter_chunks, percentiles
+from benchmarks.fixtures import get_fixtures
+from benchmarks.results import save_results
+from models.asr_model import SpeechModel
+from models.backends import BACKEND_SCRIPTED, BACKEND_VOSK
+from utils.audio_processor import AudioProcessor
+from utils.command_handler import CommandHandler
+
+def run(model: SpeechModel, fixtures, chunk_samples: int) -> dict:
+    """Replay all fixtures and collect per-stage timings"""
+    process_ns, transcribe_ns, command_ns = [], [], []
+    audio_seconds = 0.0
+    commands = 0
+
+    for fixture in fixtures:
+        recognizer = model.create_recognizer()
+        processor = AudioProcessor()
+        handler = CommandHandler()
+        audio_seconds += fixture.duration
+
+        for chunk in iter_chunks(fixture.audio, chunk_samples):
+            start = time.perf_counter_ns()
+            audio = processor.process_audio(chunk)
+            process_ns.append(time.perf_counter_ns() - start)
+            if audio is None:
+                continue
+
+            start = time.perf_counter_ns()
+            text = model.transcribe(audio, recognizer)
+            transcribe_ns.append(time.perf_counter_ns() - start)
+            if not text:
+                continue
+
+            start = time.perf_counter_ns()
+            if handler.process_command(text):
+                commands += 1
+            command_ns.append(time.perf_counter_ns() - start)
+
+    def stage(samples):
+        return {
+            "calls": len(samples),
+            "total_ms": sum(samples) / 1e6,
+            "latency_us": {k: (v / 1000 if v is not None else None) for k, v in percentiles(samples).items()},
+        }
+
+    return {
+        "model": model.backend.name,
+        "mode": model.mode,
+        "audio_seconds": audio_seconds,
+        "commands": commands,
+        "audio_processor": stage(process_ns),
+        "speech_model": stage(transcribe_ns),
+        "command_handler": stage(command_ns),
+        "real_time_factor": (sum(process_ns) + sum(transcribe_ns) + sum(command_ns)) / 1e9 / audio_seconds,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", help="Fixture directory (default: synthetic fixtures)")
+    parser.add_argument("--model", help="Vosk model directory, or the script of the scripted backend")
+    parser.add_argument("--backend", choices=[BACKEND_VOSK, BACKEND_SCRIPTED], default=BACKEND_VOSK,
+                        help="Recognizer backend, scripted runs without a model")
+    parser.add_argument("--mode", choices=["full", "keyword"], default="full", help="Recognizer mode")
+    parser.add_argument("--chunk-samples", type=int, default=CHUNK_SAMPLES, help="Samples per client chunk")
+    parser.add_argument("--save", nargs="?", const="", metavar="PATH", help="Store results as JSON")
+    args = parser.parse_args()
+
+    handler = CommandHandler()
+    try:
+        model = SpeechModel(args.model, mode=args.mode, vocabulary=handler.vocabulary(), backend=args.backend)
+    except (FileNotFoundError, ImportError) as e:
+        print(f"{e}; use --backend scripted to run without a Vosk model", file=sys.stderr)
+        sys.exit(1)
+    results = run(model, get_fixtures(args.fixtures), args.chunk_samples)
+    results["chunk_ms"] = args.chunk_samples / SAMPLE_RATE * 1000
+
+    print(json.dumps(results, indent=2))
+    if args.save is not None:
+        print(f"Saved to {save_results('pipeline', results, args.save or None)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Server-side resampling: cost and quality of converting native-rate client audio to 16 kHz
+
+Clients send 20 ms frames at their device rate and the server's per-session
+InputConverter downmixes and resamples them. For each input format this
+reports microseconds and bytes allocated per frame, how many streams one
+core could convert, and two quality figures: the error on a 1 kHz tone, and
+how much of a 10 kHz tone (above the 8 kHz output Nyquist) aliases into the
+output. The box filter the browser client used before, averaging each
+output sample's span of input, is measured for comparison.
+
+Usage:
+    python -m benchmarks.bench_resampler [--rates 22050 44100 48000] [--channels 1 2] [--save [PATH]]
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.common import SAMPLE_RATE
+from benchmarks.results import save_results
+from utils.resampler import InputConverter
+
+FRAME_MS = 20
+
+def tone(frequency: float, rate: int, seconds: float, channels: int) -> np.ndarray:
+    """Interleaved float32 sine at half scale"""
+    t = np.arange(int(rate * seconds)) / rate
+    mono = 0.5 * np.sin(2 * np.pi * frequency * t)
+    return np.repeat(mono[:, None], channels, axis=1).astype("<f4")
+
+def box_filter(audio: np.ndarray, rate: int) -> np.ndarray:
+    """The browser client's old resampler: each output is the mean of the inputs in its span"""
+    mono = audio.mean(axis=1)
+    edges = np.floor(np.arange(len(mono) + 1) * SAMPLE_RATE / rate).astype(np.int64)
+    starts = np.flatnonzero(np.diff(edges)) + 1
+    return np.add.reduceat(mono, np.r_[0, starts[:-1]]) / np.diff(np.r_[0, starts])
+
+def frames_of(audio: np.ndarray, rate: int) -> list:
+    """Split interleaved audio into 20 ms frames of bytes"""
+    step = rate * FRAME_MS // 1000
+    return [audio[i:i + step].tobytes() for i in range(0, len(audio) - step + 1, step)]
+
+def convert_all(converter: InputConverter, frames: list) -> np.ndarray:
+    """Stream every frame through the converter and join the output, as floats in [-1, 1]"""
+    return np.concatenate([converter.convert(frame).astype(np.float64) for frame in frames]) / 32768
+
+def quality(output: np.ndarray, reference: float, delay: float) -> float:
+    """Peak error in dB relative to full scale against a 1 kHz sine, ignoring the start-up transient"""
+    t = np.arange(len(output)) / SAMPLE_RATE - delay
+    ideal = reference * np.sin(2 * np.pi * 1000 * t)
+    settled = slice(SAMPLE_RATE // 10, len(output) - SAMPLE_RATE // 10)
+    return 20 * np.log10(np.max(np.abs(output[settled] - ideal[settled])) + 1e-12)
+
+def leak_db(output: np.ndarray) -> float:
+    """Level of whatever a 10 kHz tone leaves in the output, in dB relative to full scale"""
+    settled = output[SAMPLE_RATE // 10:-SAMPLE_RATE // 10]
+    return 20 * np.log10(np.sqrt(np.mean(settled ** 2)) * np.sqrt(2) + 1e-12)
+
+def measure(rate: int, channels: int, seconds: float) -> dict:
+    """Time, allocation and quality of one input format"""
+    frames = frames_of(tone(1000, rate, seconds, channels), rate)
+    converter = InputConverter(rate, channels, "f32le")
+    for frame in frames[:5]:
+        converter.convert(frame)  # warm up, so scratch space is already grown
+
+    start = time.process_time()
+    for frame in frames:
+        converter.convert(frame)
+    cpu = time.process_time() - start
+
+    tracemalloc.start()
+    allocated = 0
+    for frame in frames:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        converter.convert(frame)
+        _, peak = tracemalloc.get_traced_memory()
+        allocated += peak - before
+    tracemalloc.stop()
+
+    delay = converter.resampler.delay if converter.resampler is not None else 0.0
+    converter.reset()
+    error = quality(convert_all(converter, frames), 0.5, delay)
+    converter.reset()
+    leak = leak_db(convert_all(converter, frames_of(tone(10000, rate, seconds, channels), rate)))
+
+    audio_seconds = len(frames) * FRAME_MS / 1000
+    result = {
+        "us_per_frame": cpu / len(frames) * 1e6,
+        "bytes_allocated_per_frame": allocated / len(frames),
+        "streams_per_core": audio_seconds / cpu if cpu else None,
+        "tone_error_dbfs": error,
+        "alias_10k_dbfs": leak,
+    }
+    if rate > SAMPLE_RATE:
+        result["box_filter_alias_10k_dbfs"] = leak_db(box_filter(tone(10000, rate, seconds, channels), rate))
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rates", type=int, nargs="+", default=[22050, 44100, 48000], help="Client sample rates")
+    parser.add_argument("--channels", type=int, nargs="+", default=[1, 2], help="Client channel counts")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Audio per measurement")
+    parser.add_argument("--save", nargs="?", const="", metavar="PATH", help="Store results as JSON")
+    args = parser.parse_args()
+
+    results = {"frame_ms": FRAME_MS}
+    for rate in args.rates:
+        for channels in args.channels:
+            results[f"{rate}hz_{channels}ch"] = measure(rate, channels, args.seconds)
+
+    print(json.dumps(results, indent=2))
+    if args.save is not None:
+        print(f"Saved to {save_results('resampler', results, args.save or None)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+AudioProcessor buffering cost at many concurrent sessions: bytearray copies vs ring buffer
+
+Chunks are fed round-robin to one processor per session, as the server does
+with many connected clients. The bytearray path reproduces the previous
+processor, which rebuilt its buffer with several full copies per chunk.
+The ring buffer row runs AudioProcessor with its voice activity gate
+replaced by a pass-through, so both rows buffer every chunk. The VAD is
+measured on its own, and the whole processor with both is reported as
+well.
+
+Usage:
+    python -m benchmarks.bench_ring_buffer [--sessions 128] [--chunks 50]
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.common import CHUNK_SAMPLES, synthetic_audio
+from utils.audio_processor import AudioProcessor
+from utils.vad import VoiceActivityDetector
+
+class BytearrayProcessor:
+    """Buffering path of the previous AudioProcessor: copy, extend, slice and convert per chunk"""
+
+    def __init__(self, sample_rate: int = 16000):
+        self.sample_rate = sample_rate
+        self.audio_buffer = bytearray()
+        self.buffer_limit = sample_rate * 2
+
+    def process_audio(self, audio_bytes: bytes):
+        bytes_len = len(audio_bytes)
+        if bytes_len % 2 != 0:
+            audio_bytes = audio_bytes[:bytes_len - 1]
+        audio_array = np.frombuffer(audio_bytes, dtype=np.int16)
+        mean_abs = np.mean(np.abs(audio_array))
+        if mean_abs > 30000 or mean_abs < 10:
+            return None
+
+        if len(self.audio_buffer) / 2 / self.sample_rate > 0.5:
+            self.audio_buffer = bytearray()
+        new_buffer = bytearray(self.audio_buffer)
+        if np.mean(np.abs(audio_array)) >= 50:
+            new_buffer.extend(audio_array.tobytes())
+        self.audio_buffer = new_buffer
+
+        max_bytes = self.buffer_limit * 2
+        if len(self.audio_buffer) > max_bytes:
+            self.audio_buffer = self.audio_buffer[-max_bytes:]
+        return np.frombuffer(self.audio_buffer, dtype=np.int16)
+
+class PassThroughGate:
+    """Stands in for the VoiceActivityDetector so only buffering is measured"""
+
+    speech_ended = False
+    speech_ratio = 1.0
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        return samples
+
+    def reset(self):
+        pass
+
+def ungated_processor() -> AudioProcessor:
+    """AudioProcessor that buffers every chunk, without the VAD"""
+    processor = AudioProcessor()
+    processor.vad = PassThroughGate()
+    return processor
+
+class VadOnly:
+    """The voice activity detector alone, fed the same chunks"""
+
+    def __init__(self):
+        self.vad = VoiceActivityDetector()
+
+    def process_audio(self, audio_bytes: bytes):
+        return self.vad.process(np.frombuffer(audio_bytes, dtype=np.int16))
+
+def make_chunks(count: int):
+    """Pre-build client chunks so the benchmark only measures processing"""
+    audio = synthetic_audio(count * CHUNK_SAMPLES / 16000 + 1)
+    return [audio[i * CHUNK_SAMPLES:(i + 1) * CHUNK_SAMPLES].tobytes() for i in range(count)]
+
+def measure(factory, sessions: int, chunks) -> dict:
+    """Feed every chunk to every session and measure time and transient allocations per chunk"""
+    processors = [factory() for _ in range(sessions)]
+    total_chunks = sessions * len(chunks)
+
+    # Timing pass
+    start = time.perf_counter_ns()
+    for chunk in chunks:
+        for processor in processors:
+            processor.process_audio(chunk)
+    elapsed_ns = time.perf_counter_ns() - start
+
+    # Allocation pass: peak bytes allocated while handling each chunk
+    tracemalloc.start()
+    allocated = 0
+    for chunk in chunks:
+        for processor in processors:
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            processor.process_audio(chunk)
+            _, peak = tracemalloc.get_traced_memory()
+            allocated += peak - before
+    tracemalloc.stop()
+
+    return {
+        "sessions": sessions,
+        "chunks": total_chunks,
+        "ns_per_chunk": elapsed_ns / total_chunks,
+        "peak_bytes_allocated_per_chunk": allocated / total_chunks,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=128, help="Number of concurrent sessions")
+    parser.add_argument("--chunks", type=int, default=50, help="Chunks fed to each session")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    chunks = make_chunks(args.chunks)
+    results = {
+        "bytearray": measure(BytearrayProcessor, args.sessions, chunks),
+        "ring_buffer": measure(ungated_processor, args.sessions, chunks),
+        "vad": measure(VadOnly, args.sessions, chunks),
+        "processor_with_vad": measure(AudioProcessor, args.sessions, chunks),
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for name, r in results.items():
+        print(f"{name:>18}: {r['ns_per_chunk']:10.0f} ns/chunk, "
+              f"{r['peak_bytes_allocated_per_chunk']:10.0f} bytes allocated/chunk "
+              f"({r['sessions']} sessions, {r['chunks']} chunks)")
+
+if __name__ == "__main__":
+    main()
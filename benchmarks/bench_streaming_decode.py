@@ -0,0 +1,100 @@
+"""
+Decode CPU per second of audio: rolling-buffer re-feed vs incremental streaming
+
+The rolling-buffer path reproduces the previous AudioProcessor behaviour,
+where the whole accumulated buffer (up to 0.5 s) was passed to the
+recognizer on every chunk. The streaming path uses the current processor,
+which hands each sample to the recognizer exactly once.
+
+Usage:
+    python -m benchmarks.bench_streaming_decode [--wav FILE] [--model DIR]
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.common import SAMPLE_RATE, iter_chunks, load_audio
+from models.asr_model import SpeechModel
+from utils.audio_processor import AudioProcessor
+
+def legacy_rolling_buffer(chunks):
+    """Yield what the old processor returned for each chunk: the whole rolling buffer"""
+    buffer = bytearray()
+    for chunk in chunks:
+        if len(buffer) / 2 / SAMPLE_RATE > 0.5:
+            buffer = bytearray()
+        samples = np.frombuffer(chunk, dtype=np.int16)
+        if np.mean(np.abs(samples)) >= 50:
+            buffer.extend(chunk)
+        if len(buffer) // 2 > 1600:
+            yield np.frombuffer(bytes(buffer), dtype=np.int16)
+
+def streaming(chunks):
+    """Yield what the current processor returns for each chunk: only new audio"""
+    processor = AudioProcessor()
+    for chunk in chunks:
+        audio = processor.process_audio(chunk)
+        if audio is not None:
+            yield audio
+    tail = processor.flush()
+    if tail is not None:
+        yield tail
+
+def run(model: SpeechModel, audio: np.ndarray, feeder) -> dict:
+    """Decode audio through a fresh recognizer and measure CPU time spent in transcribe()"""
+    recognizer = model.create_recognizer()
+    cpu = 0.0
+    samples_decoded = 0
+    calls = 0
+    for block in feeder(iter_chunks(audio)):
+        start = time.process_time()
+        model.transcribe(block, recognizer)
+        cpu += time.process_time() - start
+        samples_decoded += len(block)
+        calls += 1
+
+    audio_seconds = len(audio) / SAMPLE_RATE
+    return {
+        "audio_seconds": audio_seconds,
+        "decode_calls": calls,
+        "samples_decoded_per_input_sample": samples_decoded / len(audio),
+        "cpu_seconds": cpu,
+        "cpu_per_audio_second": cpu / audio_seconds,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--wav", help="16 kHz mono WAV file (default: 30 s of synthetic audio)")
+    parser.add_argument("--model", help="Vosk model directory")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    try:
+        model = SpeechModel(args.model)
+    except (FileNotFoundError, ImportError) as e:
+        print(f"A Vosk model is required for this benchmark: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    audio = load_audio(args.wav)
+    results = {
+        "rolling_buffer": run(model, audio, legacy_rolling_buffer),
+        "streaming": run(model, audio, streaming),
+    }
+    results["speedup"] = (results["rolling_buffer"]["cpu_per_audio_second"]
+                          / max(results["streaming"]["cpu_per_audio_second"], 1e-9))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for name in ("rolling_buffer", "streaming"):
+        r = results[name]
+        print(f"{name:>15}: {r['cpu_per_audio_second'] * 1000:8.1f} ms CPU per audio second, "
+              f"{r['samples_decoded_per_input_sample']:.2f}x samples decoded, {r['decode_calls']} calls")
+    print(f"{'speedup':>15}: {results['speedup']:.2f}x")
+
+if __name__ == "__main__":
+    main()
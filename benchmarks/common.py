@@ -0,0 +1,57 @@
+import wave
+from typing import Optional
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+CHUNK_SAMPLES = 4096  # matches the browser client's buffer size
+
+def load_wav(path: str) -> np.ndarray:
+    """
+    Load a 16 kHz mono 16-bit WAV file
+
+    Args:
+        path: Path to the WAV file
+
+    Returns:
+        Audio samples as int16 numpy array
+    """
+    with wave.open(path, "rb") as wf:
+        if wf.getframerate() != SAMPLE_RATE or wf.getnchannels() != 1 or wf.getsampwidth() != 2:
+            raise ValueError(f"{path}: expected 16 kHz mono 16-bit PCM")
+        return np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+
+def synthetic_audio(seconds: float, seed: int = 0) -> np.ndarray:
+    """
+    Generate speech-like test audio: noise bursts modulated at syllable rate
+
+    Args:
+        seconds: Duration of the audio
+        seed: Random seed so runs are reproducible
+
+    Returns:
+        Audio samples as int16 numpy array
+    """
+    rng = np.random.default_rng(seed)
+    n = int(seconds * SAMPLE_RATE)
+    t = np.arange(n) / SAMPLE_RATE
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t)
+    audio = rng.normal(0, 4000, n) * envelope
+    return np.clip(audio, -32768, 32767).astype(np.int16)
+
+def load_audio(path: Optional[str], seconds: float = 30.0) -> np.ndarray:
+    """Load a WAV file, or fall back to synthetic audio when no path is given"""
+    if path:
+        return load_wav(path)
+    return synthetic_audio(seconds)
+
+def iter_chunks(audio: np.ndarray, chunk_samples: int = CHUNK_SAMPLES):
+    """Yield consecutive chunks of audio as raw PCM bytes, as a client would send them"""
+    for start in range(0, len(audio), chunk_samples):
+        yield audio[start:start + chunk_samples].tobytes()
+
+def percentiles(values, points=(50, 95, 99)) -> dict:
+    """Summarize a list of measurements as {"p50": ..., "p95": ..., "p99": ...}"""
+    if not len(values):
+        return {f"p{p}": None for p in points}
+    return {f"p{p}": float(np.percentile(values, p)) for p in points}
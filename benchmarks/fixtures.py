@@ -0,0 +1,109 @@
+"""
+Benchmark audio fixtures with word timing annotations
+
+A fixture directory holds 16 kHz mono WAV files, each with an optional JSON
+sidecar of the same name listing the spoken words and their times:
+
+    {"words": [{"word": "play", "start": 1.20, "end": 1.55}]}
+
+The end times are used to measure command latency from the end of the
+spoken word. Without a directory, synthetic fixtures are generated: voiced
+bursts at known times separated by low-level noise.
+"""
+import json
+import os
+from typing import List, Optional
+
+import numpy as np
+
+from benchmarks.common import SAMPLE_RATE, load_wav
+
+class Fixture:
+    """One audio clip and its annotated words"""
+
+    def __init__(self, name: str, audio: np.ndarray, words: Optional[List[dict]] = None):
+        """
+        Args:
+            name: Identifier used in results
+            audio: 16 kHz mono int16 samples
+            words: Annotations with "word", "start" and "end" in seconds
+        """
+        self.name = name
+        self.audio = audio
+        self.words = words or []
+
+    @property
+    def duration(self) -> float:
+        """Length of the clip in seconds"""
+        return len(self.audio) / SAMPLE_RATE
+
+def load_fixtures(directory: str) -> List[Fixture]:
+    """
+    Load every WAV file in a directory together with its JSON sidecar
+
+    Args:
+        directory: Fixture directory
+
+    Returns:
+        Fixtures sorted by file name
+    """
+    fixtures = []
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith(".wav"):
+            continue
+        path = os.path.join(directory, name)
+        sidecar = os.path.splitext(path)[0] + ".json"
+        words = []
+        if os.path.exists(sidecar):
+            with open(sidecar, "r") as f:
+                words = json.load(f).get("words", [])
+        fixtures.append(Fixture(name, load_wav(path), words))
+    return fixtures
+
+def synthetic_fixture(name: str, words: List[str], seconds: float = 10.0, seed: int = 0) -> Fixture:
+    """
+    Generate a clip with voiced bursts at evenly spaced, annotated times
+
+    Args:
+        name: Identifier used in results
+        words: Words to place in the clip, one burst each
+        seconds: Clip length
+        seed: Random seed so fixtures are reproducible
+
+    Returns:
+        Fixture whose annotations mark each burst
+    """
+    rng = np.random.default_rng(seed)
+    n = int(seconds * SAMPLE_RATE)
+    audio = rng.normal(0, 30, n)
+
+    annotations = []
+    spacing = seconds / (len(words) + 1)
+    for i, word in enumerate(words):
+        start = spacing * (i + 1) - 0.2
+        length = 0.4
+        s, e = int(start * SAMPLE_RATE), int((start + length) * SAMPLE_RATE)
+        t = np.arange(e - s) / SAMPLE_RATE
+
+        # Harmonic source with a pitch glide and syllable envelope, close enough to voice for a VAD
+        pitch = 120 + 40 * t / length
+        phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+        burst = sum(np.sin(k * phase) / k for k in range(1, 12))
+        envelope = np.sin(np.pi * t / length)
+        audio[s:e] += 6000 * burst * envelope / 3
+
+        annotations.append({"word": word, "start": round(start, 3), "end": round(start + length, 3)})
+
+    return Fixture(name, np.clip(audio, -32768, 32767).astype(np.int16), annotations)
+
+def default_fixtures(count: int = 4, seconds: float = 10.0) -> List[Fixture]:
+    """Synthetic fixtures alternating between the built-in command words"""
+    vocabulary = ["play", "pause", "stop", "start"]
+    return [
+        synthetic_fixture(f"synthetic-{i}", [vocabulary[(i + j) % len(vocabulary)] for j in range(3)], seconds, seed=i)
+        for i in range(count)
+    ]
+
+def get_fixtures(directory: Optional[str] = None) -> List[Fixture]:
+    """Load fixtures from a directory, or generate the default synthetic set"""
+    return load_fixtures(directory) if directory else default_fixtures()
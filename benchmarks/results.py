@@ -0,0 +1,85 @@
+"""
+Storing benchmark results as JSON and comparing runs
+"""
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+from typing import Optional
+
+def run_metadata() -> dict:
+    """Describe the machine and code version a benchmark ran on"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                timeout=5).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "argv": sys.argv[1:],
+    }
+
+def save_results(benchmark: str, results: dict, path: Optional[str] = None) -> str:
+    """
+    Write results with run metadata to a JSON file
+
+    Args:
+        benchmark: Benchmark name
+        results: Measurements to store
+        path: Output file. Defaults to bench_results/<benchmark>-<timestamp>.json
+
+    Returns:
+        Path of the written file
+    """
+    document = {"benchmark": benchmark, "meta": run_metadata(), "results": results}
+    if path is None:
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        os.makedirs("bench_results", exist_ok=True)
+        path = os.path.join("bench_results", f"{benchmark}-{stamp}.json")
+    with open(path, "w") as f:
+        json.dump(document, f, indent=2)
+    return path
+
+def _flatten(value, prefix: str = "") -> dict:
+    """Flatten nested dicts and lists into {"a.0.c": number}, keeping only numeric leaves"""
+    flat = {}
+    if isinstance(value, (dict, list)):
+        items = value.items() if isinstance(value, dict) else enumerate(value)
+        for key, item in items:
+            flat.update(_flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        flat[prefix] = value
+    return flat
+
+def compare(baseline_path: str, candidate_path: str) -> str:
+    """
+    Compare two result files metric by metric
+
+    Args:
+        baseline_path: Earlier run
+        candidate_path: Run to compare against the baseline
+
+    Returns:
+        Table of metrics with their relative change
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+
+    base = _flatten(baseline.get("results", baseline))
+    cand = _flatten(candidate.get("results", candidate))
+
+    width = max((len(k) for k in base), default=10)
+    lines = [f"{'metric':<{width}}  {'baseline':>12}  {'candidate':>12}  {'change':>8}"]
+    for key in sorted(base.keys() & cand.keys()):
+        old, new = base[key], cand[key]
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+        lines.append(f"{key:<{width}}  {old:>12.4g}  {new:>12.4g}  {change:>8}")
+    return "\n".join(lines)
@@ -1,141 +1,352 @@
-import os
+import copy
 import logging
 import numpy as np
 import json
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, List, Optional
+
+from models.backends import BACKEND_KWS, BACKEND_SCRIPTED, BACKEND_VOSK, RecognizerBackend, ScriptedBackend, VoskBackend
+from models.kws import DEFAULT_KWS_MODEL_PATH, KeywordSpotterBackend
+from utils import fast_json
+from utils.command_matcher import CommandMatcher
 
 logger = logging.getLogger(__name__)
 
+# Where the model is expected when no path is given
+DEFAULT_MODEL_PATH = "models/data/vosk-model-small-en-us-0.15"
+
+class Recognition:
+    """
+    One recognizer result
+    
+    Confidence is the mean word confidence, and start and end are the times
+    of the first and last word in seconds of stream audio. Words holds
+    Vosk's per-word entries ("word", "conf", "start", "end"), one per word of
+    text. They are None when word timing is off.
+    """
+    
+    __slots__ = ("text", "is_final", "confidence", "start", "end", "words")
+    
+    def __init__(self, text: str = "", is_final: bool = False, confidence: Optional[float] = None,
+                 start: Optional[float] = None, end: Optional[float] = None, words: Optional[List[dict]] = None):
+        self.text = text
+        self.is_final = is_final
+        self.confidence = confidence
+        self.start = start
+        self.end = end
+        self.words = words
+    
+    @classmethod
+    def from_words(cls, text: str, is_final: bool, words: Optional[List[dict]]) -> "Recognition":
+        """
+        Build a result from Vosk's per-word entries
+        
+        Args:
+            text: Cleaned transcript
+            is_final: Whether the recognizer finished the utterance
+            words: Entries with "conf", "start" and "end", or None
+            
+        Returns:
+            Recognition with confidence and times filled in when available
+        """
+        if not words:
+            return cls(text, is_final)
+        confidence = sum(word.get("conf", 1.0) for word in words) / len(words)
+        return cls(text, is_final, confidence, words[0].get("start"), words[-1].get("end"), words)
+
+class StreamState:
+    """Per-stream decode cache, owned by the caller alongside its recognizer"""
+    
+    def __init__(self):
+        self.last_partial_raw: Optional[str] = None
+        self.last_partial = Recognition()
+    
+    def reset(self):
+        """Forget the cached partial, after a final result or a recognizer reset"""
+        self.last_partial_raw = None
+        self.last_partial = Recognition()
+
 class SpeechModel:
     """
-    A speech recognition model using Vosk for real-time transcription
+    A speech recognition model for real-time transcription
+    
+    Decoding runs on a RecognizerBackend (see models/backends.py): Vosk, the
+    NumPy keyword spotter for small command sets (models/kws.py), or the
+    scripted stand-in for tests and capacity planning without a model.
+    The stand-in only runs when it is chosen; a missing Vosk model fails
+    the load.
     """
     
-    def __init__(self, model_path: Optional[str] = None):
+    # Recognizer modes: free-form large-vocabulary decoding, or decoding
+    # restricted to a grammar of command words
+    MODE_FULL = "full"
+    MODE_KEYWORD = "keyword"
+    
+    def __init__(self, model_path: Optional[str] = None, mode: str = MODE_FULL,
+                 vocabulary: Optional[Iterable[str]] = None, word_timing: Optional[bool] = None,
+                 backend: str = BACKEND_VOSK, backend_options: Optional[dict] = None):
         """
         Initialize the speech model
         
         Args:
-            model_path: Path to the pre-trained model. If None, will download a small model.
+            model_path: Vosk model directory, defaults to DEFAULT_MODEL_PATH. For
+                the scripted backend a script file, defaults to its built-in script,
+                and for the keyword spotter a model file, defaults to DEFAULT_KWS_MODEL_PATH.
+            mode: "full" for large-vocabulary decoding or "keyword" to restrict
+                recognizers to a grammar built from the vocabulary
+            vocabulary: Command words and phrases, the grammar in keyword mode.
+                Defaults to the built-in command vocabulary.
+            word_timing: Whether recognizers report per-word timing. Defaults to
+                on in full mode and off in keyword mode.
+            backend: "vosk", "scripted" or "kws"
+            backend_options: Extra backend arguments, e.g. cpu_per_second for the scripted backend
+
+        Raises:
+            FileNotFoundError: If the model directory or file does not exist
+            ImportError: If vosk is not installed
         """
+        if mode not in (self.MODE_FULL, self.MODE_KEYWORD):
+            raise ValueError(f"Unknown recognizer mode: {mode}")
+        
         self.sample_rate = 16000  # 16kHz is standard for speech
         
-        # Keywords we're particularly interested in
-        self.keywords = ["play", "pause"]
+        # Command words and phrases of the active vocabulary
+        self.keywords = list(vocabulary or []) or CommandMatcher.default().vocabulary()
+        
+        self.mode = mode
+        self.model_path = str(model_path) if model_path is not None else None
+        self.word_timing = word_timing if word_timing is not None else mode == self.MODE_FULL
+        self.grammar = None
+        if mode == self.MODE_KEYWORD:
+            self.grammar = self.build_grammar(self.keywords)
+            logger.info(f"Keyword spotting mode with grammar {self.grammar}")
         
         try:
-            # Import vosk
-            from vosk import Model, KaldiRecognizer
-            
-            # Use default model path if not provided
-            if model_path is None:
-                # Create models directory if it doesn't exist
-                models_dir = Path('./models/data')
-                models_dir.mkdir(parents=True, exist_ok=True)
-                
-                model_path = models_dir / "vosk-model-small-en-us-0.15"
-                
-                # Check if model exists, if not guide user to download
-                if not model_path.exists():
-                    logger.info(f"Vosk model not found at {model_path}")
-                    logger.info("Please download the model from https://alphacephei.com/vosk/models")
-                    logger.info("and extract it to the models/data directory")
-                    logger.info("For this example, we recommend the small English model (vosk-model-small-en-us-0.15)")
-                    
-                    # Create dummy model for demonstration
-                    self.vosk_model = None
-                    self.recognizer = None
-                    self.is_dummy = True
-                    logger.warning("Using dummy model for demonstration")
-                    return
-            
-            # Load the model
-            logger.info(f"Loading Vosk model from {model_path}")
-            self.vosk_model = Model(str(model_path))
-            
-            # Create recognizer
-            self.recognizer = KaldiRecognizer(self.vosk_model, self.sample_rate)
-            
-            # Set up partial results for faster responses
-            self.recognizer.SetPartialWords(True)
-            self.recognizer.SetWords(True)
+            self.backend = self._load_backend(backend, backend_options or {})
+        except Exception as e:
+            if backend == BACKEND_VOSK:
+                logger.error(f"Error loading Vosk model: {e}")
+                logger.info("Please download the model from https://alphacephei.com/vosk/models")
+                logger.info("and extract it to the models/data directory")
+                logger.info("For this example, we recommend the small English model (vosk-model-small-en-us-0.15)")
+                logger.info("To run without a model, choose the scripted stand-in with RECOGNIZER_BACKEND=scripted")
+            raise
+        
+        # Default recognizer for single-stream callers
+        self.recognizer = self.create_recognizer()
+    
+    def _load_backend(self, backend: str, options: dict) -> RecognizerBackend:
+        """Load the named backend for self.model_path"""
+        if backend == BACKEND_SCRIPTED:
+            if self.model_path is None:
+                return ScriptedBackend(**options)
+            return ScriptedBackend.from_file(self.model_path, **options)
+        if backend == BACKEND_KWS:
+            if self.model_path is None:
+                self.model_path = DEFAULT_KWS_MODEL_PATH
+            return KeywordSpotterBackend(self.model_path, **options)
+        if backend != BACKEND_VOSK:
+            raise ValueError(f"Unknown recognizer backend: {backend}")
+        
+        if self.model_path is None:
+            self.model_path = DEFAULT_MODEL_PATH
+            # Create models directory if it doesn't exist
+            Path(DEFAULT_MODEL_PATH).parent.mkdir(parents=True, exist_ok=True)
+        
+        # Load the model once; recognizers created from it share its memory
+        vosk = VoskBackend(self.model_path)
+        logger.info("Vosk model loaded successfully")
+        return vosk
+    
+    def with_vocabulary(self, vocabulary: Iterable[str]) -> "SpeechModel":
+        """
+        Copy of this model for a new command vocabulary
+        
+        The copy shares the loaded backend, so switching vocabularies does
+        not load the model again. In keyword mode its grammar is rebuilt from
+        the new vocabulary.
+        
+        Args:
+            vocabulary: Command words and phrases
             
-            logger.info("Vosk model loaded successfully")
-            self.is_dummy = False
+        Returns:
+            SpeechModel for the new vocabulary
+        """
+        model = copy.copy(self)
+        model.keywords = list(vocabulary or []) or CommandMatcher.default().vocabulary()
+        if self.mode == self.MODE_KEYWORD:
+            model.grammar = self.build_grammar(model.keywords)
+            model.recognizer = model.create_recognizer()
+            logger.info(f"Keyword spotting mode with grammar {model.grammar}")
+        return model
+    
+    def create_recognizer(self):
+        """
+        Create a new recognizer backed by the shared model
+        
+        Recognizers are cheap compared to the model itself, so every stream
+        should get its own instead of sharing decoder state.
+        
+        Returns:
+            A RecognizerStream, a KaldiRecognizer with the Vosk backend
+        """
+        return self.backend.create_stream(self.sample_rate, self.grammar, self.word_timing)
+    
+    @staticmethod
+    def build_grammar(vocabulary: Iterable[str]) -> str:
+        """
+        Build a Vosk grammar that only allows the given words and phrases
+        
+        Args:
+            vocabulary: Words or phrases the recognizer may output
             
-        except Exception as e:
-            logger.error(f"Error loading Vosk model: {e}")
-            logger.warning("Using dummy model for demonstration")
-            self.vosk_model = None
-            self.recognizer = None
-            self.is_dummy = True
+        Returns:
+            JSON grammar string, including "[unk]" so that other speech is not
+            forced onto a command word
+        """
+        phrases = sorted({phrase.lower().strip() for phrase in vocabulary if phrase.strip()})
+        return json.dumps(phrases + ["[unk]"])
     
-    def transcribe(self, audio_data: np.ndarray) -> str:
+    def transcribe(self, audio_data: np.ndarray, recognizer=None) -> str:
         """
         Transcribe audio data to text
         
+        The recognizer is streaming: pass each new chunk of audio exactly
+        once rather than re-sending previously decoded samples.
+        
         Args:
-            audio_data: Audio data as numpy array with shape (n,) and sample rate 16kHz
+            audio_data: New audio as numpy array with shape (n,) and sample rate 16kHz
+            recognizer: Recognizer holding the stream state. Defaults to the
+                model's own recognizer.
             
         Returns:
             Transcribed text
         """
-        if audio_data is None or len(audio_data) < 1600:  # At least 0.1 seconds of audio
-            return ""
+        return self.decode(audio_data, recognizer).text
+    
+    def decode(self, audio_data: np.ndarray, recognizer=None,
+               state: Optional["StreamState"] = None) -> "Recognition":
+        """
+        Transcribe audio data into a structured result
+        
+        Args:
+            audio_data: New audio as numpy array with shape (n,) and sample rate 16kHz
+            recognizer: Recognizer holding the stream state. Defaults to the
+                model's own recognizer.
+            state: Per-stream cache. When given, a partial result whose raw
+                JSON is unchanged since the previous call is not parsed again.
             
-        try:
-            # If we're using a dummy model, return a simple result
-            if self.is_dummy:
-                return self._dummy_transcribe(audio_data)
+        Returns:
+            Recognition with the text, whether it is final, and confidence and
+            word times when the recognizer reports them
+        """
+        if audio_data is None or len(audio_data) == 0:
+            return Recognition()
             
+        try:
             # Convert to int16 PCM as expected by Vosk
             if audio_data.dtype != np.int16:
                 audio_data = (audio_data * 32767).astype(np.int16)
             
+            if recognizer is None:
+                recognizer = self.recognizer
+            
             # Send data to recognizer
-            recognizer_delay = 0.01  # 10ms delay to avoid overloading
-            if self.recognizer.AcceptWaveform(audio_data.tobytes()):
+            if recognizer.AcceptWaveform(audio_data.tobytes()):
                 # Get full result
-                result = json.loads(self.recognizer.Result())
-                text = result.get("text", "").lower().strip()
-                if text:
-                    print(f"[VOSK FULL] {text}")  # Print to terminal for debugging
-                    
-                    # Directly check for keywords
-                    for keyword in self.keywords:
-                        if keyword in text.split() or text == keyword:
-                            print(f"[KEYWORD DETECTED] {keyword}")
-                            return keyword
-            else:
-                # Get partial result for real-time feedback
-                result = json.loads(self.recognizer.PartialResult())
-                text = result.get("partial", "").lower().strip()
-                if text:  # Only print if there's actual content
-                    print(f"[VOSK PARTIAL] {text}")  # Print to terminal for debugging
-                    
-                    # Check for clear keyword matches even in partial results
-                    for keyword in self.keywords:
-                        if text == keyword or f" {keyword} " in f" {text} ":
-                            print(f"[KEYWORD DETECTED IN PARTIAL] {keyword}")
-                            return keyword
+                if state is not None:
+                    state.reset()
+                result = self._parse_result(recognizer.Result(), True)
+                if result.text:
+                    logger.debug("[VOSK FULL] %s", result.text)
+                return result
             
-            # Return the text even if empty for real-time feedback
-            return text
+            # Get partial result for real-time feedback, reusing the last parse
+            # while the hypothesis is unchanged
+            raw = recognizer.PartialResult()
+            if state is not None and raw == state.last_partial_raw:
+                return state.last_partial
+            result = self._parse_result(raw, False)
+            if result.text:
+                logger.debug("[VOSK PARTIAL] %s", result.text)
+            if state is not None:
+                state.last_partial_raw = raw
+                state.last_partial = result
+            
+            # Return the result even if empty for real-time feedback
+            return result
             
         except Exception as e:
-            logger.error(f"Error in transcription: {e}")
+            logger.error("Error in transcription: %s", e)
+            return Recognition()
+    
+    def _parse_result(self, raw: str, is_final: bool) -> "Recognition":
+        """
+        Parse a Vosk Result() or PartialResult() string
+        
+        Args:
+            raw: JSON string from the recognizer
+            is_final: Whether it came from Result()
+            
+        Returns:
+            Recognition with the full transcript, commands are matched by the caller
+        """
+        data = fast_json.loads(raw)
+        text = self._clean_text(data.get("text" if is_final else "partial", ""))
+        words = data.get("result" if is_final else "partial_result")
+        if words and self.grammar is not None:
+            words = [word for word in words if word.get("word") != "[unk]"]
+        return Recognition.from_words(text, is_final, words)
+            
+    def finalize(self, recognizer=None) -> str:
+        """
+        Flush the recognizer at the end of a stream and return the last utterance
+        
+        Args:
+            recognizer: Recognizer holding the stream state. Defaults to the
+                model's own recognizer.
+            
+        Returns:
+            Final transcribed text of any audio not yet returned as a full result
+        """
+        try:
+            if recognizer is None:
+                recognizer = self.recognizer
+            result = fast_json.loads(recognizer.FinalResult())
+            return self._clean_text(result.get("text", ""))
+        except Exception as e:
+            logger.error(f"Error finalizing transcription: {e}")
             return ""
+    
+    def decode_final(self, recognizer=None, state: Optional["StreamState"] = None) -> "Recognition":
+        """
+        Force the recognizer to finish the current utterance
+        
+        Used when the caller knows speech has ended, so the final result does
+        not wait for Vosk's own endpointing. The recognizer keeps accepting
+        audio afterwards, starting a new utterance.
+        
+        Args:
+            recognizer: Recognizer holding the stream state. Defaults to the
+                model's own recognizer.
+            state: Per-stream cache, cleared along with the utterance
             
-    def _dummy_transcribe(self, audio_data: np.ndarray) -> str:
-        """Simulate transcription with random outputs focused on our keywords"""
-        import random
-        
-        # Randomly return keywords sometimes for demo purposes
-        r = random.random()
-        if r < 0.05:
-            return "play"
-        elif r < 0.1:
-            return "pause"
-        else:
-            return ""
\ No newline at end of file
+        Returns:
+            Final Recognition of the audio since the last final result
+        """
+        try:
+            if recognizer is None:
+                recognizer = self.recognizer
+            if state is not None:
+                state.reset()
+            return self._parse_result(recognizer.FinalResult(), True)
+        except Exception as e:
+            logger.error("Error forcing a final result: %s", e)
+            return Recognition("", True)
+    
+    def _clean_text(self, text: str) -> str:
+        """Normalize recognizer output, dropping grammar filler tokens in keyword mode"""
+        text = text.lower().strip()
+        if self.grammar is not None and "[unk]" in text:
+            text = " ".join(word for word in text.split() if word != "[unk]")
+        return text
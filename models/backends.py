@@ -0,0 +1,286 @@
+import hashlib
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Backends SpeechModel can run on, chosen with RECOGNIZER_BACKEND
+BACKEND_VOSK = "vosk"          # Kaldi decoding with a Vosk model directory
+BACKEND_SCRIPTED = "scripted"  # deterministic stand-in replaying a script, for tests without a model
+BACKEND_KWS = "kws"            # NumPy keyword spotter for small command sets, see models/kws.py
+
+class RecognizerStream(ABC):
+    """
+    One streaming recognition session, the interface SpeechModel decodes with
+
+    The methods are those of vosk.KaldiRecognizer, so Vosk recognizers are
+    used as they are. Results are JSON strings in Vosk's format:
+
+        Result(), FinalResult(): {"text": "...", "result": [{"word", "conf", "start", "end"}, ...]}
+        PartialResult():         {"partial": "...", "partial_result": [...]}
+
+    The word lists are only present when word timing was requested, and
+    times are seconds of audio accepted since the last Reset(). Subclasses
+    implement every method; vosk.KaldiRecognizer has them without subclassing.
+    """
+
+    @abstractmethod
+    def AcceptWaveform(self, data: bytes) -> bool:
+        """Decode 16 kHz mono 16-bit PCM, True when an utterance has just ended"""
+
+    @abstractmethod
+    def Result(self) -> str:
+        """The utterance that just ended"""
+
+    @abstractmethod
+    def PartialResult(self) -> str:
+        """Hypothesis for the utterance in progress"""
+
+    @abstractmethod
+    def FinalResult(self) -> str:
+        """End the utterance in progress now and return it"""
+
+    @abstractmethod
+    def Reset(self):
+        """Forget all state, for a new stream"""
+
+class RecognizerBackend(ABC):
+    """
+    A loaded recognition model that creates streams
+
+    The model is loaded once and shared; streams are cheap and there is one
+    per connection.
+    """
+
+    name = ""
+
+    @abstractmethod
+    def create_stream(self, sample_rate: int, grammar: Optional[str] = None,
+                      word_timing: bool = False) -> RecognizerStream:
+        """
+        Create a stream
+
+        Args:
+            sample_rate: Sample rate of the audio the stream will accept
+            grammar: JSON list of allowed words and phrases, or None for free decoding
+            word_timing: Whether results include per-word entries
+
+        Returns:
+            A new stream
+        """
+
+    def describe(self) -> dict:
+        """Backend details for status endpoints"""
+        return {"backend": self.name}
+
+class VoskBackend(RecognizerBackend):
+    """Kaldi decoding with a Vosk model, the production backend"""
+
+    name = BACKEND_VOSK
+
+    def __init__(self, model_path: str):
+        """
+        Load a Vosk model
+
+        Args:
+            model_path: Model directory
+
+        Raises:
+            FileNotFoundError: If the directory does not exist
+            ImportError: If vosk is not installed
+        """
+        from vosk import KaldiRecognizer, Model
+
+        if not Path(model_path).exists():
+            raise FileNotFoundError(f"Vosk model not found at {model_path}")
+        logger.info(f"Loading Vosk model from {model_path}")
+        self.model_path = str(model_path)
+        self._recognizer_class = KaldiRecognizer
+        self.model = Model(str(model_path))
+
+    def create_stream(self, sample_rate: int, grammar: Optional[str] = None,
+                      word_timing: bool = False) -> RecognizerStream:
+        if grammar is not None:
+            recognizer = self._recognizer_class(self.model, sample_rate, grammar)
+        else:
+            recognizer = self._recognizer_class(self.model, sample_rate)
+
+        # Word timing costs extra work per result, only enable it when wanted
+        recognizer.SetPartialWords(word_timing)
+        recognizer.SetWords(word_timing)
+        return recognizer
+
+    def describe(self) -> dict:
+        return {"backend": self.name, "path": self.model_path}
+
+class ScriptedBackend(RecognizerBackend):
+    """
+    Deterministic stand-in that replays a scripted transcript
+
+    The script lists words with their start and end in seconds of stream
+    audio, in the format of the benchmark fixture sidecars:
+
+        {"words": [{"word": "play", "start": 1.2, "end": 1.55}], "period": 6.0}
+
+    With "period" the script repeats every period seconds. A stream shows a
+    word in its partial once the audio it has accepted reaches the word's
+    end, as a recognizer has then heard it, and ends the utterance
+    endpoint_seconds after the last word if no further word has ended. The audio content is ignored, so the same
+    amount of audio always gives the same results.
+
+    cpu_per_second sets how much CPU a stream burns per second of audio, to
+    stand in for a real model's decoding cost in capacity tests. The work
+    is hashing, which releases the GIL like Vosk's decoder does.
+    """
+
+    name = BACKEND_SCRIPTED
+
+    # Used when no script is given: a command sentence and a lone command every six seconds
+    DEFAULT_SCRIPT = {
+        "words": [
+            {"word": "play", "start": 1.0, "end": 1.35},
+            {"word": "the", "start": 1.4, "end": 1.5},
+            {"word": "music", "start": 1.55, "end": 2.0},
+            {"word": "pause", "start": 4.0, "end": 4.4},
+        ],
+        "period": 6.0,
+    }
+
+    def __init__(self, script: Optional[dict] = None, cpu_per_second: float = 0.0, endpoint_seconds: float = 0.5):
+        """
+        Args:
+            script: Script as described above, defaults to DEFAULT_SCRIPT
+            cpu_per_second: CPU seconds burnt per second of accepted audio
+            endpoint_seconds: Audio after the last word before the utterance ends
+
+        Raises:
+            ValueError: If the script has no words or is not sorted by time
+        """
+        script = script if script is not None else self.DEFAULT_SCRIPT
+        self.words = [(str(w["word"]).lower(), float(w["start"]), float(w["end"])) for w in script.get("words", [])]
+        if not self.words:
+            raise ValueError("Script has no words")
+        if any(b[1] < a[1] or b[2] < a[2] for a, b in zip(self.words, self.words[1:])):
+            raise ValueError("Script words must be sorted by time")
+        self.period = float(script["period"]) if script.get("period") else None
+        if self.period is not None and self.period <= self.words[-1][2]:
+            raise ValueError(f"Script period {self.period} s ends before its last word")
+        self.cpu_per_second = cpu_per_second
+        self.endpoint_seconds = endpoint_seconds
+        self.model_path: Optional[str] = None
+
+    @classmethod
+    def from_file(cls, path: str, **options) -> "ScriptedBackend":
+        """
+        Load a script from a JSON file
+
+        Args:
+            path: Script file
+            **options: cpu_per_second and endpoint_seconds
+
+        Returns:
+            Backend replaying the script
+        """
+        with open(path, "r") as f:
+            backend = cls(json.load(f), **options)
+        backend.model_path = str(path)
+        return backend
+
+    def word(self, index: int):
+        """The index-th word of the script, repeated every period, or None past the end"""
+        if self.period is None:
+            return self.words[index] if index < len(self.words) else None
+        cycle, i = divmod(index, len(self.words))
+        word, start, end = self.words[i]
+        offset = cycle * self.period
+        return word, start + offset, end + offset
+
+    def create_stream(self, sample_rate: int, grammar: Optional[str] = None,
+                      word_timing: bool = False) -> RecognizerStream:
+        allowed = {word for phrase in json.loads(grammar) for word in phrase.split()} if grammar is not None else None
+        return ScriptedStream(self, sample_rate, allowed, word_timing)
+
+    def describe(self) -> dict:
+        return {"backend": self.name, "path": self.model_path, "cpu_per_second": self.cpu_per_second,
+                "script_words": len(self.words), "period": self.period}
+
+class ScriptedStream(RecognizerStream):
+    """Stream of a ScriptedBackend, see there"""
+
+    # Data hashed to burn CPU, large enough for hashlib to release the GIL
+    _BURN_BLOCK = bytes(65536)
+
+    def __init__(self, backend: ScriptedBackend, sample_rate: int, allowed: Optional[set], word_timing: bool):
+        self.backend = backend
+        self.sample_rate = sample_rate
+        self.allowed = allowed
+        self.word_timing = word_timing
+        self.Reset()
+
+    def Reset(self):
+        self.samples = 0
+        self._next = 0                 # index of the first script word not yet in an utterance
+        self._open: List[tuple] = []   # words of the utterance in progress
+        self._result = self._format("text", "result", [])
+        self._partial = self._format("partial", "partial_result", [])
+
+    def AcceptWaveform(self, data: bytes) -> bool:
+        seconds = len(data) / 2 / self.sample_rate
+        self.samples += len(data) // 2
+        if self.backend.cpu_per_second > 0:
+            self._burn(seconds * self.backend.cpu_per_second)
+        now = self.samples / self.sample_rate
+
+        # Words that have been heard to their end join the utterance
+        changed = False
+        while True:
+            word = self.backend.word(self._next)
+            if word is None or word[2] > now:
+                break
+            self._open.append(word)
+            self._next += 1
+            changed = True
+        if changed:
+            self._partial = self._format("partial", "partial_result", self._open)
+
+        # The utterance ends once the endpoint has passed after its last word
+        if self._open and now >= self._open[-1][2] + self.backend.endpoint_seconds:
+            self._finish()
+            return True
+        return False
+
+    def Result(self) -> str:
+        return self._result
+
+    def PartialResult(self) -> str:
+        return self._partial
+
+    def FinalResult(self) -> str:
+        self._finish()
+        return self._result
+
+    def _finish(self):
+        """Close the utterance in progress"""
+        self._result = self._format("text", "result", self._open)
+        self._open = []
+        self._partial = self._format("partial", "partial_result", [])
+
+    def _format(self, text_key: str, words_key: str, words: List[tuple]) -> str:
+        """Vosk-style JSON for a list of (word, start, end)"""
+        if self.allowed is not None:
+            words = [(w if w in self.allowed else "[unk]", start, end) for w, start, end in words]
+        result = {text_key: " ".join(w for w, _, _ in words)}
+        if self.word_timing and words:
+            result[words_key] = [{"word": w, "conf": 1.0, "start": round(start, 3), "end": round(end, 3)}
+                                 for w, start, end in words]
+        return json.dumps(result)
+
+    def _burn(self, seconds: float):
+        """Use up the given CPU time on this thread"""
+        deadline = time.thread_time() + seconds
+        while time.thread_time() < deadline:
+            hashlib.sha256(self._BURN_BLOCK).digest()
@@ -0,0 +1,470 @@
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from models.backends import BACKEND_KWS, RecognizerBackend, RecognizerStream
+from utils.features import LogMelFeatures
+
+logger = logging.getLogger(__name__)
+
+# Where the keyword model is expected when no path is given, see train_keyword_model.py
+DEFAULT_KWS_MODEL_PATH = "models/data/kws-commands.npz"
+
+# Classifier labels that are not keywords
+SILENCE_LABEL = "_silence_"
+UNKNOWN_LABEL = "_unknown_"
+
+class KeywordModel:
+    """
+    Small keyword classifier over a window of MFCC frames
+
+    One hidden ReLU layer and a softmax over the labels. The input is the
+    last `context` feature frames, flattened. Input normalization is folded
+    into the first layer when the model is loaded, so scoring a batch is two
+    matrix multiplies.
+
+    Models are stored as .npz files holding the weights, the labels, the
+    normalization statistics and the feature settings they were trained with.
+    """
+
+    def __init__(self, labels: Sequence[str], w0: np.ndarray, b0: np.ndarray, w1: np.ndarray, b1: np.ndarray,
+                 mean: np.ndarray, std: np.ndarray, context: int, feature_config: dict):
+        """
+        Args:
+            labels: Class names. Names starting with "_" are not keywords.
+            w0, b0: Hidden layer, (inputs, hidden) and (hidden,)
+            w1, b1: Output layer, (hidden, labels) and (labels,)
+            mean, std: Per-input normalization statistics
+            context: Feature frames per input window
+            feature_config: LogMelFeatures arguments the model was trained with
+        """
+        self.labels = [str(label) for label in labels]
+        self.context = int(context)
+        self.feature_config = dict(feature_config)
+        self.w0, self.b0, self.w1, self.b1 = w0, b0, w1, b1
+        self.mean, self.std = mean, std
+
+        # (x - mean) / std @ w0 + b0 == x @ (w0 / std) + (b0 - mean / std @ w0)
+        scaled = (w0 / std[:, None]).astype(np.float32)
+        self._w0 = scaled
+        self._b0 = (b0 - (mean / std) @ w0).astype(np.float32)
+        self._w1 = w1.astype(np.float32)
+        self._b1 = b1.astype(np.float32)
+
+    @property
+    def keywords(self) -> List[str]:
+        """Labels that are keywords"""
+        return [label for label in self.labels if not label.startswith("_")]
+
+    @classmethod
+    def load(cls, path: str) -> "KeywordModel":
+        """
+        Load a model saved with save()
+
+        Args:
+            path: .npz file
+
+        Returns:
+            The model
+        """
+        with np.load(path, allow_pickle=False) as data:
+            return cls(list(data["labels"]), data["w0"], data["b0"], data["w1"], data["b1"],
+                       data["mean"], data["std"], int(data["context"]), json.loads(str(data["feature_config"])))
+
+    def save(self, path: str):
+        """Store the model as an .npz file"""
+        np.savez(path, labels=np.array(self.labels), w0=self.w0, b0=self.b0, w1=self.w1, b1=self.b1,
+                 mean=self.mean, std=self.std, context=np.array(self.context),
+                 feature_config=np.array(json.dumps(self.feature_config)))
+
+    def score(self, windows: np.ndarray) -> np.ndarray:
+        """
+        Class probabilities for a batch of windows
+
+        Args:
+            windows: Array of shape (batch, context * feature dims)
+
+        Returns:
+            Array of shape (batch, labels)
+        """
+        hidden = windows @ self._w0
+        hidden += self._b0
+        np.maximum(hidden, 0, out=hidden)
+        logits = hidden @ self._w1
+        logits += self._b1
+        logits -= logits.max(axis=1, keepdims=True)
+        np.exp(logits, out=logits)
+        logits /= logits.sum(axis=1, keepdims=True)
+        return logits
+
+def train_keyword_model(windows: np.ndarray, targets: np.ndarray, labels: Sequence[str], context: int,
+                        feature_config: dict, hidden: int = 128, epochs: int = 40, batch_size: int = 64,
+                        learning_rate: float = 1e-3, weight_decay: float = 1e-4,
+                        seed: int = 0) -> KeywordModel:
+    """
+    Train a KeywordModel with Adam on labelled feature windows
+
+    Args:
+        windows: Array of shape (examples, context * feature dims)
+        targets: Label index of each example
+        labels: Class names
+        context: Feature frames per window
+        feature_config: LogMelFeatures arguments the windows were computed with
+        hidden: Hidden layer width
+        epochs: Passes over the data
+        batch_size: Examples per update
+        learning_rate: Adam step size
+        weight_decay: L2 penalty on the weights
+        seed: Random seed for initialization and shuffling
+
+    Returns:
+        The trained model
+    """
+    rng = np.random.default_rng(seed)
+    x = windows.astype(np.float32)
+    mean = x.mean(axis=0)
+    std = x.std(axis=0) + 1e-5
+    x = (x - mean) / std
+    n, inputs = x.shape
+
+    params = [
+        rng.normal(0, np.sqrt(2.0 / inputs), (inputs, hidden)).astype(np.float32),
+        np.zeros(hidden, dtype=np.float32),
+        rng.normal(0, np.sqrt(1.0 / hidden), (hidden, len(labels))).astype(np.float32),
+        np.zeros(len(labels), dtype=np.float32),
+    ]
+    moments = [np.zeros_like(p) for p in params]
+    squares = [np.zeros_like(p) for p in params]
+    step = 0
+
+    for epoch in range(epochs):
+        order = rng.permutation(n)
+        loss = 0.0
+        for start in range(0, n, batch_size):
+            batch = order[start:start + batch_size]
+            xb, yb = x[batch], targets[batch]
+            w0, b0, w1, b1 = params
+
+            # Forward
+            h = np.maximum(xb @ w0 + b0, 0)
+            logits = h @ w1 + b1
+            logits -= logits.max(axis=1, keepdims=True)
+            probs = np.exp(logits)
+            probs /= probs.sum(axis=1, keepdims=True)
+            loss += -np.log(probs[np.arange(len(batch)), yb] + 1e-9).sum()
+
+            # Backward, softmax cross-entropy
+            grad_logits = probs
+            grad_logits[np.arange(len(batch)), yb] -= 1
+            grad_logits /= len(batch)
+            grad_h = grad_logits @ w1.T
+            grad_h[h <= 0] = 0
+            grads = [xb.T @ grad_h + weight_decay * w0, grad_h.sum(axis=0),
+                     h.T @ grad_logits + weight_decay * w1, grad_logits.sum(axis=0)]
+
+            step += 1
+            for param, grad, m, v in zip(params, grads, moments, squares):
+                m *= 0.9
+                m += 0.1 * grad
+                v *= 0.999
+                v += 0.001 * grad * grad
+                param -= learning_rate * (m / (1 - 0.9 ** step)) / (np.sqrt(v / (1 - 0.999 ** step)) + 1e-8)
+        logger.info(f"Epoch {epoch + 1}/{epochs}: loss {loss / n:.4f}")
+
+    return KeywordModel(labels, *params, mean=mean, std=std, context=context, feature_config=feature_config)
+
+class _ScoreRequest:
+    """Windows of one stream waiting in a MicroBatcher"""
+
+    __slots__ = ("windows", "result", "done")
+
+    def __init__(self, windows: np.ndarray):
+        self.windows = windows
+        self.result: Optional[np.ndarray] = None
+        self.done = threading.Event()
+
+class MicroBatcher:
+    """
+    Scores windows from many streams with one matrix multiply per batch
+
+    Streams call score() from their decode threads and block until their
+    rows are scored. A scoring thread stacks the waiting rows of all streams
+    and runs the model once for them. It scores as soon as every stream that
+    is currently decoding has submitted, when max_batch rows are waiting, or
+    max_delay after the first row arrived, whichever comes first, so a lone
+    stream does not wait at all.
+    """
+
+    def __init__(self, model: KeywordModel, max_batch: int = 256, max_delay: float = 0.005):
+        """
+        Args:
+            model: Classifier to run
+            max_batch: Rows that trigger scoring at once
+            max_delay: Longest a row waits for others to join its batch, in seconds
+        """
+        self.model = model
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._cond = threading.Condition()
+        self._pending: List[_ScoreRequest] = []
+        self._pending_rows = 0
+        self._first_at = 0.0
+        self._active = 0
+        self._thread: Optional[threading.Thread] = None
+
+        # Totals, for benchmarks and status
+        self.batches = 0
+        self.rows = 0
+
+        # Stacked rows of a batch, grown on demand
+        self._stack = np.zeros((0, 0), dtype=np.float32)
+
+    @property
+    def mean_batch_rows(self) -> float:
+        """Average rows scored per matrix multiply"""
+        return self.rows / self.batches if self.batches else 0.0
+
+    def enter(self):
+        """Announce a stream that is decoding and may submit rows soon"""
+        with self._cond:
+            self._active += 1
+
+    def exit(self):
+        """The stream announced with enter() is done decoding"""
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+
+    def score(self, windows: np.ndarray) -> np.ndarray:
+        """
+        Score rows as part of the next batch, blocking until it has run
+
+        Args:
+            windows: Array of shape (rows, context * feature dims)
+
+        Returns:
+            Array of shape (rows, labels)
+        """
+        request = _ScoreRequest(windows)
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="kws-batcher", daemon=True)
+                self._thread.start()
+            if not self._pending:
+                self._first_at = time.monotonic()
+            self._pending.append(request)
+            self._pending_rows += len(windows)
+            self._cond.notify()
+        request.done.wait()
+        return request.result
+
+    def _ready(self) -> bool:
+        """Whether the waiting rows should be scored now, called with the lock held"""
+        return self._pending_rows >= self.max_batch or len(self._pending) >= self._active
+
+    def _run(self):
+        """Scoring thread"""
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                while not self._ready():
+                    remaining = self._first_at + self.max_delay - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._pending, self._pending_rows = self._pending, [], 0
+
+            try:
+                if len(batch) == 1:
+                    stacked = batch[0].windows
+                else:
+                    rows = sum(len(request.windows) for request in batch)
+                    width = batch[0].windows.shape[1]
+                    if self._stack.shape[0] < rows or self._stack.shape[1] != width:
+                        self._stack = np.zeros((max(rows, 2 * self._stack.shape[0]), width), dtype=np.float32)
+                    stacked = self._stack[:rows]
+                    np.concatenate([request.windows for request in batch], out=stacked)
+                probs = self.model.score(stacked)
+            except Exception as e:
+                logger.error(f"Error scoring keyword batch: {e}")
+                probs = np.zeros((sum(len(r.windows) for r in batch), len(self.model.labels)), dtype=np.float32)
+
+            self.batches += 1
+            self.rows += len(probs)
+            offset = 0
+            for request in batch:
+                request.result = probs[offset:offset + len(request.windows)]
+                offset += len(request.windows)
+                request.done.set()
+
+class KeywordSpotterBackend(RecognizerBackend):
+    """
+    NumPy keyword spotter, a light alternative to Kaldi for small command sets
+
+    Each stream computes MFCCs incrementally and every stride_frames scores
+    the window of the last `context` frames with a KeywordModel. The
+    windows of all streams go through one shared MicroBatcher. A keyword is
+    reported as a final result once its probability, averaged over the last
+    `smoothing` windows, reaches threshold; it is not reported again until
+    the window has moved past it.
+    """
+
+    name = BACKEND_KWS
+
+    def __init__(self, model_path: str, threshold: float = 0.8, smoothing: int = 3, stride_frames: int = 5,
+                 max_batch: int = 256, max_delay_ms: float = 5.0):
+        """
+        Load a keyword model
+
+        Args:
+            model_path: .npz file written by train_keyword_model.py
+            threshold: Smoothed probability that reports a keyword
+            smoothing: Windows averaged before thresholding
+            stride_frames: Feature frames between scored windows
+            max_batch: Rows that trigger scoring at once
+            max_delay_ms: Longest a window waits for others to join its batch
+
+        Raises:
+            FileNotFoundError: If the model file does not exist
+        """
+        if not Path(model_path).is_file():
+            raise FileNotFoundError(f"Keyword model not found at {model_path}, train one with train_keyword_model.py")
+        logger.info(f"Loading keyword model from {model_path}")
+        self.model_path = str(model_path)
+        self.model = KeywordModel.load(model_path)
+        self.threshold = threshold
+        self.smoothing = smoothing
+        self.stride_frames = stride_frames
+        self.batcher = MicroBatcher(self.model, max_batch, max_delay_ms / 1000)
+
+    def create_stream(self, sample_rate: int, grammar: Optional[str] = None,
+                      word_timing: bool = False) -> RecognizerStream:
+        if sample_rate != self.model.feature_config.get("sample_rate", 16000):
+            raise ValueError(f"Keyword model expects {self.model.feature_config['sample_rate']} Hz audio, got {sample_rate}")
+        allowed = {word for phrase in json.loads(grammar) for word in phrase.split()} if grammar is not None else None
+        return KeywordSpotterStream(self, allowed, word_timing)
+
+    def describe(self) -> dict:
+        return {"backend": self.name, "path": self.model_path, "keywords": self.model.keywords,
+                "threshold": self.threshold, "context_frames": self.model.context}
+
+class KeywordSpotterStream(RecognizerStream):
+    """Stream of a KeywordSpotterBackend, see there"""
+
+    _EMPTY_PARTIAL = json.dumps({"partial": ""})
+
+    def __init__(self, backend: KeywordSpotterBackend, allowed: Optional[set], word_timing: bool):
+        self.backend = backend
+        self.word_timing = word_timing
+        model = backend.model
+        self.features = LogMelFeatures(**model.feature_config)
+        self.context = model.context
+
+        # Keywords this stream may report
+        self._keywords = np.array([not label.startswith("_") and (allowed is None or label in allowed)
+                                   for label in model.labels])
+
+        # Recent feature frames, grown on demand; row i holds frame _base + i
+        self._history = np.zeros((2 * self.context, self.features.dims), dtype=np.float32)
+        self._windows = np.zeros((0, self.context * self.features.dims), dtype=np.float32)
+        self._recent = np.zeros((backend.smoothing, len(model.labels)), dtype=np.float32)
+        self.Reset()
+
+    def Reset(self):
+        self.features.reset()
+        self._base = 0
+        self._filled = 0
+        self._next_end = self.context          # frame count at which the next window ends
+        self._recent_count = 0
+        self._blocked = np.zeros(len(self._keywords), dtype=np.int64)  # frame count each label may fire again
+        self._result = json.dumps({"text": ""})
+
+    def AcceptWaveform(self, data: bytes) -> bool:
+        batcher = self.backend.batcher
+        batcher.enter()
+        try:
+            samples = np.frombuffer(data, dtype=np.int16, count=len(data) // 2)
+            self._append(self.features.process(samples))
+
+            ends = range(self._next_end, self.features.frames + 1, self.backend.stride_frames)
+            if not ends:
+                return False
+            self._next_end = ends[-1] + self.backend.stride_frames
+
+            windows = self._windows_for(ends)
+            probs = batcher.score(windows)
+        finally:
+            batcher.exit()
+
+        detected = []
+        for end, row in zip(ends, probs):
+            hit = self._detect(end, row)
+            if hit is not None:
+                detected.append(hit)
+        if not detected:
+            return False
+
+        result = {"text": " ".join(word for word, _, _, _ in detected)}
+        if self.word_timing:
+            result["result"] = [{"word": word, "conf": round(conf, 3), "start": round(start, 3), "end": round(end, 3)}
+                                for word, conf, start, end in detected]
+        self._result = json.dumps(result)
+        return True
+
+    def Result(self) -> str:
+        return self._result
+
+    def PartialResult(self) -> str:
+        return self._EMPTY_PARTIAL
+
+    def FinalResult(self) -> str:
+        # Keywords are reported as soon as they are heard, nothing is ever pending
+        return json.dumps({"text": ""})
+
+    def _append(self, frames: np.ndarray):
+        """Add new feature frames, dropping those no future window needs"""
+        count = len(frames)
+        if self._filled + count > len(self._history):
+            keep = min(self._filled, self.context - 1)
+            if keep + count > len(self._history):
+                grown = np.zeros((max(keep + count, 2 * len(self._history)), self.features.dims), dtype=np.float32)
+                grown[:keep] = self._history[self._filled - keep:self._filled]
+                self._history = grown
+            else:
+                self._history[:keep] = self._history[self._filled - keep:self._filled]
+            self._base += self._filled - keep
+            self._filled = keep
+        self._history[self._filled:self._filled + count] = frames
+        self._filled += count
+
+    def _windows_for(self, ends: range) -> np.ndarray:
+        """Flattened feature windows ending at the given frame counts"""
+        if len(self._windows) < len(ends):
+            self._windows = np.zeros((max(len(ends), 2 * len(self._windows)), self._windows.shape[1]), dtype=np.float32)
+        windows = self._windows[:len(ends)]
+        for row, end in zip(windows, ends):
+            start = end - self.context - self._base
+            row.reshape(self.context, -1)[:] = self._history[start:start + self.context]
+        return windows
+
+    def _detect(self, end: int, probs: np.ndarray) -> Optional[Tuple[str, float, float, float]]:
+        """Smooth one window's probabilities and report a keyword that crosses the threshold"""
+        self._recent[self._recent_count % len(self._recent)] = probs
+        self._recent_count += 1
+        smoothed = self._recent[:min(self._recent_count, len(self._recent))].mean(axis=0)
+        smoothed[~self._keywords] = 0
+        best = int(smoothed.argmax())
+        if smoothed[best] < self.backend.threshold or end < self._blocked[best]:
+            return None
+
+        # Not again until the window has moved past this occurrence
+        self._blocked[best] = end + self.context
+        self._recent_count = 0
+        start = (end - self.context) * self.features.hop / self.features.sample_rate
+        return self.backend.model.labels[best], float(smoothed[best]), start, self.features.frame_end(end - 1)
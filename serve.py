@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Production launcher: one preloaded model, N forked workers
+
+The Vosk model is loaded once in this supervisor process, then workers are
+forked from it. The model's memory is shared copy-on-write, so each extra
+worker adds its own recognizers and buffers but not another copy of the
+model. Workers share one listening socket (or, with --reuse-port, bind
+their own and let the kernel balance connections), are pinned to one core
+each, and report health and load to a shared-memory table served at
+/workers. Workers that die are restarted. SIGHUP makes every worker
+reload the model and vocabulary from disk.
+
+Usage:
+    python serve.py --workers 4 --port 8080
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+logger = logging.getLogger("serve")
+
+# A worker that exits sooner than this after starting is restarted with a delay
+MIN_UPTIME = 5.0
+
+def listen_socket(host: str, port: int, reuse_port: bool = False, backlog: int = 2048) -> socket.socket:
+    """Create a bound, listening TCP socket"""
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+def run_worker(server, index: int, core, sock, args):
+    """
+    Body of a forked worker process
+
+    Args:
+        server: The imported app module, with the model already loaded
+        index: Worker index, its row on the worker board
+        core: CPU to pin to, or None
+        sock: Shared listening socket, or None to bind a SO_REUSEPORT socket
+        args: Launcher arguments
+    """
+    from utils.decode_executor import DecodeExecutor
+    from utils.worker_board import pin_to_core
+
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # Until the app installs its reload handler, a SIGHUP must not kill the worker
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    pinned = pin_to_core(core)
+    server.worker_index = index
+    server.worker_core = core if pinned else None
+
+    # Thread pools don't survive fork, and the pool is sized to the pinned CPUs
+    server.decode_executor = DecodeExecutor(server.decode_workers)
+
+    if sock is None:
+        sock = listen_socket(args.host, args.port, reuse_port=True)
+
+    logger.info("Worker %d started (pid %d, core %s)", index, os.getpid(), core if pinned else "any")
+    config = uvicorn.Config(server.app, log_level=server.log_level.lower(), lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on")
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes (default: one per usable CPU)")
+    parser.add_argument("--no-pin", action="store_true", help="Don't pin workers to cores")
+    parser.add_argument("--reuse-port", action="store_true",
+                        help="Give each worker its own SO_REUSEPORT socket so the kernel balances connections")
+    args = parser.parse_args()
+
+    # Load the model here, once, before any worker exists
+    import app as server
+    from utils.log_pipeline import stop_logging
+    from utils.worker_board import WorkerBoard
+
+    if not server.model_loader.load():
+        logger.error("Model failed to load, not starting workers")
+        sys.exit(1)
+
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+    workers = args.workers or len(cores)
+    pin = not args.no_pin and hasattr(os, "sched_setaffinity")
+
+    server.worker_board = WorkerBoard(workers)
+    sock = None if args.reuse_port else listen_socket(args.host, args.port)
+
+    # Keep the garbage collector from touching (and so copying) the preloaded objects in every worker
+    gc.collect()
+    gc.freeze()
+
+    children = {}
+    started = {}
+    stopping = False
+
+    def spawn(index: int):
+        core = cores[index % len(cores)] if pin else None
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(server, index, core, sock, args)
+            except BaseException as e:
+                logger.error("Worker %d failed: %s", index, e)
+                code = 1
+            finally:
+                stop_logging()
+                os._exit(code)
+        children[pid] = index
+        started[index] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def reload(signum, frame):
+        logger.info("Reloading the model in all workers")
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGHUP)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGHUP, reload)
+
+    logger.info("Starting %d workers on %s:%d%s", workers, args.host, args.port,
+                " pinned to cores" if pin else "")
+    for index in range(workers):
+        spawn(index)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = children.pop(pid, None)
+        if index is None:
+            continue
+        server.worker_board.clear(index)
+        if stopping:
+            continue
+
+        logger.warning("Worker %d (pid %d) exited with status %d, restarting", index, pid,
+                       os.waitstatus_to_exitcode(status))
+        if time.monotonic() - started[index] < MIN_UPTIME:
+            time.sleep(1.0)
+        if not stopping:
+            spawn(index)
+
+    logger.info("All workers stopped")
+
+if __name__ == "__main__":
+    main()
@@ -4,14 +4,23 @@ import json
 import time
 import queue
 import signal
+import argparse
+import threading
+import contextlib
+import collections
+import wave
 import sounddevice as sd
 import numpy as np
 from vosk import Model, KaldiRecognizer
 
+from models.asr_model import DEFAULT_MODEL_PATH
+from utils.ring_buffer import RingBuffer
+
 # Parameters
 SAMPLE_RATE = 16000
 BUFFER_SIZE = 1600
 COMMANDS = {"play": "▶️", "pause": "⏸️"}
+TONES = {"play": 660, "pause": 440}  # higher tone for play, lower for pause
 
 # ASCII color codes
 GREEN = '\033[92m'
@@ -37,17 +46,6 @@ def generate_beep(frequency=440, duration=0.2, volume=0.5):
     audio = (audio * 32767).astype(np.int16)
     return audio
 
-def play_beep(frequency=440, duration=0.2, volume=0.5):
-    """Play a beep sound"""
-    try:
-        # Generate beep
-        beep_data = generate_beep(frequency, duration, volume)
-        # Play the beep
-        sd.play(beep_data, SAMPLE_RATE)
-        sd.wait()
-    except Exception as e:
-        print(f"Error playing beep: {e}")
-
 def clear_line():
     """Clear the current line in the terminal"""
     sys.stdout.write("\033[K")
@@ -59,111 +57,447 @@ def print_status(text, color=RESET, end='\n'):
     sys.stdout.write(f"{color}{text}{RESET}{end}")
     sys.stdout.flush()
 
+class CaptureRing:
+    """
+    Bounded audio queue between a capture callback and the decode workers
+
+    The callback copies each block into a fixed ring buffer and returns. If
+    recognition falls behind by more than the ring holds, the oldest audio
+    is overwritten and counted instead of piling up as latency.
+    """
+
+    def __init__(self, seconds=2.0, on_data=None):
+        self._ring = RingBuffer(int(seconds * SAMPLE_RATE))
+        self._lock = threading.Lock()
+        self._arrivals = collections.deque()  # arrival time of each unread block
+        self.on_data = on_data  # called after every write, must not block
+        self.dropped_samples = 0
+        self.overflows = 0
+        self.status_errors = 0
+
+    def __len__(self):
+        return len(self._ring)
+
+    def write(self, indata, status=None):
+        """Audio callback side: store a block, never blocking on the reader"""
+        samples = np.frombuffer(indata, dtype=np.int16)
+        with self._lock:
+            dropped = self._ring.write(samples)
+            if dropped:
+                self.dropped_samples += dropped
+                self.overflows += 1
+            if len(self._arrivals) * BUFFER_SIZE > self._ring.capacity:
+                self._arrivals.popleft()
+            self._arrivals.append(time.monotonic())
+            if status:
+                self.status_errors += 1
+        if self.on_data is not None:
+            self.on_data()
+
+    def take(self):
+        """
+        Decode side: take all buffered audio
+
+        Returns:
+            (PCM bytes, arrival time of the oldest block in them), or None if
+            nothing is buffered
+        """
+        with self._lock:
+            if len(self._ring) == 0:
+                return None
+            data = self._ring.read(len(self._ring)).tobytes()
+            oldest = self._arrivals[0] if self._arrivals else time.monotonic()
+            self._arrivals.clear()
+        return data, oldest
+
+class BeepPlayer:
+    """Plays precomputed feedback tones on its own thread"""
+
+    def __init__(self, stats, duration=0.1):
+        self.tones = {command: generate_beep(frequency, duration) for command, frequency in TONES.items()}
+        self.stats = stats
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=4)
+        threading.Thread(target=self._run, name="feedback", daemon=True).start()
+
+    def play(self, command):
+        """Queue a tone without waiting, dropping it if feedback is backed up"""
+        try:
+            self._queue.put_nowait((command, time.monotonic()))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            command, queued = self._queue.get()
+            try:
+                sd.play(self.tones[command], SAMPLE_RATE)
+                self.stats.add("feedback", time.monotonic() - queued)
+                sd.wait()
+            except Exception as e:
+                print_status(f"Error playing beep: {e}", RED)
+
+class StageStats:
+    """Per-stage latencies collected from the worker threads, for --stats"""
+
+    STAGES = ("capture", "decode", "feedback")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = {stage: [] for stage in self.STAGES}
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self._samples[stage].append(seconds)
+
+    def report(self, sources, player):
+        """One line with p50/p95/max per stage since the last report, and overflow counts"""
+        with self._lock:
+            samples, self._samples = self._samples, {stage: [] for stage in self.STAGES}
+        parts = []
+        for stage in self.STAGES:
+            values = samples[stage]
+            if values:
+                p50, p95 = np.percentile(values, [50, 95]) * 1000
+                parts.append(f"{stage} {p50:.1f}/{p95:.1f}/{max(values) * 1000:.1f} ms")
+            else:
+                parts.append(f"{stage} -")
+        dropped = sum(source.capture.dropped_samples for source in sources)
+        overflows = sum(source.capture.overflows for source in sources)
+        errors = sum(source.capture.status_errors for source in sources)
+        parts.append(f"overflow {dropped / SAMPLE_RATE:.2f} s in {overflows}")
+        parts.append(f"input errors {errors}, beeps dropped {player.dropped}")
+        return "[STATS] " + " | ".join(parts)
+
+class Source:
+    """One audio input: a microphone or a WAV file, with its own capture ring, recognizer and command state"""
+
+    def __init__(self, source_id, recognizer, buffer_seconds):
+        self.id = source_id
+        self.recognizer = recognizer
+        self.capture = CaptureRing(buffer_seconds)
+
+        # For command cooldown
+        self.last_command = None
+        self.last_command_time = 0
+
+        # Scheduling state, guarded by the DecodePool lock
+        self.scheduled = False
+        self.busy = False
+        self.dirty = False
+
+        # Set by a WAV reader at end of file, and once the last audio has been decoded
+        self.finished = False
+        self.done = False
+
+class DecodePool:
+    """
+    Worker threads shared by all sources
+
+    A source with new audio is queued once; a free worker takes everything
+    it has buffered and decodes it. A source is never decoded by two workers
+    at once, audio arriving meanwhile queues it again afterwards. Vosk
+    releases the GIL while decoding, so sources decode in parallel.
+    """
+
+    def __init__(self, workers, decode):
+        """
+        Args:
+            workers: Number of decode threads
+            decode: Function (source, data, arrived) run for each pass,
+                with data None once a finished source is drained
+        """
+        self.decode = decode
+        self._ready = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._run, name=f"decode-{i}", daemon=True) for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def notify(self, source):
+        """Queue a source that has new audio, called from capture callbacks"""
+        with self._lock:
+            if source.busy:
+                source.dirty = True
+                return
+            if source.scheduled:
+                return
+            source.scheduled = True
+        self._ready.put(source)
+
+    def stop(self):
+        """Let the workers finish their current pass and exit"""
+        for _ in self._threads:
+            self._ready.put(None)
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+
+    def _run(self):
+        while True:
+            source = self._ready.get()
+            if source is None:
+                return
+            with self._lock:
+                source.scheduled = False
+                source.busy = True
+                source.dirty = False
+            try:
+                block = source.capture.take()
+                if block is not None:
+                    self.decode(source, *block)
+                elif source.finished and not source.done:
+                    self.decode(source, None, time.monotonic())
+            except Exception as e:
+                print_status(f"[{source.id}] Error decoding: {e}", RED)
+            with self._lock:
+                source.busy = False
+                again = source.dirty or (source.finished and not source.done)
+                source.dirty = False
+                if again:
+                    source.scheduled = True
+            if again:
+                self._ready.put(source)
+
+class Detector:
+    """Decodes audio of any source and turns results into command events"""
+
+    def __init__(self, player, stats, events, show_partials):
+        """
+        Args:
+            player: Feedback tones
+            stats: Per-stage latencies
+            events: Queue that receives one dict per command, from all sources
+            show_partials: Print partial results, which only makes sense for one source
+        """
+        self.player = player
+        self.stats = stats
+        self.events = events
+        self.show_partials = show_partials
+        self.command_cooldown = 1.0  # seconds
+
+    def decode(self, source, data, arrived):
+        """Decode one pass of a source's audio, or with data None flush its last utterance"""
+        recognizer = source.recognizer
+        started = time.monotonic()
+        if data is None:
+            source.done = True
+            is_final, raw = True, recognizer.FinalResult()
+        else:
+            self.stats.add("capture", started - arrived)
+
+            # Process with recognizer
+            is_final = recognizer.AcceptWaveform(data)
+            raw = recognizer.Result() if is_final else recognizer.PartialResult()
+        self.stats.add("decode", time.monotonic() - started)
+
+        if is_final:
+            # Get full result
+            result = json.loads(raw)
+            text = result.get("text", "").strip().lower()
+            if text:
+                self.events.put({"type": "final", "device": source.id, "ts": time.time(), "text": text})
+                self._check_command(source, text, result.get("result"))
+        elif self.show_partials:
+            # Get partial result
+            partial = json.loads(raw).get("partial", "").strip().lower()
+
+            if partial:
+                # Check for exact command matches in partial
+                if partial in COMMANDS:
+                    print_status(f"[PARTIAL EXACT] {partial}", BLUE, end='\r')
+                else:
+                    print_status(f"[PARTIAL] {partial}", end='\r')
+
+    def _check_command(self, source, text, words):
+        """Apply cooldown and trigger a command found in a final result"""
+        detected_command = None
+        for command in COMMANDS:
+            if command in text.split() or text == command:
+                detected_command = command
+                break
+        if not detected_command:
+            return
+
+        current_time = time.time()
+        if detected_command == source.last_command and current_time - source.last_command_time <= self.command_cooldown:
+            return
+        # Update command state
+        source.last_command = detected_command
+        source.last_command_time = current_time
+
+        # Audio feedback first, it plays while the event is printed
+        self.player.play(detected_command)
+
+        # Where the command word ended in the source's audio, when Vosk reports word times
+        matching = [word for word in words or [] if word.get("word") == detected_command]
+        self.events.put({"type": "command", "device": source.id, "ts": current_time, "command": detected_command,
+                         "text": text, "audio_time": matching[-1]["end"] if matching else None})
+
+def read_wav(source, path, stop):
+    """Feed a 16 kHz mono 16-bit WAV file into a source at real-time pace, as a microphone would"""
+    try:
+        with wave.open(path, "rb") as wf:
+            if wf.getframerate() != SAMPLE_RATE or wf.getnchannels() != 1 or wf.getsampwidth() != 2:
+                raise ValueError("expected 16 kHz mono 16-bit PCM")
+            start = time.monotonic()
+            sent = 0
+            while not stop.is_set():
+                block = wf.readframes(BUFFER_SIZE)
+                if not block:
+                    break
+                sent += len(block) // 2
+                delay = start + sent / SAMPLE_RATE - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                source.capture.write(block)
+    except Exception as e:
+        print_status(f"[{source.id}] Error reading {path}: {e}", RED)
+    source.finished = True
+    source.capture.on_data()
+
+def print_event(event, multi, as_json):
+    """Print a final result or command event"""
+    if as_json:
+        print(json.dumps(event), flush=True)
+        return
+    prefix = f"[{event['device']}] " if multi else ""
+    if event["type"] == "final":
+        print_status(f"{prefix}[FULL] {event['text']}")
+        return
+
+    # Visual feedback
+    emoji = COMMANDS[event["command"]]
+    stamp = time.strftime("%H:%M:%S", time.localtime(event["ts"])) + f".{int(event['ts'] % 1 * 1000):03d}"
+    detail = f" at {stamp}" if multi else ""
+    if multi and event["audio_time"] is not None:
+        detail += f" ({event['audio_time']:.2f} s into the input)"
+    print_status(f"{BOLD}{YELLOW}{prefix}Command detected: {event['command']} {emoji}{detail}{RESET}", YELLOW)
+
+def parse_device(device):
+    """Device index when given as a number, otherwise a name for sounddevice to match"""
+    return int(device) if device.isdigit() else device
+
 def main():
+    parser = argparse.ArgumentParser(description="Detect spoken play/pause commands from one or more microphones")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="Vosk model directory")
+    parser.add_argument("--devices", nargs="+", metavar="DEVICE",
+                        help="Input devices by index or name, decoded concurrently (default: the default device)")
+    parser.add_argument("--wav", nargs="+", metavar="FILE",
+                        help="16 kHz mono WAV files played in real time instead of devices, for testing")
+    parser.add_argument("--workers", type=int, help="Decode threads shared by all inputs (default: one per input, at most the CPU count)")
+    parser.add_argument("--json", action="store_true", help="Print events as JSON lines")
+    parser.add_argument("--buffer-seconds", type=float, default=2.0,
+                        help="Audio held per input while recognition catches up, older audio is dropped")
+    parser.add_argument("--stats", action="store_true", help="Print per-stage latency every few seconds")
+    parser.add_argument("--stats-interval", type=float, default=5.0, help="Seconds between --stats lines")
+    args = parser.parse_args()
+    if args.devices and args.wav:
+        parser.error("give --devices or --wav, not both")
+
+    stop = threading.Event()
+
     def signal_handler(sig, frame):
         print_status("\nStopping speech command detection...", RED)
-        sys.exit(0)
-    
+        stop.set()
+
     signal.signal(signal.SIGINT, signal_handler)
-    
+
     # Check if model path is provided
-    model_path = "models/data/vosk-model-small-en-us-0.15"
+    model_path = args.model
     if not os.path.exists(model_path):
         print_status(f"Model not found at {model_path}", RED)
         print_status("Please download the model from https://alphacephei.com/vosk/models", YELLOW)
         return
 
-    # Initialize Vosk
-    print_status(f"Loading Vosk model from {model_path}...", BLUE)
+    # Initialize Vosk once; every input gets its own recognizer on the shared model
+    if not args.json:
+        print_status(f"Loading Vosk model from {model_path}...", BLUE)
     model = Model(model_path)
-    recognizer = KaldiRecognizer(model, SAMPLE_RATE)
-    recognizer.SetWords(True)
-    recognizer.SetPartialWords(True)
-    
-    # For command cooldown
-    last_command = None
-    last_command_time = 0
-    command_cooldown = 1.0  # seconds
-    
-    # Setup audio input
-    q = queue.Queue()
-    
-    def audio_callback(indata, frames, time, status):
-        """Callback for audio input"""
-        if status:
-            print_status(f"Audio input error: {status}", RED)
-        q.put(bytes(indata))
-    
-    # Start audio stream
+
+    if args.wav:
+        names = [os.path.basename(path) for path in args.wav]
+    else:
+        names = args.devices or ["default"]
+    sources = []
+    for name in names:
+        recognizer = KaldiRecognizer(model, SAMPLE_RATE)
+        recognizer.SetWords(True)
+        recognizer.SetPartialWords(True)
+        sources.append(Source(name, recognizer, args.buffer_seconds))
+    multi = len(sources) > 1
+
+    # Capture, decoding and feedback each run on their own threads and only hand off
+    stats = StageStats()
+    player = BeepPlayer(stats)
+    events = queue.Queue()
+    detector = Detector(player, stats, events, show_partials=not multi and not args.json)
+    pool = DecodePool(args.workers or min(len(sources), os.cpu_count() or 1), detector.decode)
+    for source in sources:
+        source.capture.on_data = lambda source=source: pool.notify(source)
+
+    def make_callback(source):
+        def audio_callback(indata, frames, time_info, status):
+            """Callback for audio input"""
+            source.capture.write(indata, status)
+        return audio_callback
+
     try:
-        with sd.RawInputStream(
-            samplerate=SAMPLE_RATE,
-            blocksize=BUFFER_SIZE,
-            dtype='int16',
-            channels=1,
-            callback=audio_callback
-        ):
-            print_status(f"{BOLD}Speech Command Detector{RESET}", GREEN)
-            print_status(f"Listening for commands: {', '.join([f'{GREEN}{cmd}{RESET}' for cmd in COMMANDS])}")
-            print_status(f"Press {BOLD}Ctrl+C{RESET} to exit")
-            print_status("-" * 50)
-            
-            while True:
-                # Get audio data from queue
-                data = q.get()
-                
-                # Process with recognizer
-                if recognizer.AcceptWaveform(data):
-                    # Get full result
-                    result = json.loads(recognizer.Result())
-                    text = result.get("text", "").strip().lower()
-                    
-                    if text:
-                        print_status(f"[FULL] {text}")
-                        
-                        # Check for commands
-                        detected_command = None
-                        for command in COMMANDS:
-                            if command in text.split() or text == command:
-                                detected_command = command
-                                break
-                        
-                        # Apply cooldown and trigger if command detected
-                        if detected_command:
-                            current_time = time.time()
-                            if detected_command != last_command or current_time - last_command_time > command_cooldown:
-                                # Update command state
-                                last_command = detected_command
-                                last_command_time = current_time
-                                
-                                # Visual feedback
-                                emoji = COMMANDS[detected_command]
-                                print_status(f"{BOLD}{YELLOW}Command detected: {detected_command} {emoji}{RESET}", YELLOW)
-                                
-                                # Audio feedback (different tones for play/pause)
-                                if detected_command == "play":
-                                    play_beep(660, 0.1)  # Higher tone for play
-                                else:
-                                    play_beep(440, 0.1)  # Lower tone for pause
+        with contextlib.ExitStack() as streams:
+            if args.wav:
+                for source, path in zip(sources, args.wav):
+                    threading.Thread(target=read_wav, args=(source, path, stop), name=f"wav-{source.id}",
+                                     daemon=True).start()
+            else:
+                # Start audio streams
+                for source, device in zip(sources, args.devices or [None]):
+                    streams.enter_context(sd.RawInputStream(
+                        samplerate=SAMPLE_RATE,
+                        blocksize=BUFFER_SIZE,
+                        device=parse_device(device) if device is not None else None,
+                        dtype='int16',
+                        channels=1,
+                        callback=make_callback(source)
+                    ))
+
+            if not args.json:
+                print_status(f"{BOLD}Speech Command Detector{RESET}", GREEN)
+                if multi:
+                    print_status(f"Inputs: {', '.join(source.id for source in sources)}")
+                print_status(f"Listening for commands: {', '.join([f'{GREEN}{cmd}{RESET}' for cmd in COMMANDS])}")
+                print_status(f"Press {BOLD}Ctrl+C{RESET} to exit")
+                print_status("-" * 50)
+
+            # Events from all inputs are printed from here, in the order they were detected.
+            # Capture trouble is reported here too, the audio callbacks must not print.
+            reported = (0, 0)
+            interval = args.stats_interval if args.stats else 1.0
+            next_report = time.monotonic() + interval
+            while not stop.is_set() and not (args.wav and all(source.done for source in sources)):
+                try:
+                    print_event(events.get(timeout=max(0.0, min(0.2, next_report - time.monotonic()))),
+                                multi, args.json)
+                    continue
+                except queue.Empty:
+                    pass
+                if time.monotonic() < next_report:
+                    continue
+                next_report += interval
+                if args.stats:
+                    print_status(stats.report(sources, player), BLUE)
                 else:
-                    # Get partial result
-                    result = json.loads(recognizer.PartialResult())
-                    partial = result.get("partial", "").strip().lower()
-                    
-                    if partial:
-                        # Check for exact command matches in partial
-                        exact_match = False
-                        for command in COMMANDS:
-                            if partial == command:
-                                print_status(f"[PARTIAL EXACT] {partial}", BLUE, end='\r')
-                                exact_match = True
-                                break
-                                
-                        if not exact_match:
-                            print_status(f"[PARTIAL] {partial}", end='\r')
-    
+                    current = (sum(s.capture.overflows for s in sources), sum(s.capture.status_errors for s in sources))
+                    if current != reported:
+                        reported = current
+                        print_status(f"Audio input errors: {current[1]}, overflows: {current[0]} "
+                                     f"({sum(s.capture.dropped_samples for s in sources)} samples dropped)", RED)
+        pool.stop()
+        while not events.empty():
+            print_event(events.get(), multi, args.json)
+        if args.stats:
+            print_status(stats.report(sources, player), BLUE)
+
     except Exception as e:
         print_status(f"Error: {e}", RED)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,105 @@
+// Microphone capture on the audio rendering thread
+//
+// Converts the input to mono Int16 PCM at the context's own sample rate, in
+// fixed frames (20 ms by default), and gates them with a light energy
+// detector, so silence is not uploaded. Frames are posted to the main
+// thread, which adds the header and sends them. Resampling to 16 kHz is left
+// to the server's polyphase filter, which is cleaner than anything a
+// per-sample loop here could afford. The server also runs its own voice
+// activity detection; this gate only needs to drop obvious silence, so it
+// errs on the side of sending.
+
+class PcmCaptureProcessor extends AudioWorkletProcessor {
+    constructor(options) {
+        super();
+        const opts = options.processorOptions || {};
+        this.frameSamples = Math.round(sampleRate * (opts.frameMs || 20) / 1000);
+
+        // Energy gate: open above an absolute floor or well above the tracked
+        // noise level, stay open for the hangover, and send the pre-roll
+        // frames from just before the onset so word starts aren't clipped
+        const vad = opts.vad || {};
+        this.vadEnabled = vad.enabled !== false;
+        this.minLevel = vad.minLevel || 0.004;         // RMS, full scale is 1.0
+        this.noiseRatio = vad.noiseRatio || 3.0;
+        this.hangoverFrames = Math.ceil((vad.hangoverMs || 400) / (opts.frameMs || 20));
+        this.prerollFrames = Math.ceil((vad.prerollMs || 300) / (opts.frameMs || 20));
+        this.noiseLevel = this.minLevel;
+        this.open = false;
+        this.quietFrames = 0;
+        this.preroll = [];
+
+        this.frame = new Int16Array(this.frameSamples);
+        this.filled = 0;
+        this.sumSquares = 0;
+    }
+
+    process(inputs) {
+        const input = inputs[0];
+        if (!input || input.length === 0) {
+            return true;
+        }
+        const channel = input[0];
+        const channels = input.length;
+
+        for (let i = 0; i < channel.length; i++) {
+            // Downmix
+            let sample = channel[i];
+            for (let c = 1; c < channels; c++) {
+                sample += input[c][i];
+            }
+            this.push(sample / channels);
+        }
+        return true;
+    }
+
+    push(sample) {
+        const clipped = Math.max(-1, Math.min(1, sample));
+        this.sumSquares += clipped * clipped;
+        this.frame[this.filled++] = clipped < 0 ? clipped * 0x8000 : clipped * 0x7FFF;
+        if (this.filled === this.frameSamples) {
+            this.emit(Math.sqrt(this.sumSquares / this.frameSamples));
+            this.frame = new Int16Array(this.frameSamples);
+            this.filled = 0;
+            this.sumSquares = 0;
+        }
+    }
+
+    emit(level) {
+        const frame = this.frame;
+        if (!this.vadEnabled) {
+            this.port.postMessage(frame, [frame.buffer]);
+            return;
+        }
+
+        const loud = level > Math.max(this.minLevel, this.noiseLevel * this.noiseRatio);
+        if (!this.open) {
+            // Track the noise floor only while nobody is speaking
+            this.noiseLevel = 0.95 * this.noiseLevel + 0.05 * Math.max(level, this.minLevel / 2);
+            if (!loud) {
+                this.preroll.push(frame);
+                if (this.preroll.length > this.prerollFrames) {
+                    this.preroll.shift();
+                }
+                return;
+            }
+            this.open = true;
+            this.quietFrames = 0;
+            this.port.postMessage({ vad: true, level: level });
+            for (const held of this.preroll) {
+                this.port.postMessage(held, [held.buffer]);
+            }
+            this.preroll = [];
+        } else if (loud) {
+            this.quietFrames = 0;
+        } else if (++this.quietFrames > this.hangoverFrames) {
+            this.open = false;
+            this.port.postMessage({ vad: false, level: level });
+            this.preroll.push(frame);
+            return;
+        }
+        this.port.postMessage(frame, [frame.buffer]);
+    }
+}
+
+registerProcessor('pcm-capture', PcmCaptureProcessor);
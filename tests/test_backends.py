@@ -0,0 +1,37 @@
+import json
+
+import numpy as np
+import pytest
+
+from models.backends import RecognizerBackend, RecognizerStream, ScriptedBackend
+
+def test_partial_stream_fails_on_construction():
+    class NoFinal(RecognizerStream):
+        def AcceptWaveform(self, data):
+            return False
+
+        def Result(self):
+            return "{}"
+
+        def PartialResult(self):
+            return "{}"
+
+        def Reset(self):
+            pass
+
+    with pytest.raises(TypeError):
+        NoFinal()
+
+def test_backend_without_create_stream_fails_on_construction():
+    class NoStreams(RecognizerBackend):
+        name = "none"
+
+    with pytest.raises(TypeError):
+        NoStreams()
+
+def test_scripted_stream_replays_script():
+    stream = ScriptedBackend().create_stream(16000)
+    assert isinstance(stream, RecognizerStream)
+    # The utterance ends half a second after "music", within the three seconds of audio
+    assert stream.AcceptWaveform(np.zeros(16000 * 3, dtype=np.int16).tobytes())
+    assert json.loads(stream.Result())["text"] == "play the music"
@@ -0,0 +1,135 @@
+import random
+
+import pytest
+
+from utils.command_matcher import DEFAULT_ALIASES, DEFAULT_COMMANDS, CommandMatcher
+
+def linear_scan(text, commands, aliases):
+    """
+    The matcher's predecessor, one scan per phrase, with whole-word matching
+
+    Command names are checked first, then keywords, then aliases, each in
+    vocabulary order. Returns the set of commands found at the first kind
+    that matches, since the old scan picked among those by dictionary order.
+    """
+    padded = f" {' '.join(text.lower().split())} "
+    tiers = [
+        {command: [command] for command in commands},
+        commands,
+        aliases,
+    ]
+    for tier in tiers:
+        found = {command for command, phrases in tier.items()
+                 if any(f" {phrase} " in padded for phrase in phrases)}
+        if found:
+            return found
+    return set()
+
+@pytest.fixture
+def matcher():
+    return CommandMatcher.default()
+
+@pytest.fixture
+def phrases():
+    return CommandMatcher(
+        {"play": ["start playing", "go"], "pause": ["hold on", "wait a second"]},
+        {"play": ["clay"], "pause": ["hold"]},
+    )
+
+def test_command_name(matcher):
+    assert matcher.match("please play the song") == ("play", "play")
+
+def test_keyword(matcher):
+    assert matcher.match("stop it now") == ("pause", "stop")
+
+def test_alias(matcher):
+    assert matcher.match("paws") == ("pause", "paws")
+
+def test_no_match(matcher):
+    assert matcher.match("turn up the volume") is None
+    assert matcher.match("") is None
+
+def test_whole_words_only(matcher):
+    # The old scan matched substrings, so "display" triggered play and "because" pause
+    assert matcher.match("display the menu") is None
+    assert matcher.match("because of the layout") is None
+
+def test_case_insensitive(matcher):
+    assert matcher.match("PLAY") == ("play", "play")
+
+def test_command_name_beats_keyword(matcher):
+    # "stop" comes first but is only a keyword, "play" is a command name
+    assert matcher.match("stop and play") == ("play", "play")
+
+def test_keyword_beats_alias(matcher):
+    assert matcher.match("clay then wait") == ("pause", "wait")
+
+def test_earliest_of_same_kind_wins(matcher):
+    assert matcher.match("go then halt") == ("play", "go")
+    assert matcher.match("halt then go") == ("pause", "halt")
+
+def test_multi_word_phrase(phrases):
+    assert phrases.match("could you start playing") == ("play", "start playing")
+    assert phrases.match("start the music") is None
+
+def test_longer_phrase_beats_its_prefix(phrases):
+    # "hold" is an alias, "hold on" a keyword of the same command
+    assert phrases.match("hold on") == ("pause", "hold on")
+    assert phrases.match("hold it") == ("pause", "hold")
+
+def test_new_from_skips_checked_tokens(matcher):
+    tokens = ["play", "the", "song"]
+    assert matcher.match_tokens(tokens, 0) == ("play", "play")
+    assert matcher.match_tokens(tokens, 1) is None
+    assert matcher.match_tokens(tokens + ["stop"], 3) == ("pause", "stop")
+
+def test_new_from_phrase_split_across_old_and_new(phrases):
+    # "wait a" was checked before, the phrase only completes with the new token
+    tokens = ["wait", "a", "second"]
+    assert phrases.match_tokens(tokens[:2], 0) is None
+    assert phrases.match_tokens(tokens, 2) == ("pause", "wait a second")
+
+def test_new_from_phrase_entirely_old(phrases):
+    tokens = ["start", "playing", "now"]
+    assert phrases.match_tokens(tokens, 2) is None
+
+def test_new_from_past_end(matcher):
+    assert matcher.match_tokens(["play"], 1) is None
+
+def test_from_file(tmp_path):
+    path = tmp_path / "commands.json"
+    path.write_text('{"commands": {"next": {"keywords": ["skip"], "aliases": ["nest"]}, "back": ["previous"]}}')
+    matcher = CommandMatcher.from_file(str(path))
+    assert matcher.match("skip this") == ("next", "skip")
+    assert matcher.match("nest") == ("next", "nest")
+    assert matcher.match("previous track") == ("back", "previous")
+    assert matcher.vocabulary() == ["back", "next", "previous", "skip"]
+    assert "nest" in matcher.vocabulary(include_aliases=True)
+
+def test_duplicate_phrase_keeps_first_command():
+    matcher = CommandMatcher({"play": ["go"], "pause": ["go"]})
+    assert matcher.match("go") == ("play", "go")
+
+def test_matches_linear_scan():
+    vocabulary = [phrase for phrases in DEFAULT_COMMANDS.values() for phrase in phrases]
+    vocabulary += [phrase for phrases in DEFAULT_ALIASES.values() for phrase in phrases]
+    vocabulary += list(DEFAULT_COMMANDS)
+    filler = ["the", "music", "now", "please", "display", "player", "because", "postcard", "a"]
+    matcher = CommandMatcher.default()
+    rng = random.Random(0)
+    compared = 0
+    for _ in range(2000):
+        words = [rng.choice(filler + vocabulary) for _ in range(rng.randint(0, 6))]
+        text = " ".join(words)
+        expected = linear_scan(text, DEFAULT_COMMANDS, DEFAULT_ALIASES)
+        match = matcher.match(text)
+        if not expected:
+            assert match is None, text
+        elif len(expected) == 1:
+            # Unambiguous for the old scan, both must agree
+            assert match is not None and match[0] in expected, text
+            compared += 1
+        else:
+            # The old scan broke ties by dictionary order, the index by position
+            assert match is not None and match[0] in expected, text
+    assert compared > 500
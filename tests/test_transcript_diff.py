@@ -0,0 +1,135 @@
+from utils.transcript_diff import TranscriptDiff
+
+def test_first_partial_is_not_stable():
+    diff = TranscriptDiff(stable_partials=2)
+    update = diff.update("play the", False)
+    assert update.changed
+    assert update.tokens == []
+    assert not update.has_new_tokens
+
+def test_words_stable_once_partials_agree():
+    diff = TranscriptDiff(stable_partials=2)
+    diff.update("play the", False)
+    update = diff.update("play the song", False)
+    assert update.tokens == ["play", "the"]
+    assert update.new_from == 0
+    assert update.has_new_tokens
+
+def test_stable_words_handed_out_once():
+    diff = TranscriptDiff(stable_partials=2)
+    diff.update("play", False)
+    assert diff.update("play the", False).tokens == ["play"]
+    update = diff.update("play the song", False)
+    assert update.tokens == ["play", "the"]
+    assert update.new_from == 1
+
+def test_repeated_partial_is_unchanged():
+    diff = TranscriptDiff(stable_partials=2)
+    diff.update("play the", False)
+    diff.update("play the", False)
+    update = diff.update("play the", False)
+    assert not update.changed
+    assert not update.has_new_tokens
+
+def test_revised_partial_restarts_from_divergence():
+    diff = TranscriptDiff(stable_partials=2)
+    diff.update("clay the song", False)
+    assert diff.update("clay the song", False).tokens == ["clay", "the", "song"]
+    # The recognizer revises its first word: nothing is stable until partials agree again
+    update = diff.update("play the song", False)
+    assert update.tokens == []
+    assert update.new_from == 0
+    update = diff.update("play the song", False)
+    assert update.tokens == ["play", "the", "song"]
+    assert update.new_from == 0
+
+def test_revised_last_word_keeps_checked_prefix():
+    diff = TranscriptDiff(stable_partials=2)
+    diff.update("play the sun", False)
+    diff.update("play the sun", False)
+    update = diff.update("play the song", False)
+    assert update.tokens == ["play", "the"]
+    assert not update.has_new_tokens
+    update = diff.update("play the song", False)
+    assert update.tokens == ["play", "the", "song"]
+    assert update.new_from == 2
+
+def test_shrinking_partial():
+    diff = TranscriptDiff(stable_partials=2)
+    diff.update("play the song", False)
+    diff.update("play the song", False)
+    update = diff.update("play", False)
+    assert update.changed
+    assert update.tokens == ["play"]
+    assert not update.has_new_tokens
+    # Words dropped and heard again are checked again
+    diff.update("play it", False)
+    update = diff.update("play it", False)
+    assert update.tokens == ["play", "it"]
+    assert update.new_from == 1
+
+def test_final_skips_words_checked_in_partials():
+    diff = TranscriptDiff(stable_partials=2)
+    diff.update("play the", False)
+    diff.update("play the", False)
+    update = diff.update("play the song", True)
+    assert update.changed
+    assert update.tokens == ["play", "the", "song"]
+    assert update.new_from == 2
+
+def test_final_that_disagrees_is_checked_in_full():
+    diff = TranscriptDiff(stable_partials=2)
+    diff.update("clay the", False)
+    diff.update("clay the", False)
+    update = diff.update("play the", True)
+    assert update.tokens == ["play", "the"]
+    assert update.new_from == 0
+
+def test_final_starts_a_new_utterance():
+    diff = TranscriptDiff(stable_partials=2)
+    diff.update("play", False)
+    diff.update("play", False)
+    diff.update("play", True)
+    # The same words in the next utterance are new again
+    update = diff.update("play", False)
+    assert update.changed
+    assert update.tokens == []
+    update = diff.update("play", False)
+    assert update.tokens == ["play"]
+    assert update.new_from == 0
+
+def test_final_without_partials():
+    diff = TranscriptDiff(stable_partials=2)
+    update = diff.update("pause", True)
+    assert update.tokens == ["pause"]
+    assert update.new_from == 0
+
+def test_single_partial_commits_immediately():
+    diff = TranscriptDiff(stable_partials=1)
+    update = diff.update("play", False)
+    assert update.tokens == ["play"]
+    assert update.has_new_tokens
+
+def test_confident_words_are_stable_early():
+    diff = TranscriptDiff(stable_partials=3, min_confidence=0.9)
+    update = diff.update("play the song", False, [0.95, 0.92, 0.5])
+    assert update.tokens == ["play", "the"]
+    assert update.new_from == 0
+
+def test_confidence_needs_stable_words_before_it():
+    diff = TranscriptDiff(stable_partials=3, min_confidence=0.9)
+    update = diff.update("the play", False, [0.4, 0.99])
+    assert update.tokens == []
+
+def test_confidence_ignored_without_word_confidences():
+    diff = TranscriptDiff(stable_partials=3, min_confidence=0.9)
+    assert diff.update("play", False).tokens == []
+
+def test_reset_forgets_the_utterance():
+    diff = TranscriptDiff(stable_partials=2)
+    diff.update("play", False)
+    diff.update("play", False)
+    diff.reset()
+    update = diff.update("play", False)
+    assert update.changed
+    assert update.tokens == []
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Train the NumPy keyword spotter used by RECOGNIZER_BACKEND=kws
+
+The data directory holds one subdirectory of 16 kHz mono 16-bit WAV clips
+per word, in the layout of the Speech Commands dataset:
+
+    data/play/*.wav
+    data/pause/*.wav
+    data/other-word/*.wav          # any word not in --keywords is "_unknown_"
+    data/_background_noise_/*.wav  # cut into "_silence_" windows
+
+Every clip is turned into MFCC windows of the length the server scores,
+with the word at a few positions inside the window, and a small classifier
+is trained on them. Accuracy on a held-out part of the data is printed, and
+the model is written as an .npz file.
+
+Usage:
+    python train_keyword_model.py data/ --keywords play pause -o models/data/kws-commands.npz
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import wave
+
+import numpy as np
+
+from models.kws import DEFAULT_KWS_MODEL_PATH, SILENCE_LABEL, UNKNOWN_LABEL, train_keyword_model
+from utils.features import LogMelFeatures
+
+NOISE_DIRS = ("_background_noise_", "_silence_")
+
+def load_wav(path: str) -> np.ndarray:
+    """Read a 16 kHz mono 16-bit WAV file"""
+    with wave.open(path, "rb") as wf:
+        if wf.getframerate() != 16000 or wf.getnchannels() != 1 or wf.getsampwidth() != 2:
+            raise ValueError(f"{path}: expected 16 kHz mono 16-bit PCM")
+        return np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+
+def clip_windows(audio: np.ndarray, features: LogMelFeatures, context: int, positions: int,
+                 rng: np.random.Generator) -> list:
+    """
+    Feature windows holding a clip's word at evenly spread positions
+
+    The clip is padded with faint noise so the word can sit anywhere in a
+    window, and only windows that contain the whole loud part are used.
+    """
+    pad = np.clip(rng.normal(0, 5, context * features.hop), -32768, 32767).astype(np.int16)
+    padded = np.concatenate([pad, audio, pad])
+    features.reset()
+    frames = features.process(padded)
+
+    samples = padded.astype(np.float32)
+    energy = (np.lib.stride_tricks.sliding_window_view(samples, features.window)[::features.hop][:len(frames)] ** 2).sum(axis=1)
+    loud = np.flatnonzero(energy >= 0.1 * energy.max())
+    first, last = loud[0], loud[-1]
+
+    # Window ends that keep frames first..last inside the window
+    low, high = max(last + 1, context), min(first + context, len(frames))
+    ends = np.unique(np.linspace(low, max(low, high), positions).astype(int))
+    return [frames[end - context:end].ravel() for end in ends if end <= len(frames)]
+
+def noise_windows(audio: np.ndarray, features: LogMelFeatures, context: int, count: int,
+                  rng: np.random.Generator) -> list:
+    """Random feature windows from a background recording at random levels"""
+    length = (context - 1) * features.hop + features.window
+    if len(audio) < length:
+        return []
+    windows = []
+    for _ in range(count):
+        start = int(rng.integers(0, len(audio) - length + 1))
+        piece = np.clip(audio[start:start + length] * rng.uniform(0.1, 1.0), -32768, 32767).astype(np.int16)
+        features.reset()
+        windows.append(features.process(piece).ravel())
+    return windows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("data", help="Directory with one subdirectory of WAV clips per word")
+    parser.add_argument("--keywords", nargs="+", default=["play", "pause"], help="Words the model reports")
+    parser.add_argument("-o", "--output", default=DEFAULT_KWS_MODEL_PATH, help="Model file to write")
+    parser.add_argument("--context-ms", type=float, default=800.0, help="Audio in each scored window")
+    parser.add_argument("--positions", type=int, default=3, help="Word positions per clip")
+    parser.add_argument("--max-unknown", type=int, help="Cap on non-keyword clips (default: twice the largest keyword)")
+    parser.add_argument("--hidden", type=int, default=128, help="Hidden layer width")
+    parser.add_argument("--epochs", type=int, default=40, help="Training passes")
+    parser.add_argument("--validation", type=float, default=0.1, help="Share of windows held out")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    rng = np.random.default_rng(args.seed)
+    features = LogMelFeatures()
+    context = int(round(args.context_ms / (features.hop * 1000 / features.sample_rate)))
+    labels = [SILENCE_LABEL, UNKNOWN_LABEL] + list(args.keywords)
+
+    clips = {label: [] for label in labels}
+    noise = []
+    for name in sorted(os.listdir(args.data)):
+        directory = os.path.join(args.data, name)
+        if not os.path.isdir(directory):
+            continue
+        paths = sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.lower().endswith(".wav"))
+        if name in NOISE_DIRS:
+            noise.extend(paths)
+        else:
+            clips[name if name in args.keywords else UNKNOWN_LABEL].extend(paths)
+
+    missing = [k for k in args.keywords if not clips[k]]
+    if missing:
+        print(f"No clips for {', '.join(missing)} in {args.data}", file=sys.stderr)
+        sys.exit(1)
+    largest = max(len(clips[k]) for k in args.keywords)
+    cap = args.max_unknown if args.max_unknown is not None else 2 * largest
+    if len(clips[UNKNOWN_LABEL]) > cap:
+        clips[UNKNOWN_LABEL] = list(rng.choice(clips[UNKNOWN_LABEL], cap, replace=False))
+
+    windows, targets = [], []
+    for index, label in enumerate(labels):
+        for path in clips[label]:
+            found = clip_windows(load_wav(path), features, context, args.positions, rng)
+            windows.extend(found)
+            targets.extend([index] * len(found))
+    per_file = max(1, largest * args.positions // max(1, len(noise)))
+    for path in noise:
+        found = noise_windows(load_wav(path), features, context, per_file, rng)
+        windows.extend(found)
+        targets.extend([labels.index(SILENCE_LABEL)] * len(found))
+
+    x = np.stack(windows).astype(np.float32)
+    y = np.array(targets)
+    order = rng.permutation(len(y))
+    held = int(len(y) * args.validation)
+    test, train = order[:held], order[held:]
+    print(f"{len(train)} training and {held} validation windows, "
+          + ", ".join(f"{label}: {int((y == i).sum())}" for i, label in enumerate(labels)), file=sys.stderr)
+
+    model = train_keyword_model(x[train], y[train], labels, context, features.config(),
+                                hidden=args.hidden, epochs=args.epochs, seed=args.seed)
+
+    report = {"windows": len(y), "context_frames": context}
+    if held:
+        predicted = model.score(x[test]).argmax(axis=1)
+        report["validation_accuracy"] = round(float((predicted == y[test]).mean()), 4)
+        report["per_label"] = {label: round(float((predicted[y[test] == i] == i).mean()), 4)
+                               for i, label in enumerate(labels) if (y[test] == i).any()}
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    model.save(args.output)
+    print(json.dumps(report, indent=2))
+    print(f"Saved to {args.output}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
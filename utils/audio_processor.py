@@ -3,135 +3,248 @@ import logging
 import time
 import numpy as np
 import wave
-from typing import Optional
+from typing import List, Optional, Union
+
+from utils.resampler import InputConverter
+from utils.ring_buffer import RingBuffer
+from utils.vad import VoiceActivityDetector
 
 logger = logging.getLogger(__name__)
 
 class AudioProcessor:
     """
     Process audio data for speech recognition
+    
+    The processor only validates, gates and frames incoming audio. Every
+    sample it returns is new, so each chunk reaches the streaming recognizer
+    exactly once. Gating is done by a voice activity detector, so silence
+    never reaches the recognizer.
     """
     
-    def __init__(self):
-        """Initialize the audio processor"""
+    def __init__(self, buffer_seconds: float = 2.0, window_seconds: float = 0.5, min_chunk_seconds: float = 0.1,
+                 vad_aggressiveness: int = 2):
+        """
+        Initialize the audio processor
+        
+        Args:
+            buffer_seconds: Capacity of the ring buffer holding audio not yet decoded
+            window_seconds: Maximum amount of audio handed to the recognizer per call
+            min_chunk_seconds: Minimum amount of audio worth a decode call
+            vad_aggressiveness: WebRTC VAD mode from 0 (least) to 3 (most aggressive filtering)
+        """
         self.sample_rate = 16000  # 16kHz for speech recognition
         self.frame_duration_ms = 30  # 30ms frames
         
-        # Buffer for collecting audio
-        self.audio_buffer = bytearray()
-        self.buffer_limit = self.sample_rate * 2  # 2 seconds limit
+        # Ring buffer for audio waiting to be handed to the recognizer
+        self.buffer_limit = int(self.sample_rate * buffer_seconds)
+        self.min_chunk_samples = int(self.sample_rate * min_chunk_seconds)
+        self.max_chunk_samples = int(self.sample_rate * window_seconds)
+        self.ring = RingBuffer(self.buffer_limit)
+        
+        # Voice activity gate, only speech segments are forwarded
+        self.vad = VoiceActivityDetector(
+            sample_rate=self.sample_rate,
+            frame_duration_ms=self.frame_duration_ms,
+            aggressiveness=vad_aggressiveness,
+        )
+        
+        # Converts client audio in another rate, channel count or sample format, see set_input_format()
+        self.converter: Optional[InputConverter] = None
+        
+        # Decodes compressed client packets into PCM, see set_packet_decoder()
+        self.packet_decoder = None
+        
+        # Whether the audio returned by the last call finished a speech segment,
+        # and the client audio that call received, in seconds
+        self.speech_ended = False
+        self.last_input_seconds = 0.0
+        self._segment_closing = False  # the VAD closed a segment whose tail is still buffered
+        
+        # Scratch space for the energy check, grown on demand
+        self._abs_scratch = np.zeros(4096, dtype=np.int64)
         
         # For diagnostics
         self.total_audio_processed = 0
+        self.dropped_samples = 0
+        self.last_diagnostic_time = 0
+    
+    def reset(self):
+        """Clear buffered audio and diagnostics so the processor can serve a new stream"""
+        self.ring.clear()
+        self.vad.reset()
+        self.converter = None
+        self.packet_decoder = None
+        self.speech_ended = False
+        self.last_input_seconds = 0.0
+        self._segment_closing = False
+        self.total_audio_processed = 0
+        self.dropped_samples = 0
         self.last_diagnostic_time = 0
+    
+    def set_input_format(self, sample_rate: int, channels: int = 1, sample_format: str = "s16le"):
+        """
+        Declare the format of the incoming audio
         
-    def process_audio(self, audio_bytes: bytes) -> Optional[np.ndarray]:
+        Audio in any other format than 16 kHz mono 16-bit PCM is downmixed
+        and resampled before the voice activity gate. The converter keeps
+        filter state, so the stream must be fed in order.
+        
+        Args:
+            sample_rate: Client sample rate in Hz
+            channels: Interleaved channels per frame
+            sample_format: "s16le" or "f32le"
+        
+        Raises:
+            ValueError: If the format is not supported
+        """
+        if (sample_rate, channels, sample_format) == (self.sample_rate, 1, "s16le"):
+            self.converter = None
+        else:
+            self.converter = InputConverter(sample_rate, channels, sample_format, out_rate=self.sample_rate)
+    
+    def set_packet_decoder(self, decoder):
+        """
+        Decode compressed packets before the PCM steps
+        
+        The decoder runs inside process_audio(), so it shares the decode
+        worker with the rest of the pipeline and sees packets in order.
+        
+        Args:
+            decoder: Object with decode(packet) returning PCM bytes in the
+                declared input format or None, such as an OpusStreamDecoder,
+                or None for PCM input
+        """
+        self.packet_decoder = decoder
+    
+    def _decode_packets(self, packets: List[bytes]) -> bytes:
+        """Decode a batch of packets and join their PCM, skipping packets that fail to decode"""
+        pcm = []
+        for packet in packets:
+            decoded = self.packet_decoder.decode(packet)
+            if decoded:
+                pcm.append(decoded)
+        return b"".join(pcm)
+    
+    def process_audio(self, audio_bytes: Union[bytes, List[bytes]]) -> Optional[np.ndarray]:
         """
         Process incoming audio data
         
         Args:
-            audio_bytes: Raw audio bytes
-            
+            audio_bytes: Raw audio bytes, or a list of packets when a packet decoder is set
+        
         Returns:
-            Processed audio as numpy array or None if no valid audio
+            New audio ready for decoding as numpy array, or None if there is
+            not yet enough valid audio. The array is a view into the
+            processor's buffers and is only valid until the next call.
+            Afterwards speech_ended tells whether a speech segment has now
+            been handed out completely.
         """
+        self.speech_ended = False
+        self.last_input_seconds = 0.0
         try:
+            if self.packet_decoder is not None:
+                audio_bytes = self._decode_packets(audio_bytes)
+            
             # Check if we have valid data
             if not audio_bytes or len(audio_bytes) < 32:
                 return None
             
-            # For safety, work with a copy of the data
             try:
-                # Try to convert bytes to numpy array (16-bit signed integer)
-                # Make sure we have an even number of bytes for 16-bit samples
-                bytes_len = len(audio_bytes)
-                if bytes_len % 2 != 0:
-                    # Trim to even length
-                    audio_bytes = audio_bytes[:bytes_len - (bytes_len % 2)]
+                if self.converter is not None:
+                    # Downmix and resample into the converter's buffers
+                    audio_array = self.converter.convert(audio_bytes)
+                else:
+                    # Interpret as raw 16-bit PCM without copying, trimming a trailing odd byte
+                    bytes_len = len(audio_bytes)
+                    audio_array = np.frombuffer(audio_bytes, dtype=np.int16, count=bytes_len // 2)
                 
-                # First try to interpret as raw PCM
-                try:
-                    audio_array = np.frombuffer(audio_bytes, dtype=np.int16)
-                    
-                    # Check if the audio data makes sense as PCM
-                    # If mean value is extreme or values out of bounds, it might not be PCM
-                    mean_abs = np.mean(np.abs(audio_array))
-                    if mean_abs > 30000 or mean_abs < 10:
-                        # Try alternative format (WebM/Opus)
-                        logger.warning(f"Audio data doesn't look like valid PCM: mean={mean_abs}")
-                        return None
-                except Exception as e:
-                    logger.error(f"Error interpreting as PCM: {e}")
+                # Check if the audio data makes sense as PCM
+                # If mean value is extreme, it might not be PCM. Quiet audio is
+                # valid here, the voice activity detector handles silence.
+                mean_abs = self._mean_abs(audio_array)
+                if mean_abs > 30000:
+                    # Compressed audio has to be negotiated in the client hello, it is decoded before this point
+                    logger.warning(f"Audio data doesn't look like valid PCM: mean={mean_abs}")
                     return None
-                    
             except Exception as e:
-                logger.error(f"Error converting audio bytes to array: {e}")
+                logger.error(f"Error interpreting as PCM: {e}")
                 return None
-                
+            
             # Check if we actually got data
             if len(audio_array) == 0:
                 return None
-                
+            
             # Log stats for debugging
             current_time = time.time()
             self.total_audio_processed += len(audio_array)
+            self.last_input_seconds = len(audio_array) / self.sample_rate
             
             if current_time - self.last_diagnostic_time > 5:
-                logger.info(f"Total audio processed: {self.total_audio_processed} samples")
-                logger.info(f"Audio buffer size: {len(self.audio_buffer) / 2} samples")
+                logger.debug("Total audio processed: %d samples, buffer size: %d samples",
+                             self.total_audio_processed, len(self.ring))
                 self.last_diagnostic_time = current_time
-                
-            # Log audio data shape periodically
-            logger.debug(f"Audio data: shape={audio_array.shape}, dtype={audio_array.dtype}")
             
-            # Reset buffer every 0.5 seconds to focus on immediate commands
-            # This makes the system much more responsive
-            current_buffer_seconds = len(self.audio_buffer) / 2 / self.sample_rate
-            if current_buffer_seconds > 0.5:
-                logger.debug("Buffer exceeded 0.5 seconds, resetting")
-                self.audio_buffer = bytearray()
-                
-            # Simple processing - create a fresh buffer instead of extending the existing one
-            new_buffer = bytearray(self.audio_buffer)
-            
-            # Only add the new data if it's valid
-            if len(audio_array) > 0:
-                # Check audio energy - if it's very low, don't add to buffer
-                audio_energy = np.mean(np.abs(audio_array))
-                if audio_energy < 50:  # Very quiet, probably silence
-                    logger.debug(f"Audio energy too low: {audio_energy:.2f}, skipping")
-                    # Return current buffer anyway for processing
-                    result = np.frombuffer(self.audio_buffer, dtype=np.int16)
-                    return result if len(result) > 0 else None
-                
-                # Copy to buffer (safely)
-                try:
-                    new_buffer.extend(audio_array.tobytes())
-                except Exception as e:
-                    logger.error(f"Error extending buffer: {e}")
-                    # Reset buffer and start fresh with current data
-                    new_buffer = bytearray(audio_array.tobytes())
+            # Log audio data shape periodically
+            logger.debug("Audio data: shape=%s, dtype=%s", audio_array.shape, audio_array.dtype)
             
-            # Update our instance buffer
-            self.audio_buffer = new_buffer
+            # Only speech (with pre-roll and hangover) is passed on
+            speech = self.vad.process(audio_array)
+            if speech is not None:
+                # Copy into the ring, overwriting the oldest audio if it is full
+                dropped = self.ring.write(speech)
+                if dropped:
+                    self.dropped_samples += dropped
+                    logger.warning(f"Audio buffer overflow, dropped {dropped} oldest samples")
             
-            # Keep buffer within size limits
-            max_bytes = self.buffer_limit * 2  # *2 for 16-bit samples
-            if len(self.audio_buffer) > max_bytes:
-                self.audio_buffer = self.audio_buffer[-max_bytes:]
+            if self.vad.speech_ended:
+                self._segment_closing = True
             
-            # Convert buffer back to numpy array
-            try:
-                result = np.frombuffer(self.audio_buffer, dtype=np.int16)
-            except Exception as e:
-                logger.error(f"Error converting buffer to array: {e}")
-                self.audio_buffer = bytearray()  # Reset buffer on error
+            # Wait until there is enough audio for an efficient decode call,
+            # unless speech just ended and the tail should be decoded now
+            if len(self.ring) == 0:
+                self._end_segment()
+                return None
+            if len(self.ring) < self.min_chunk_samples and not self._segment_closing:
                 return None
             
-            return result
-            
+            chunk = self.ring.read(self.max_chunk_samples)
+            if len(self.ring) == 0:
+                self._end_segment()
+            return chunk
+        
         except Exception as e:
             logger.error(f"Error processing audio: {e}")
             # Reset buffer on error to prevent cascading failures
-            self.audio_buffer = bytearray()
-            return None
\ No newline at end of file
+            self.ring.clear()
+            return None
+    
+    def _end_segment(self):
+        """Report a closed speech segment once all of its audio has been handed out"""
+        if self._segment_closing:
+            self._segment_closing = False
+            self.speech_ended = True
+    
+    def flush(self) -> Optional[np.ndarray]:
+        """
+        Return any buffered audio regardless of the minimum chunk size
+        
+        Returns:
+            Remaining audio as numpy array or None if the buffer is empty
+        """
+        if len(self.ring) == 0:
+            return None
+        return self.ring.read(len(self.ring))
+    
+    def _mean_abs(self, audio_array: np.ndarray) -> float:
+        """Mean absolute amplitude, computed in preallocated int64 scratch space"""
+        n = len(audio_array)
+        if n == 0:
+            return 0.0
+        if n > len(self._abs_scratch):
+            self._abs_scratch = np.zeros(n, dtype=np.int64)
+        
+        # Widen before abs so -32768 doesn't overflow, all in place to avoid temporaries
+        scratch = self._abs_scratch[:n]
+        scratch[:] = audio_array
+        np.abs(scratch, out=scratch)
+        return int(scratch.sum()) / n
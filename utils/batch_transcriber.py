@@ -0,0 +1,264 @@
+import io
+import json
+import logging
+import multiprocessing
+import os
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import IO, Iterable, List, Optional
+
+import numpy as np
+
+from models.asr_model import SpeechModel
+from utils.command_matcher import CommandMatcher
+from utils.commit_policy import CommitPolicy
+from utils.outbound import FINAL
+from utils.session_pool import RecognizerSession
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+CHUNK_SAMPLES = SAMPLE_RATE // 10  # stream files in 0.1 s chunks, like a live client
+
+# File extensions picked up when a directory is given
+AUDIO_EXTENSIONS = (".wav", ".pcm", ".raw")
+
+def read_audio(data: bytes, name: str) -> np.ndarray:
+    """
+    Decode a recorded file into 16 kHz mono int16 samples
+
+    Args:
+        data: File contents, either a WAV file or raw 16-bit little-endian PCM
+        name: File name, used to tell WAV from raw PCM and in error messages
+
+    Returns:
+        Audio samples as int16 numpy array
+    """
+    if name.lower().endswith(".wav") or data[:4] == b"RIFF":
+        with wave.open(io.BytesIO(data), "rb") as wf:
+            if wf.getframerate() != SAMPLE_RATE or wf.getnchannels() != 1 or wf.getsampwidth() != 2:
+                raise ValueError(f"expected 16 kHz mono 16-bit WAV, got {wf.getframerate()} Hz, "
+                                 f"{wf.getnchannels()} channels, {wf.getsampwidth() * 8}-bit")
+            data = wf.readframes(wf.getnframes())
+    return np.frombuffer(data, dtype=np.int16, count=len(data) // 2)
+
+def find_audio_files(inputs: Iterable[str]) -> List[str]:
+    """
+    Expand files and directories into a sorted list of audio files
+
+    Args:
+        inputs: File or directory paths
+
+    Returns:
+        Paths of all audio files found
+    """
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(AUDIO_EXTENSIONS))
+        else:
+            paths.append(item)
+    return sorted(paths)
+
+class BatchTranscriber:
+    """
+    Offline transcription of recorded files through the live pipeline
+
+    Audio is streamed through a RecognizerSession like a WebSocket
+    connection's, with the same transcript diffing and early command
+    commits, so results reflect what the server would have done. Times are
+    in seconds of audio, including the command cooldown.
+    """
+
+    def __init__(self, model_path: Optional[str] = None, mode: str = "full", commands_config: Optional[str] = None,
+                 backend: str = "vosk", backend_options: Optional[dict] = None,
+                 commit_policy: Optional[CommitPolicy] = None):
+        """
+        Load the model and command vocabulary
+
+        Args:
+            model_path: Vosk model directory, or None for the default
+            mode: Recognizer mode, "full" or "keyword"
+            commands_config: Optional JSON command vocabulary
+            backend: Recognizer backend, "vosk", "kws" or "scripted"
+            backend_options: Extra backend arguments
+            commit_policy: When commands in partial results count, as on the server
+
+        Raises:
+            FileNotFoundError: If the model does not exist
+        """
+        self.commit_policy = commit_policy or CommitPolicy()
+        self.command_matcher = CommandMatcher.from_file(commands_config) if commands_config else CommandMatcher.default()
+        self.speech_model = SpeechModel(model_path, mode=mode, vocabulary=self.command_matcher.vocabulary(),
+                                        backend=backend, backend_options=backend_options)
+
+    def transcribe(self, data: bytes, name: str) -> dict:
+        """
+        Transcribe one recorded file
+
+        Args:
+            data: File contents
+            name: File name reported in the result
+
+        Returns:
+            Result record with transcripts, detected commands and timings
+        """
+        start = time.perf_counter()
+        record = {"file": name}
+        try:
+            audio = read_audio(data, name)
+        except Exception as e:
+            record["error"] = str(e)
+            return record
+
+        session = RecognizerSession(self.speech_model, 0, self.command_matcher, commit_policy=self.commit_policy)
+        events = []
+        commands = []
+
+        def handle(message: Optional[dict], t: float):
+            # One event per changed partial or final, as the server would have sent them
+            if not message:
+                return
+            command = message.get("command")
+            final = message.get("final", message["type"] == FINAL)
+            events.append({"t": round(t, 3), "text": message["text"], "final": final, "command": command})
+            if command:
+                commands.append({"t": round(t, 3), "command": command})
+
+        for offset in range(0, len(audio), CHUNK_SAMPLES):
+            chunk = audio[offset:offset + CHUNK_SAMPLES]
+            t = (offset + len(chunk)) / SAMPLE_RATE
+            handle(session.process_chunk(chunk.tobytes(), now=t), t)
+
+        duration = len(audio) / SAMPLE_RATE
+        for message in session.finish(now=duration):
+            handle(message, duration)
+
+        record.update({
+            "duration": round(duration, 3),
+            "commands": commands,
+            "events": events,
+            "decode_seconds": round(time.perf_counter() - start, 3),
+        })
+        return record
+
+# Per-process transcriber, created once by the pool initializer
+_worker: Optional[BatchTranscriber] = None
+
+def _init_worker(model_path: Optional[str], mode: str, commands_config: Optional[str],
+                 backend: str, backend_options: Optional[dict], commit_policy: Optional[CommitPolicy]):
+    """Load one model per worker process"""
+    global _worker
+    logging.basicConfig(level=logging.WARNING)
+    _worker = BatchTranscriber(model_path, mode, commands_config, backend, backend_options, commit_policy)
+
+def _transcribe_path(path: str) -> dict:
+    """Worker task: transcribe a file on disk"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError as e:
+        return {"file": path, "error": str(e)}
+    return _worker.transcribe(data, path)
+
+def _transcribe_bytes(name: str, data: bytes) -> dict:
+    """Worker task: transcribe uploaded file contents"""
+    return _worker.transcribe(data, name)
+
+class BatchRunner:
+    """
+    Process pool that fans batch transcription out across CPU cores
+
+    Each worker process loads its own copy of the model once and then
+    transcribes files independently.
+    """
+
+    def __init__(self, workers: Optional[int] = None, model_path: Optional[str] = None,
+                 mode: str = "full", commands_config: Optional[str] = None,
+                 backend: str = "vosk", backend_options: Optional[dict] = None,
+                 commit_policy: Optional[CommitPolicy] = None):
+        """
+        Start the worker pool
+
+        Args:
+            workers: Number of worker processes. Defaults to the number of CPUs.
+            model_path: Vosk model directory, or None for the default
+            mode: Recognizer mode, "full" or "keyword"
+            commands_config: Optional JSON command vocabulary
+            backend: Recognizer backend, "vosk", "kws" or "scripted"
+            backend_options: Extra backend arguments
+            commit_policy: When commands in partial results count, as on the server
+        """
+        self.workers = workers or os.cpu_count() or 1
+        # Spawn, so workers don't inherit the parent's threads and loaded models
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_path, mode, commands_config, backend, backend_options, commit_policy),
+        )
+
+    def submit_path(self, path: str):
+        """Queue a file on disk, returning a Future for its result record"""
+        return self._pool.submit(_transcribe_path, path)
+
+    def submit_bytes(self, name: str, data: bytes):
+        """Queue file contents, returning a Future for its result record"""
+        return self._pool.submit(_transcribe_bytes, name, data)
+
+    def run(self, paths: List[str], output: IO[str]) -> dict:
+        """
+        Transcribe files and write one JSON line per file as results complete
+
+        Args:
+            paths: Audio files to transcribe
+            output: Text stream the JSONL results are written to
+
+        Returns:
+            Summary with totals and throughput
+        """
+        summary = BatchSummary()
+        futures = [self.submit_path(path) for path in paths]
+        for future in as_completed(futures):
+            record = future.result()
+            summary.add(record)
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+        return summary.finish()
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        self._pool.shutdown(wait=True)
+
+class BatchSummary:
+    """Running totals for a batch, reported as audio-hours per wall-hour"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.files = 0
+        self.errors = 0
+        self.commands = 0
+        self.audio_seconds = 0.0
+
+    def add(self, record: dict):
+        """Count one result record"""
+        self.files += 1
+        if "error" in record:
+            self.errors += 1
+        self.commands += len(record.get("commands", []))
+        self.audio_seconds += record.get("duration", 0.0)
+
+    def finish(self) -> dict:
+        """Return the totals and throughput"""
+        wall_seconds = time.perf_counter() - self.start
+        return {
+            "files": self.files,
+            "errors": self.errors,
+            "commands": self.commands,
+            "audio_seconds": round(self.audio_seconds, 3),
+            "wall_seconds": round(wall_seconds, 3),
+            # audio-hours per wall-hour is the same ratio as audio-seconds per wall-second
+            "audio_hours_per_wall_hour": round(self.audio_seconds / wall_seconds, 2) if wall_seconds > 0 else None,
+        }
@@ -1,6 +1,8 @@
 import logging
 import time
-from typing import Optional
+from typing import List, Optional
+
+from utils.command_matcher import CommandMatcher
 
 logger = logging.getLogger(__name__)
 
@@ -9,80 +11,100 @@ class CommandHandler:
     Process transcribed text to detect and handle commands
     """
     
-    def __init__(self):
-        """Initialize the command handler"""
-        # Define command keywords and synonyms
-        self.commands = {
-            "play": ["play", "start", "begin", "resume", "go"],
-            "pause": ["pause", "stop", "halt", "freeze", "wait"]
-        }
+    def __init__(self, matcher: Optional[CommandMatcher] = None):
+        """
+        Initialize the command handler
+        
+        Args:
+            matcher: Compiled command vocabulary. Defaults to the built-in
+                play/pause commands. Pass a shared matcher to avoid compiling
+                the vocabulary once per handler.
+        """
+        self.matcher = matcher or CommandMatcher.default()
+        
+        # Command keywords and synonyms, see utils/command_matcher.py
+        self.commands = self.matcher.commands
+        
+        # Phrase behind the most recent match, so callers can locate the command in the transcript
+        self.last_phrase: Optional[str] = None
         
         # Cooldown to prevent rapid command triggering
         self.last_command = None
         self.last_command_time = 0
         self.command_cooldown = 1.0  # seconds between allowed repeated commands
     
-    def process_command(self, text: str) -> Optional[str]:
+    def vocabulary(self) -> List[str]:
+        """
+        List every word and phrase that can trigger a command
+        
+        Returns:
+            Sorted list of command names and their keywords
+        """
+        return self.matcher.vocabulary()
+    
+    def reset(self):
+        """Forget cooldown state so the handler can serve a new stream"""
+        self.last_phrase = None
+        self.last_command = None
+        self.last_command_time = 0
+    
+    def process_command(self, text: str, now: Optional[float] = None) -> Optional[str]:
         """
         Process text to detect commands
         
         Args:
             text: Transcribed text from ASR
+            now: Time of the transcript in seconds, used for the cooldown.
+                Defaults to the wall clock; offline callers pass audio time.
             
         Returns:
             Detected command or None
         """
         if not text:
             return None
-            
-        text = text.lower().strip()
         
-        # Print for debugging
-        logger.info(f"[COMMAND PROCESSOR] Processing: '{text}'")
-        
-        # Check for direct command matches (exact word or substring)
-        for command, keywords in self.commands.items():
-            # First check if the command itself is in the text
-            if command in text:
-                logger.info(f"[COMMAND PROCESSOR] Command found: {command}")
-                return self._apply_cooldown(command)
+        # Single pass over the transcript's words
+        match = self.matcher.match(text)
+        if match is None:
+            return None
         
-        # Check for any keyword in text (more lenient)
-        for command, keywords in self.commands.items():
-            for keyword in keywords:
-                # Check if keyword appears as whole word
-                if keyword in text.split() or f" {keyword} " in f" {text} ":
-                    logger.info(f"[COMMAND PROCESSOR] Keyword '{keyword}' found for command: {command}")
-                    return self._apply_cooldown(command)
-                
-                # Even more lenient - check if keyword appears anywhere
-                if keyword in text:
-                    logger.info(f"[COMMAND PROCESSOR] Substring '{keyword}' found for command: {command}")
-                    return self._apply_cooldown(command)
+        command, phrase = match
+        logger.debug("[COMMAND PROCESSOR] '%s' matched '%s' for command: %s", text, phrase, command)
+        return self._apply_cooldown(command, now)
+    
+    def process_tokens(self, tokens: List[str], new_from: int = 0, now: Optional[float] = None) -> Optional[str]:
+        """
+        Detect a command among newly stabilized words of a streaming transcript
         
-        # Special cases for common misrecognitions
-        if "clay" in text or "lay" in text:
-            logger.info("[COMMAND PROCESSOR] Possible 'play' misrecognition")
-            return self._apply_cooldown("play")
+        Args:
+            tokens: Transcript words that are stable so far
+            new_from: Index of the first word not checked before
+            now: Time of the transcript in seconds, used for the cooldown
             
-        if "paws" in text or "cause" in text or "post" in text:
-            logger.info("[COMMAND PROCESSOR] Possible 'pause' misrecognition")
-            return self._apply_cooldown("pause")
+        Returns:
+            Detected command or None
+        """
+        match = self.matcher.match_tokens(tokens, new_from)
+        if match is None:
+            return None
         
-        return None
+        command, phrase = match
+        self.last_phrase = phrase
+        logger.debug("[COMMAND PROCESSOR] %s matched '%s' for command: %s", tokens[new_from:], phrase, command)
+        return self._apply_cooldown(command, now)
     
-    def _apply_cooldown(self, command: str) -> Optional[str]:
+    def _apply_cooldown(self, command: str, now: Optional[float] = None) -> Optional[str]:
         """Apply cooldown logic to avoid rapid repeat commands"""
-        current_time = time.time()
+        current_time = time.time() if now is None else now
         
         # Check if this is a repeat command within cooldown period
         if command == self.last_command and current_time - self.last_command_time < self.command_cooldown:
-            logger.info(f"[COMMAND PROCESSOR] Command '{command}' ignored due to cooldown")
+            logger.debug("[COMMAND PROCESSOR] Command '%s' ignored due to cooldown", command)
             return None
             
         # Update last command info
         self.last_command = command
         self.last_command_time = current_time
         
-        logger.info(f"[COMMAND PROCESSOR] Command '{command}' accepted!")
+        logger.debug("[COMMAND PROCESSOR] Command '%s' accepted", command)
         return command
\ No newline at end of file
@@ -0,0 +1,183 @@
+import json
+import logging
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Built-in vocabulary, used when no config file is given
+DEFAULT_COMMANDS = {
+    "play": ["play", "start", "begin", "resume", "go"],
+    "pause": ["pause", "stop", "halt", "freeze", "wait"]
+}
+
+# Common misrecognitions of the command words
+DEFAULT_ALIASES = {
+    "play": ["clay", "lay"],
+    "pause": ["paws", "cause", "post"]
+}
+
+class CommandMatcher:
+    """
+    Compiled index of command phrases
+
+    Command names, their keywords and misrecognition aliases are compiled
+    once into a hash index keyed by each phrase's first token. Matching then
+    walks the transcript's tokens a single time, so the cost does not grow
+    with the number of keywords. Phrases only match on whole words.
+
+    When several phrases occur, the command name wins over a keyword, which
+    wins over an alias; within the same kind the earliest phrase wins.
+    """
+
+    # Match priorities, lower wins
+    PRIORITY_COMMAND = 0
+    PRIORITY_KEYWORD = 1
+    PRIORITY_ALIAS = 2
+
+    def __init__(self, commands: Dict[str, List[str]], aliases: Optional[Dict[str, List[str]]] = None):
+        """
+        Compile the matcher
+
+        Args:
+            commands: Mapping of command name to keywords and synonyms
+            aliases: Mapping of command name to common misrecognitions
+        """
+        self.commands = {command: list(keywords) for command, keywords in commands.items()}
+        self.aliases = {command: list(words) for command, words in (aliases or {}).items()}
+
+        # first token -> [(phrase tokens, command, priority)], longest phrases first
+        self._index: Dict[str, List[Tuple[Tuple[str, ...], str, int]]] = {}
+        self._phrases: Dict[Tuple[str, ...], Tuple[str, int]] = {}
+        self.max_phrase_len = 1
+
+        for command, keywords in self.commands.items():
+            self._add(command, command, self.PRIORITY_COMMAND)
+            for keyword in keywords:
+                self._add(keyword, command, self.PRIORITY_KEYWORD)
+        for command, words in self.aliases.items():
+            for word in words:
+                self._add(word, command, self.PRIORITY_ALIAS)
+
+        for entries in self._index.values():
+            entries.sort(key=lambda entry: (-len(entry[0]), entry[2]))
+
+    @classmethod
+    def default(cls) -> "CommandMatcher":
+        """Matcher for the built-in play/pause vocabulary"""
+        return cls(DEFAULT_COMMANDS, DEFAULT_ALIASES)
+
+    @classmethod
+    def from_file(cls, path: str) -> "CommandMatcher":
+        """
+        Load a matcher from a JSON config file
+
+        The file maps each command to its keywords and optional aliases:
+
+            {"commands": {"play": {"keywords": ["start"], "aliases": ["clay"]}}}
+
+        A plain list of keywords is accepted in place of the object.
+
+        Args:
+            path: Path to the config file
+
+        Returns:
+            Compiled matcher
+        """
+        with open(path, "r") as f:
+            config = json.load(f)
+
+        commands, aliases = {}, {}
+        for command, spec in config.get("commands", {}).items():
+            if isinstance(spec, list):
+                spec = {"keywords": spec}
+            commands[command] = spec.get("keywords", [])
+            aliases[command] = spec.get("aliases", [])
+
+        matcher = cls(commands, aliases)
+        logger.info(f"Loaded {len(commands)} commands ({matcher.phrase_count} phrases) from {path}")
+        return matcher
+
+    @property
+    def phrase_count(self) -> int:
+        """Number of distinct phrases in the index"""
+        return len(self._phrases)
+
+    def vocabulary(self, include_aliases: bool = False) -> List[str]:
+        """
+        List the phrases that can trigger a command
+
+        Args:
+            include_aliases: Whether to include misrecognition aliases
+
+        Returns:
+            Sorted list of phrases
+        """
+        return sorted(" ".join(tokens) for tokens, (_, priority) in self._phrases.items()
+                      if include_aliases or priority != self.PRIORITY_ALIAS)
+
+    def match(self, text: str) -> Optional[Tuple[str, str]]:
+        """
+        Find the command in a transcript
+
+        Args:
+            text: Transcribed text
+
+        Returns:
+            (command, matched phrase) or None if no phrase occurs
+        """
+        return self.match_tokens(text.lower().split())
+
+    def match_tokens(self, tokens: List[str], new_from: int = 0) -> Optional[Tuple[str, str]]:
+        """
+        Find the command in a list of lower-case tokens
+
+        Args:
+            tokens: Transcript split into words
+            new_from: Index of the first token not checked before. Only phrases
+                that end at or after it can match, so streaming callers can
+                re-check a growing transcript without matching a phrase twice.
+
+        Returns:
+            (command, matched phrase) or None if no phrase occurs
+        """
+        best = None
+        best_priority = self.PRIORITY_ALIAS + 1
+
+        # A phrase ending in the new tokens starts at most max_phrase_len - 1 tokens earlier
+        first = max(0, new_from - self.max_phrase_len + 1)
+        for i in range(first, len(tokens)):
+            entries = self._index.get(tokens[i])
+            if entries is None:
+                continue
+            for phrase, command, priority in entries:
+                if priority >= best_priority:
+                    continue
+                if i + len(phrase) <= new_from:
+                    continue
+                if len(phrase) > 1 and tuple(tokens[i:i + len(phrase)]) != phrase:
+                    continue
+                best = (command, " ".join(phrase))
+                best_priority = priority
+                break
+
+            # Nothing can beat a command name found this early
+            if best_priority == self.PRIORITY_COMMAND:
+                break
+
+        return best
+
+    def _add(self, phrase: str, command: str, priority: int):
+        """Add one phrase to the index"""
+        tokens = tuple(phrase.lower().split())
+        if not tokens:
+            return
+
+        existing = self._phrases.get(tokens)
+        if existing is not None:
+            if existing[0] != command:
+                logger.warning(f"Phrase '{phrase}' maps to both '{existing[0]}' and '{command}', keeping '{existing[0]}'")
+            return
+
+        self._phrases[tokens] = (command, priority)
+        self.max_phrase_len = max(self.max_phrase_len, len(tokens))
+        self._index.setdefault(tokens[0], []).append((tokens, command, priority))
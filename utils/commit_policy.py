@@ -0,0 +1,51 @@
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+class CommitPolicy:
+    """
+    When a command heard in a partial hypothesis is sent
+
+    Waiting for Vosk to finalize an utterance adds its endpointing delay,
+    often several hundred milliseconds, to every command. Under this policy
+    a word is committed, and checked for commands, as soon as it has stayed
+    the same in stable_partials consecutive partial results, or as soon as
+    the recognizer's confidence in it reaches min_confidence. A command
+    committed early is not sent again when the final result of the same
+    utterance arrives.
+
+    With finalize_on_silence the recognizer is also forced to finalize when
+    the voice activity detector sees speech end, instead of waiting for
+    Vosk's own endpointing.
+    """
+
+    def __init__(self, stable_partials: int = 2, min_confidence: Optional[float] = None,
+                 finalize_on_silence: bool = False):
+        """
+        Args:
+            stable_partials: Consecutive partials a word must survive unchanged.
+                1 commits every partial word immediately.
+            min_confidence: Word confidence (0 to 1) that commits a word on its
+                own, or None to only use stability. Needs word timing, which
+                keyword mode leaves off.
+            finalize_on_silence: Force a final result when speech ends
+
+        Raises:
+            ValueError: If a setting is out of range
+        """
+        if stable_partials < 1:
+            raise ValueError(f"stable_partials must be at least 1, got {stable_partials}")
+        if min_confidence is not None and not 0.0 <= min_confidence <= 1.0:
+            raise ValueError(f"min_confidence must be between 0 and 1, got {min_confidence}")
+        self.stable_partials = stable_partials
+        self.min_confidence = min_confidence
+        self.finalize_on_silence = finalize_on_silence
+
+    def as_dict(self) -> dict:
+        """Settings, for logs and status endpoints"""
+        return {
+            "stable_partials": self.stable_partials,
+            "min_confidence": self.min_confidence,
+            "finalize_on_silence": self.finalize_on_silence,
+        }
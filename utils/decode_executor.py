@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+class DecodeExecutor:
+    """
+    Worker pool that runs CPU-bound decoding away from the asyncio event loop
+
+    Vosk releases the GIL inside AcceptWaveform, so a thread pool lets one
+    server process decode on all cores while the event loop only moves bytes.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        Initialize the executor
+
+        Args:
+            max_workers: Number of decode threads. Defaults to the number of CPUs
+                this process may run on, which is one for a pinned worker.
+        """
+        self.max_workers = max_workers or _usable_cpus()
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="decode")
+        logger.info(f"Decode executor started with {self.max_workers} workers")
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """
+        Run a blocking function on the pool and wait for its result
+
+        Args:
+            fn: Function to call
+            *args: Arguments passed to fn
+
+        Returns:
+            Whatever fn returns
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, fn, *args)
+
+    def shutdown(self):
+        """Stop accepting work and wait for running jobs to finish"""
+        self._pool.shutdown(wait=True)
+
+def _usable_cpus() -> int:
+    """CPUs in this process's affinity mask, or all CPUs where that is not available"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+class OrderedDecoder:
+    """
+    Per-session decode queue
+
+    Chunks are processed one at a time in arrival order, so the session's
+    recognizer is never used by two threads at once. The queue is bounded:
+    submit() waits when it is full, which pauses reads from the client.
+    """
+
+    def __init__(self, executor: DecodeExecutor, process: Callable[[Any], Any],
+                 on_result: Callable[[Any, float, Optional[int]], Awaitable[None]], max_pending: int = 8):
+        """
+        Initialize the decoder
+
+        Args:
+            executor: Shared pool that runs the decode work
+            process: Blocking function called with each submitted chunk
+            on_result: Coroutine called on the event loop with each non-empty result,
+                the time.monotonic() at which its chunk arrived and the chunk's
+                client sequence number (None for unframed audio)
+            max_pending: Maximum number of chunks waiting to be decoded
+        """
+        self.executor = executor
+        self.process = process
+        self.on_result = on_result
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False  # no more submits
+        self._stopped = False  # consumer skips whatever is still queued
+
+    @property
+    def pending(self) -> int:
+        """Number of chunks waiting to be decoded"""
+        return self.queue.qsize()
+
+    def start(self):
+        """Start the consumer task on the running event loop"""
+        self._task = asyncio.create_task(self._consume())
+
+    def is_full(self) -> bool:
+        """Whether submit() would currently have to wait"""
+        return self.queue.full()
+
+    async def submit(self, chunk: Any, timeout: Optional[float] = None,
+                     received_at: Optional[float] = None, seq: Optional[int] = None) -> bool:
+        """
+        Queue a chunk for decoding, waiting while the queue is full
+
+        Args:
+            chunk: Item passed to the process function
+            timeout: Maximum seconds to wait for space, or None to wait forever
+            received_at: time.monotonic() when the chunk's audio arrived, passed
+                on with the result. Defaults to now.
+            seq: Client sequence number of the newest frame in the chunk, passed on with the result
+
+        Returns:
+            True if the chunk was queued, False if the decoder is closed or the
+            timeout expired
+        """
+        if self._closed:
+            return False
+        try:
+            if received_at is None:
+                received_at = time.monotonic()
+            await asyncio.wait_for(self.queue.put((chunk, received_at, seq)), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def close(self, drain: bool = False):
+        """
+        Stop decoding and wait for any in-flight chunk to finish
+
+        Once this returns the process function is no longer running, so
+        session state can be safely reset.
+
+        Args:
+            drain: Decode the chunks still queued first, instead of discarding them
+        """
+        if drain and not self._closed and self._task is not None and not self._task.done():
+            # No more submits, the consumer stops at the marker after the queued chunks
+            self._closed = True
+            marker = asyncio.ensure_future(self.queue.put(None))
+            await asyncio.wait([marker, self._task], return_when=asyncio.FIRST_COMPLETED)
+            marker.cancel()
+        else:
+            self._closed = True
+            self._stopped = True
+
+            # Discard queued work and wake the consumer
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+        if self._task is not None:
+            try:
+                await self._task
+            except Exception as e:
+                logger.error(f"Decode task ended with error: {e}")
+
+    async def _consume(self):
+        """Decode queued chunks one at a time and hand results to the callback"""
+        while True:
+            item = await self.queue.get()
+            if item is None or self._stopped:
+                break
+            chunk, received_at, seq = item
+
+            try:
+                result = await self.executor.run(self.process, chunk)
+            except Exception as e:
+                logger.error(f"Error decoding chunk: {e}")
+                continue
+
+            if result:
+                try:
+                    await self.on_result(result, received_at, seq)
+                except Exception as e:
+                    logger.info(f"Stopping decoder, could not deliver result: {e}")
+                    self._closed = True
+                    break
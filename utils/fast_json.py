@@ -0,0 +1,34 @@
+"""
+JSON encoding and decoding for the streaming hot path
+
+Uses orjson when it is installed and falls back to the standard library
+otherwise. Both produce compact output without spaces.
+"""
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+if orjson is not None:
+    def loads(data: Union[str, bytes]) -> Any:
+        """Parse a JSON document"""
+        return orjson.loads(data)
+
+    def dumps(obj: Any) -> str:
+        """Serialize to a compact JSON string"""
+        return orjson.dumps(obj).decode()
+else:
+    _encoder = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False)
+
+    def loads(data: Union[str, bytes]) -> Any:
+        """Parse a JSON document"""
+        return json.loads(data)
+
+    def dumps(obj: Any) -> str:
+        """Serialize to a compact JSON string"""
+        return _encoder.encode(obj)
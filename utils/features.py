@@ -0,0 +1,141 @@
+import logging
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def mel_filterbank(sample_rate: int, n_fft: int, n_mels: int, fmin: float = 20.0,
+                   fmax: Optional[float] = None) -> np.ndarray:
+    """
+    Triangular filters on the mel scale
+
+    Args:
+        sample_rate: Sample rate in Hz
+        n_fft: FFT size the filters apply to
+        n_mels: Number of filters
+        fmin: Lowest filter edge in Hz
+        fmax: Highest filter edge in Hz, defaults to the Nyquist frequency
+
+    Returns:
+        Matrix of shape (n_fft // 2 + 1, n_mels) mapping a power spectrum to mel energies
+    """
+    fmax = fmax or sample_rate / 2
+    mel = lambda f: 2595.0 * np.log10(1.0 + f / 700.0)
+    edges = 700.0 * (10 ** (np.linspace(mel(fmin), mel(fmax), n_mels + 2) / 2595.0) - 1.0)
+    bins = np.arange(n_fft // 2 + 1) * sample_rate / n_fft
+
+    lower, centre, upper = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    rising = (bins - lower) / (centre - lower)
+    falling = (upper - bins) / (upper - centre)
+    return np.maximum(0.0, np.minimum(rising, falling)).T.astype(np.float32)
+
+def dct_matrix(n_in: int, n_out: int) -> np.ndarray:
+    """Orthonormal DCT-II as a (n_in, n_out) matrix, for log-mel energies to cepstra"""
+    n = np.arange(n_in)[:, None]
+    k = np.arange(n_out)[None, :]
+    basis = np.sqrt(2.0 / n_in) * np.cos(np.pi * k * (2 * n + 1) / (2 * n_in))
+    basis[:, 0] /= np.sqrt(2.0)
+    return basis.astype(np.float32)
+
+class LogMelFeatures:
+    """
+    Streaming log-mel or MFCC feature extractor
+
+    Audio is cut into overlapping Hann-windowed frames, every frame of a
+    chunk is transformed in one batched FFT, and the power spectra are
+    projected onto a mel filterbank with one matrix multiply. Samples that
+    do not yet fill a frame are carried over to the next chunk, so a stream
+    fed in pieces gives the same features as one fed at once.
+
+    Not thread-safe; each stream needs its own.
+    """
+
+    def __init__(self, sample_rate: int = 16000, window_ms: float = 25.0, hop_ms: float = 10.0,
+                 n_mels: int = 40, n_mfcc: int = 13, fmin: float = 20.0, fmax: Optional[float] = None):
+        """
+        Args:
+            sample_rate: Sample rate of the input in Hz
+            window_ms: Frame length
+            hop_ms: Frame step
+            n_mels: Mel filters
+            n_mfcc: Cepstral coefficients kept, or 0 for log-mel energies
+            fmin: Lowest mel filter edge in Hz
+            fmax: Highest mel filter edge in Hz, defaults to the Nyquist frequency
+        """
+        self.sample_rate = sample_rate
+        self.window = int(sample_rate * window_ms / 1000)
+        self.hop = int(sample_rate * hop_ms / 1000)
+        self.n_fft = 1 << (self.window - 1).bit_length()
+        self.n_mels = n_mels
+        self.n_mfcc = n_mfcc
+        self.dims = n_mfcc or n_mels
+
+        # int16 samples are scaled to [-1, 1] along with the window
+        self._hann = (np.hanning(self.window) / 32768.0).astype(np.float32)
+        self._mel = mel_filterbank(sample_rate, self.n_fft, n_mels, fmin, fmax)
+        self._dct = dct_matrix(n_mels, n_mfcc) if n_mfcc else None
+
+        # Samples not yet consumed by a frame
+        self._carry = np.zeros(self.window, dtype=np.float32)
+        self._carry_len = 0
+        self.frames = 0
+
+        # Scratch space, grown on demand
+        self._ext = np.zeros(0, dtype=np.float32)
+        self._windowed = np.zeros((0, self.window), dtype=np.float32)
+
+    def reset(self):
+        """Forget the carried-over samples, for a new stream"""
+        self._carry_len = 0
+        self.frames = 0
+
+    def config(self) -> dict:
+        """Settings needed to rebuild an identical extractor"""
+        return {"sample_rate": self.sample_rate, "window_ms": self.window * 1000 / self.sample_rate,
+                "hop_ms": self.hop * 1000 / self.sample_rate, "n_mels": self.n_mels, "n_mfcc": self.n_mfcc}
+
+    def frame_end(self, index: int) -> float:
+        """Time in seconds since the last reset at which frame number index ends"""
+        return (index * self.hop + self.window) / self.sample_rate
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Extract the features of every frame completed by a chunk
+
+        Args:
+            samples: Next int16 samples of the stream
+
+        Returns:
+            Array of shape (frames, dims), possibly with no rows
+        """
+        n = self._carry_len + len(samples)
+        if len(self._ext) < n:
+            self._ext = np.zeros(max(n, 2 * len(self._ext)), dtype=np.float32)
+        ext = self._ext[:n]
+        ext[:self._carry_len] = self._carry[:self._carry_len]
+        ext[self._carry_len:] = samples
+
+        count = (n - self.window) // self.hop + 1 if n >= self.window else 0
+        consumed = count * self.hop
+        if count == 0:
+            features = np.zeros((0, self.dims), dtype=np.float32)
+        else:
+            if len(self._windowed) < count:
+                self._windowed = np.zeros((max(count, 2 * len(self._windowed)), self.window), dtype=np.float32)
+            frames = np.lib.stride_tricks.sliding_window_view(ext, self.window)[:consumed:self.hop]
+            windowed = self._windowed[:count]
+            np.multiply(frames, self._hann, out=windowed)
+
+            spectrum = np.fft.rfft(windowed, n=self.n_fft, axis=1)
+            power = spectrum.real ** 2 + spectrum.imag ** 2
+            features = np.log(power.astype(np.float32) @ self._mel + 1e-10)
+            if self._dct is not None:
+                features = features @ self._dct
+
+        # Keep what the next frame needs: everything from its first sample on
+        rest = n - consumed
+        self._carry[:rest] = ext[consumed:]
+        self._carry_len = rest
+        self.frames += count
+        return features
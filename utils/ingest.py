@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import time
+from typing import List, Optional, Union
+
+from utils.decode_executor import OrderedDecoder
+
+logger = logging.getLogger(__name__)
+
+class IngestStats:
+    """Byte and frame counters for one connection's audio ingest"""
+
+    def __init__(self):
+        self.frames_received = 0
+        self.bytes_received = 0
+        self.batches_submitted = 0
+        self.coalesced_frames = 0  # frames merged into a batch with other frames
+        self.coalesced_bytes = 0
+        self.dropped_batches = 0
+        self.dropped_bytes = 0
+        self.backpressure_waits = 0  # submits that found the decode queue full
+        self.backpressure_seconds = 0.0
+
+    def as_dict(self) -> dict:
+        """Return the counters as a plain dictionary"""
+        return dict(vars(self))
+
+class AudioIngest:
+    """
+    Lossless ingest stage between the WebSocket and the decoder
+
+    Small client frames are joined into decode-sized batches. When the
+    session's decode queue is full, feed() waits for space, which stops
+    reading from the socket and pushes back on the client through TCP flow
+    control. Audio is only dropped if the queue stays full for longer than
+    max_wait, and every dropped byte is counted.
+
+    Audio that does not fill a batch is submitted anyway once it is max_age
+    old, so a client that stops sending during silence does not leave the
+    end of an utterance waiting for the next one.
+
+    Compressed audio can only be decoded one whole packet at a time, so after
+    set_packets() messages are kept apart and each batch is a list of packets.
+    """
+
+    def __init__(self, decoder: OrderedDecoder, batch_bytes: int = 3200, max_wait: Optional[float] = 2.0,
+                 frame_bytes: int = 2, max_age: Optional[float] = 0.2):
+        """
+        Initialize the ingest stage
+
+        Args:
+            decoder: Per-session decoder that receives the batches
+            batch_bytes: Minimum batch size in bytes (3200 bytes = 0.1 s of 16 kHz PCM)
+            max_wait: Seconds to wait for decode queue space before shedding a batch,
+                or None to never drop audio
+            frame_bytes: Bytes per interleaved sample frame, batches are cut on frame boundaries
+            max_age: Seconds pending audio may wait for a full batch before it is
+                submitted on its own, or None to wait for the next frames
+        """
+        self.decoder = decoder
+        self.batch_bytes = batch_bytes
+        self.max_wait = max_wait
+        self.frame_bytes = frame_bytes
+        self.max_age = max_age
+        self.stats = IngestStats()
+
+        self._pending = bytearray()
+        self._packets: List[bytes] = []  # pending messages in packet mode
+        self.batch_packets: Optional[int] = None
+        self._pending_frames = 0
+        self._pending_since = 0.0  # arrival time of the oldest pending frame
+        self._last_arrival = 0.0  # arrival time of the newest frame
+        self._pending_seq: Optional[int] = None  # sequence number of the newest pending frame
+
+        # Submits run one at a time so batches reach the decoder in order
+        self._submit_lock = asyncio.Lock()
+        self._age_timer: Optional[asyncio.TimerHandle] = None
+        self._age_flush: Optional[asyncio.Task] = None
+
+    def set_packets(self, batch_packets: int):
+        """
+        Keep each message whole and batch by message count, for codecs such as Opus
+
+        Args:
+            batch_packets: Number of packets per batch (5 packets = 0.1 s of 20 ms Opus frames)
+        """
+        self.batch_packets = max(1, batch_packets)
+
+    def _has_pending(self) -> bool:
+        """Whether any audio is waiting for a batch"""
+        return bool(self._pending or self._packets)
+
+    async def feed(self, data: bytes, seq: Optional[int] = None):
+        """
+        Accept one frame of audio from the client
+
+        Args:
+            data: PCM bytes as received from the socket, in the declared format,
+                or one compressed packet in packet mode
+            seq: Client sequence number of the frame, when the client frames its audio
+        """
+        self.stats.frames_received += 1
+        self.stats.bytes_received += len(data)
+
+        self._last_arrival = time.monotonic()
+        if not self._has_pending():
+            self._pending_since = self._last_arrival
+        if self.batch_packets is not None:
+            self._packets.append(bytes(data))
+        else:
+            self._pending.extend(data)
+        self._pending_frames += 1
+        if seq is not None:
+            self._pending_seq = seq
+        if (self.max_age is not None and self._age_timer is None
+                and (self._packets or len(self._pending) >= self.frame_bytes)):
+            self._age_timer = asyncio.get_running_loop().call_later(self.max_age, self._on_max_age)
+
+        if self.batch_packets is not None:
+            if len(self._packets) >= self.batch_packets:
+                await self._submit()
+        elif len(self._pending) >= self.batch_bytes:
+            await self._submit()
+
+    async def flush(self):
+        """Submit whatever audio is pending, even if it is smaller than a batch, after any submit in progress"""
+        async with self._submit_lock:
+            if self._has_pending():
+                await self._submit_pending()
+
+    def discard(self):
+        """Drop the pending audio and stop the max-age timer, when no one is left to receive results"""
+        if self._age_timer is not None:
+            self._age_timer.cancel()
+            self._age_timer = None
+        if self._age_flush is not None:
+            self._age_flush.cancel()
+        self._pending.clear()
+        self._packets = []
+        self._pending_frames = 0
+
+    def _on_max_age(self):
+        """Timer callback: submit pending audio that has waited max_age for a full batch"""
+        self._age_timer = None
+        if self._has_pending() and (self._age_flush is None or self._age_flush.done()):
+            self._age_flush = asyncio.ensure_future(self.flush())
+
+    async def _submit(self):
+        """Hand the pending audio to the decoder, applying backpressure if it is busy"""
+        async with self._submit_lock:
+            await self._submit_pending()
+
+    async def _submit_pending(self):
+        """Cut the pending audio into a batch and submit it, called with the submit lock held"""
+        batch: Union[bytes, List[bytes]]
+        if self.batch_packets is not None:
+            batch, self._packets = self._packets, []
+            n_bytes = sum(len(packet) for packet in batch)
+        else:
+            # Keep whole sample frames together, a trailing partial frame waits for the next message
+            n_bytes = len(self._pending) - (len(self._pending) % self.frame_bytes)
+            if n_bytes == 0:
+                return
+            batch = bytes(self._pending[:n_bytes])
+            del self._pending[:n_bytes]
+        if self._age_timer is not None:
+            self._age_timer.cancel()
+            self._age_timer = None
+
+        frames = self._pending_frames
+        self._pending_frames = 1 if self._pending else 0
+        received_at = self._pending_since
+        seq = self._pending_seq
+        if self._pending:
+            # The leftover partial sample frame came with the newest message
+            self._pending_since = self._last_arrival
+
+        if frames > 1:
+            self.stats.coalesced_frames += frames
+            self.stats.coalesced_bytes += n_bytes
+
+        waited = self.decoder.is_full()
+        start = time.monotonic()
+        queued = await self.decoder.submit(batch, timeout=self.max_wait, received_at=received_at,
+                                           seq=seq)
+
+        if waited:
+            self.stats.backpressure_waits += 1
+            self.stats.backpressure_seconds += time.monotonic() - start
+
+        if queued:
+            self.stats.batches_submitted += 1
+        else:
+            self.stats.dropped_batches += 1
+            self.stats.dropped_bytes += n_bytes
+            logger.warning(f"Decode queue full for {self.max_wait}s, dropped {n_bytes} bytes of audio")
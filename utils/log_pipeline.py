@@ -0,0 +1,200 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from typing import Optional
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(trace_id)s] %(message)s'
+
+class TraceIdFilter(logging.Filter):
+    """Give records without a trace ID a placeholder, so formats can always use %(trace_id)s"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "trace_id"):
+            record.trace_id = "-"
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log shippers"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "trace_id": getattr(record, "trace_id", "-"),
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that never blocks or formats on the caller's thread
+
+    The stock QueueHandler formats each record before queueing it. Here the
+    record is queued as-is and the writer thread does the %-formatting, so a
+    log call on the hot path costs one record allocation and a queue put.
+    Arguments must therefore not be mutated after the call. When the queue
+    is full the record is dropped and counted instead of stalling the caller.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class LogSampler:
+    """
+    Pass the first of every N events
+
+    Meant for per-chunk events such as transcriptions. Each sampler belongs to
+    one session and is only used from its decode thread, so no lock is needed.
+    """
+
+    def __init__(self, every: int = 50):
+        """
+        Args:
+            every: Keep one event out of this many. 1 keeps everything.
+        """
+        self.every = max(1, every)
+        self._count = 0
+
+    def sample(self) -> bool:
+        """Whether the current event should be logged"""
+        self._count += 1
+        return self.every == 1 or self._count % self.every == 1
+
+def session_logger(logger: logging.Logger, trace_id: str) -> logging.LoggerAdapter:
+    """
+    Wrap a logger so every record carries a session's trace ID
+
+    Args:
+        logger: Module logger
+        trace_id: Identifier shared by all log lines of one session
+
+    Returns:
+        Logger adapter that adds the trace ID to each record
+    """
+    return logging.LoggerAdapter(logger, {"trace_id": trace_id})
+
+class LogPipeline:
+    """
+    Root logging routed through a bounded queue to a background writer thread
+
+    Log calls only enqueue records. A QueueListener thread formats and writes
+    them to stdout, so slow terminals and pipes no longer block request or
+    decode threads.
+    """
+
+    def __init__(self, level: str = "INFO", fmt: str = "text", queue_size: int = 10000,
+                 stream=None):
+        """
+        Install the pipeline on the root logger
+
+        Args:
+            level: Root log level name
+            fmt: "text" for the human-readable format or "json" for one object per line
+            queue_size: Records buffered before new ones are dropped
+            stream: Output stream. Defaults to stdout.
+        """
+        self.level = getattr(logging, level.upper())
+        self.fmt = fmt
+        self.queue_size = queue_size
+        self.stream = stream or sys.stdout
+
+        self.output = logging.StreamHandler(self.stream)
+        self.output.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+        self.output.addFilter(TraceIdFilter())
+
+        self.handler: Optional[NonBlockingQueueHandler] = None
+        self.listener: Optional[logging.handlers.QueueListener] = None
+        self.start()
+
+    @property
+    def dropped(self) -> int:
+        """Records lost because the queue was full"""
+        return self.handler.dropped if self.handler is not None else 0
+
+    def start(self):
+        """Attach a fresh queue and writer thread to the root logger"""
+        log_queue: queue.Queue = queue.Queue(self.queue_size)
+        self.handler = NonBlockingQueueHandler(log_queue)
+        self.listener = logging.handlers.QueueListener(log_queue, self.output, respect_handler_level=True)
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(self.handler)
+        root.setLevel(self.level)
+        self.listener.start()
+
+    def stop(self):
+        """Write out queued records and stop the writer thread"""
+        if self.listener is not None and self.listener._thread is not None:
+            self.listener.stop()
+
+    def restart_after_fork(self):
+        """
+        Start a new writer thread in a forked child
+
+        Threads do not survive fork(), so a child would otherwise queue
+        records that nobody writes.
+        """
+        self.listener = None
+        self.start()
+
+# Pipeline installed by configure_logging(), if any
+_pipeline: Optional[LogPipeline] = None
+
+def configure_logging(level: str = "INFO", fmt: str = "text", queue_size: int = 10000) -> LogPipeline:
+    """
+    Route all logging through the asynchronous pipeline
+
+    Safe to call more than once, the previous pipeline is flushed and
+    replaced. Forked children get their own writer thread automatically.
+
+    Args:
+        level: Root log level name
+        fmt: "text" or "json"
+        queue_size: Records buffered before new ones are dropped
+
+    Returns:
+        The installed pipeline
+    """
+    global _pipeline
+    first = _pipeline is None
+    if _pipeline is not None:
+        _pipeline.stop()
+    _pipeline = LogPipeline(level, fmt, queue_size)
+
+    if first:
+        atexit.register(stop_logging)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=_restart_pipeline)
+    return _pipeline
+
+def dropped_records() -> int:
+    """Records dropped by the installed pipeline"""
+    return _pipeline.dropped if _pipeline is not None else 0
+
+def stop_logging():
+    """Write out queued records and stop the writer thread, e.g. before os._exit()"""
+    if _pipeline is not None:
+        _pipeline.stop()
+
+def _restart_pipeline():
+    if _pipeline is not None:
+        _pipeline.restart_after_fork()
@@ -0,0 +1,255 @@
+import bisect
+import threading
+from typing import Callable, Dict, List, Optional, Sequence
+
+# Latency buckets in seconds, from sub-millisecond stages up to slow decodes
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Ingest counters that are exported, with their metric name and help text
+INGEST_COUNTERS = (
+    ("bytes_received", "speech_bytes_received_total", "Audio bytes received from clients"),
+    ("frames_received", "speech_frames_received_total", "WebSocket audio frames received"),
+    ("dropped_batches", "speech_chunks_dropped_total", "Audio batches shed because the decode queue stayed full"),
+    ("dropped_bytes", "speech_dropped_bytes_total", "Audio bytes shed because the decode queue stayed full"),
+    ("backpressure_waits", "speech_backpressure_waits_total", "Submits that had to wait for decode queue space"),
+)
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram
+
+    Not thread-safe on purpose: each instance has a single writer (a session's
+    decode thread or its event loop callback), and readers only ever see a
+    slightly stale value.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        """
+        Args:
+            buckets: Sorted upper bounds in seconds, +Inf is implied
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        """Record one measurement in seconds"""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other: "Histogram"):
+        """Add another histogram's observations to this one"""
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.sum += other.sum
+        self.count += other.count
+
+class SessionMetrics:
+    """
+    Per-session accumulators, written without locks on the hot path
+
+    Everything here belongs to one connection, so plain attribute updates are
+    enough. The registry reads and sums them when /metrics is scraped.
+    """
+
+    def __init__(self):
+        self.audio_process = Histogram()
+        self.transcribe = Histogram()
+        self.process_command = Histogram()
+        self.chunk_response = Histogram()
+        self.audio_decode = Histogram()     # compressed client audio to PCM
+        self.network_delay = Histogram()    # one-way delay above the session's fastest frame
+        self.end_to_end = Histogram()       # estimated capture time to result sent
+        self.command_latency = Histogram()  # end of the command word to the command sent
+        self.partial_results = 0
+        self.final_results = 0
+        self.unchanged_partials = 0
+        self.early_commands = 0         # commands sent from partial results
+        self.deduplicated_commands = 0  # final results whose command was already sent early
+        self.forced_finals = 0          # final results forced when speech ended
+        self.commands: Dict[str, int] = {}
+        self.frames_sent = 0
+        self.messages_sent = 0
+        self.frame_gaps = 0        # sequence numbers skipped between framed client frames
+        self.frames_reordered = 0  # framed client frames that arrived after a later one
+
+        # Set by the connection handler
+        self.ingest = None  # IngestStats of the connection
+        self.queue_depth: Optional[Callable[[], int]] = None
+
+    def count_command(self, command: str):
+        """Count one emitted command"""
+        self.commands[command] = self.commands.get(command, 0) + 1
+
+class MetricsRegistry:
+    """
+    Aggregates session metrics into Prometheus text format
+
+    Live sessions are registered when they are handed out. When a session is
+    released its counts are folded into running totals, so nothing is lost
+    when connections close. The lock only guards registration and scrapes,
+    never the per-chunk updates.
+    """
+
+    def __init__(self):
+        self._live: List[SessionMetrics] = []
+        self._totals = SessionMetrics()
+        self._ingest_totals: Dict[str, int] = {attr: 0 for attr, _, _ in INGEST_COUNTERS}
+        self._callbacks: List[tuple] = []
+        self._lock = threading.Lock()
+
+    def add_callback(self, name: str, kind: str, help_text: str, read: Callable[[], float]):
+        """
+        Export a value owned by another component, read at scrape time
+
+        Args:
+            name: Metric name
+            kind: "counter" or "gauge"
+            help_text: Description shown in the scrape
+            read: Function returning the current value
+        """
+        self._callbacks.append((name, kind, help_text, read))
+
+    def register(self, metrics: SessionMetrics):
+        """Start reporting a live session"""
+        with self._lock:
+            self._live.append(metrics)
+
+    def retire(self, metrics: SessionMetrics):
+        """Fold a finished session into the totals and stop tracking it"""
+        with self._lock:
+            if metrics in self._live:
+                self._live.remove(metrics)
+            self._fold(self._totals, self._ingest_totals, metrics)
+
+    def queue_depth(self) -> int:
+        """Audio batches waiting to be decoded, summed over live sessions"""
+        with self._lock:
+            live = list(self._live)
+        return sum(m.queue_depth() for m in live if m.queue_depth is not None)
+
+    @staticmethod
+    def _fold(totals: SessionMetrics, ingest_totals: Dict[str, int], metrics: SessionMetrics):
+        """Add one session's accumulators to a set of totals"""
+        for name in ("audio_process", "transcribe", "process_command", "chunk_response",
+                     "audio_decode", "network_delay", "end_to_end", "command_latency"):
+            getattr(totals, name).merge(getattr(metrics, name))
+        totals.partial_results += metrics.partial_results
+        totals.final_results += metrics.final_results
+        totals.unchanged_partials += metrics.unchanged_partials
+        totals.early_commands += metrics.early_commands
+        totals.deduplicated_commands += metrics.deduplicated_commands
+        totals.forced_finals += metrics.forced_finals
+        totals.frames_sent += metrics.frames_sent
+        totals.messages_sent += metrics.messages_sent
+        totals.frame_gaps += metrics.frame_gaps
+        totals.frames_reordered += metrics.frames_reordered
+        for command, n in list(metrics.commands.items()):
+            totals.commands[command] = totals.commands.get(command, 0) + n
+        if metrics.ingest is not None:
+            for attr in ingest_totals:
+                ingest_totals[attr] += getattr(metrics.ingest, attr)
+
+    def render(self) -> str:
+        """
+        Aggregate all sessions and format them for a Prometheus scrape
+
+        Returns:
+            Metrics in the Prometheus text exposition format
+        """
+        snapshot = SessionMetrics()
+        ingest = {attr: 0 for attr in self._ingest_totals}
+        with self._lock:
+            live = list(self._live)
+            self._fold(snapshot, ingest, self._totals)
+            for attr, n in self._ingest_totals.items():
+                ingest[attr] += n
+        queue_depth = 0
+        for metrics in live:
+            self._fold(snapshot, ingest, metrics)
+            if metrics.queue_depth is not None:
+                queue_depth += metrics.queue_depth()
+
+        lines: List[str] = []
+        _histogram(lines, "speech_audio_process_seconds", "Time spent in AudioProcessor.process_audio",
+                   snapshot.audio_process)
+        _histogram(lines, "speech_transcribe_seconds", "Time spent in SpeechModel.transcribe", snapshot.transcribe)
+        _histogram(lines, "speech_process_command_seconds", "Time spent in CommandHandler.process_command",
+                   snapshot.process_command)
+        _histogram(lines, "speech_chunk_response_seconds",
+                   "Time from receiving an audio chunk to sending its result", snapshot.chunk_response)
+        _histogram(lines, "speech_audio_decode_seconds", "Time spent decoding one compressed audio packet",
+                   snapshot.audio_decode)
+        _histogram(lines, "speech_network_delay_seconds",
+                   "One-way delay of framed client audio above the fastest frame of its session",
+                   snapshot.network_delay)
+        _histogram(lines, "speech_end_to_end_seconds",
+                   "Estimated time from client capture to sending the result, framed clients only",
+                   snapshot.end_to_end)
+        _histogram(lines, "speech_command_latency_seconds",
+                   "Time from the end of a command word to sending the command, with word timing only",
+                   snapshot.command_latency)
+
+        for attr, name, help_text in INGEST_COUNTERS:
+            _metric(lines, name, "counter", help_text, [("", ingest[attr])])
+
+        _metric(lines, "speech_results_total", "counter", "Recognizer results passed on to clients, repeated partials excluded", [
+            ('{type="partial"}', snapshot.partial_results),
+            ('{type="final"}', snapshot.final_results),
+        ])
+        _metric(lines, "speech_unchanged_partials_total", "counter",
+                "Repeated partial results that were not sent to the client", [("", snapshot.unchanged_partials)])
+        _metric(lines, "speech_commands_total", "counter", "Commands sent to clients",
+                [(f'{{command="{_escape(c)}"}}', n) for c, n in sorted(snapshot.commands.items())])
+        _metric(lines, "speech_early_commands_total", "counter",
+                "Commands sent from partial results, before the utterance was final", [("", snapshot.early_commands)])
+        _metric(lines, "speech_deduplicated_commands_total", "counter",
+                "Final results whose command had already been sent from a partial",
+                [("", snapshot.deduplicated_commands)])
+        _metric(lines, "speech_forced_finals_total", "counter",
+                "Final results forced because the voice activity detector saw speech end",
+                [("", snapshot.forced_finals)])
+
+        _metric(lines, "speech_frames_sent_total", "counter", "WebSocket frames sent to clients",
+                [("", snapshot.frames_sent)])
+        _metric(lines, "speech_messages_sent_total", "counter", "Messages sent to clients, several may share a frame",
+                [("", snapshot.messages_sent)])
+
+        _metric(lines, "speech_frame_gaps_total", "counter", "Sequence numbers missing between framed client frames",
+                [("", snapshot.frame_gaps)])
+        _metric(lines, "speech_frames_reordered_total", "counter", "Framed client frames that arrived out of order",
+                [("", snapshot.frames_reordered)])
+
+        _metric(lines, "speech_active_sessions", "gauge", "Sessions serving a connection", [("", len(live))])
+        _metric(lines, "speech_decode_queue_depth", "gauge", "Audio batches waiting to be decoded, all sessions",
+                [("", queue_depth)])
+        for name, kind, help_text, read in self._callbacks:
+            _metric(lines, name, kind, help_text, [("", read())])
+        return "\n".join(lines) + "\n"
+
+def _escape(value: str) -> str:
+    """Escape a label value"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _metric(lines: List[str], name: str, kind: str, help_text: str, samples):
+    """Append one metric family with its samples"""
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+    for labels, value in samples:
+        lines.append(f"{name}{labels} {value}")
+
+def _histogram(lines: List[str], name: str, help_text: str, histogram: Histogram):
+    """Append a histogram family with cumulative buckets"""
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    cumulative = 0
+    for bound, n in zip(histogram.buckets, histogram.counts):
+        cumulative += n
+        lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+    # Derive the total from the buckets so a scrape racing a writer stays consistent
+    cumulative += histogram.counts[-1]
+    lines.append(f'{name}_bucket{{le="+Inf"}} {cumulative}')
+    lines.append(f"{name}_sum {histogram.sum}")
+    lines.append(f"{name}_count {cumulative}")
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import threading
+import time
+import traceback
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+class ModelLoader:
+    """
+    Loads the recognition components once, in the background or on demand
+
+    The build function does the actual work and reports each stage it enters
+    through the callback it is given, so that progress can be shown while
+    it runs. It returns a dictionary of metadata describing what was loaded.
+    """
+
+    IDLE = "idle"
+    LOADING = "loading"
+    READY = "ready"
+    FAILED = "failed"
+
+    def __init__(self, build: Callable[[Callable[[str], None]], dict]):
+        """
+        Args:
+            build: Function that loads everything and returns metadata. It
+                receives a callback to report the name of the stage it is in.
+        """
+        self.build = build
+        self.state = self.IDLE
+        self.stage: Optional[str] = None
+        self.error: Optional[str] = None
+        self.metadata: dict = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        """Whether loading finished successfully"""
+        return self.state == self.READY
+
+    def start(self):
+        """Begin loading on a background thread, unless loading has already begun"""
+        with self._lock:
+            if self.state != self.IDLE:
+                return
+            self._begin()
+        self._thread = threading.Thread(target=self._run, name="model-loader", daemon=True)
+        self._thread.start()
+
+    def load(self) -> bool:
+        """
+        Load on the calling thread, or wait for a load already in progress
+
+        Returns:
+            True if the components are ready
+        """
+        with self._lock:
+            run_here = self.state == self.IDLE
+            if run_here:
+                self._begin()
+        if run_here:
+            self._run()
+        else:
+            self._done.wait()
+        return self.ready
+
+    async def wait_ready(self, timeout: float) -> bool:
+        """
+        Wait, without blocking the event loop, until loading has finished
+
+        Args:
+            timeout: Maximum seconds to wait
+
+        Returns:
+            True if the components are ready
+        """
+        if not self._done.is_set() and timeout > 0:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._done.wait, timeout)
+        return self.ready
+
+    def status(self) -> dict:
+        """Current state, stage, timings and metadata, for the readiness endpoint"""
+        now = time.time()
+        status = {"state": self.state, "stage": self.stage}
+        if self.started_at is not None:
+            status["elapsed_seconds"] = round((self.finished_at or now) - self.started_at, 3)
+        if self.error:
+            status["error"] = self.error
+        if self.metadata:
+            status["model"] = self.metadata
+        return status
+
+    def _begin(self):
+        """Mark loading as started, called with the lock held"""
+        self.state = self.LOADING
+        self.started_at = time.time()
+
+    def _report(self, stage: str):
+        """Record the stage the build function has reached"""
+        self.stage = stage
+        logger.info(f"Loading: {stage}")
+
+    def _run(self):
+        """Run the build function and record the outcome"""
+        try:
+            metadata = self.build(self._report)
+            self.metadata = metadata or {}
+            self.state = self.READY
+            logger.info(f"Model ready after {time.time() - self.started_at:.2f}s")
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self.state = self.FAILED
+            logger.error(f"Error loading model: {e}")
+            logger.error(traceback.format_exc())
+        finally:
+            self.stage = None
+            self.finished_at = time.time()
+            self._done.set()
@@ -0,0 +1,440 @@
+import logging
+import os
+import threading
+import time
+import traceback
+from typing import Callable, Dict, List, Optional, Tuple
+
+from models.asr_model import SpeechModel
+from utils.command_matcher import CommandMatcher
+from utils.commit_policy import CommitPolicy
+from utils.metrics import MetricsRegistry
+from utils.session_pool import RecognizerSession, SessionPool
+
+logger = logging.getLogger(__name__)
+
+class ModelGeneration:
+    """
+    One loaded model and vocabulary, with the session pool built on them
+
+    Sessions taken from a generation keep using it until they are released,
+    even after a newer generation has been installed. A retired generation
+    drops its model and idle sessions once its last session comes back.
+    """
+
+    def __init__(self, generation: int, speech_model: SpeechModel, command_matcher: CommandMatcher,
+                 pool: SessionPool, commands_config: Optional[str], metadata: dict):
+        """
+        Args:
+            generation: Sequence number, 1 for the model loaded at startup
+            speech_model: Loaded speech model
+            command_matcher: Compiled command vocabulary
+            pool: Session pool sharing the model and vocabulary
+            commands_config: Vocabulary file the matcher was read from, if any
+            metadata: Description of what was loaded
+        """
+        self.generation = generation
+        self.speech_model = speech_model
+        self.command_matcher = command_matcher
+        self.pool = pool
+        self.commands_config = commands_config
+        self.metadata = metadata
+        self.installed_at = time.time()
+        self.retired = False
+
+    @property
+    def active_sessions(self) -> int:
+        """Sessions handed out and not yet released, the generation's reference count"""
+        return self.pool.active_sessions if self.pool is not None else 0
+
+    @property
+    def model_path(self) -> Optional[str]:
+        """Model directory the generation was loaded from"""
+        return self.metadata.get("path")
+
+    def free(self):
+        """Drop the model and the idle sessions so their memory can be reclaimed"""
+        if self.pool is not None:
+            self.pool.clear()
+        self.pool = None
+        self.speech_model = None
+        self.command_matcher = None
+
+    def describe(self) -> dict:
+        """Summary for the admin API"""
+        return {
+            "generation": self.generation,
+            "installed_at": round(self.installed_at, 3),
+            "retired": self.retired,
+            "active_sessions": self.active_sessions,
+            "commands_config": self.commands_config,
+            **self.metadata,
+        }
+
+class ModelManager:
+    """
+    Current model generation, and background loading of replacements
+
+    New connections always get a session from the current generation. A
+    reload builds the replacement on a background thread and then swaps it
+    in under a lock, so a connection gets either the old or the new model,
+    never a half-loaded one. Sessions already running finish on the model
+    they started with; the old generation is freed when its last session is
+    released. The session cap applies across all generations.
+    """
+
+    IDLE = "idle"
+    LOADING = "loading"
+    FAILED = "failed"
+
+    def __init__(self, model_path: Optional[str] = None, commands_config: Optional[str] = None,
+                 mode: str = SpeechModel.MODE_FULL, max_sessions: int = 100, preload: int = 0,
+                 metrics: Optional[MetricsRegistry] = None, log_sample_every: int = 50,
+                 commit_policy: Optional[CommitPolicy] = None,
+                 backend: str = "vosk", backend_options: Optional[dict] = None):
+        """
+        Args:
+            model_path: Vosk model directory, or the model or script file of the
+                other backends. None for the backend's default.
+            commands_config: JSON vocabulary file, or None for play/pause
+            mode: Recognizer mode, "full" or "keyword"
+            max_sessions: Maximum live sessions across all generations
+            preload: Idle sessions created with each generation
+            metrics: Registry the sessions report to
+            log_sample_every: Log one in this many transcriptions per session at DEBUG level
+            commit_policy: When sessions send commands heard in partial results
+            backend: Recognizer backend, "vosk", "kws" or "scripted"
+            backend_options: Extra backend arguments, e.g. cpu_per_second
+        """
+        self.model_path = model_path
+        self.commands_config = commands_config
+        self.mode = mode
+        self.max_sessions = max_sessions
+        self.preload = preload
+        self.metrics = metrics or MetricsRegistry()
+        self.log_sample_every = log_sample_every
+        self.commit_policy = commit_policy or CommitPolicy()
+        self.backend = backend
+        self.backend_options = backend_options or {}
+
+        self.current: Optional[ModelGeneration] = None
+        self._retired: List[ModelGeneration] = []
+        self._generations = 0
+        self._served_by_freed = 0
+        self._lock = threading.Lock()
+
+        # State of the latest reload, for the admin API
+        self.reload_state = self.IDLE
+        self.reload_error: Optional[str] = None
+        self.reloads = 0
+        self._reload_lock = threading.Lock()
+        self._reload_thread: Optional[threading.Thread] = None
+
+        self._watcher: Optional[threading.Thread] = None
+        self._stop_watching = threading.Event()
+
+    @property
+    def active_sessions(self) -> int:
+        """Live sessions across the current and retiring generations"""
+        with self._lock:
+            generations = self._all()
+        return sum(g.active_sessions for g in generations)
+
+    @property
+    def sessions_served(self) -> int:
+        """Sessions handed out since startup, by every generation"""
+        with self._lock:
+            generations = self._all()
+        return self._served_by_freed + sum(g.pool.sessions_served for g in generations if g.pool is not None)
+
+    def load(self, report: Callable[[str], None] = lambda stage: None) -> dict:
+        """
+        Load the configured model and vocabulary and make them current
+
+        Args:
+            report: Callback taking the name of the current stage
+
+        Returns:
+            Metadata about the loaded model
+        """
+        generation = self._build(self.model_path, self.commands_config, report=report)
+        self._install(generation)
+        return generation.metadata
+
+    def acquire(self) -> Tuple[Optional[ModelGeneration], Optional[RecognizerSession]]:
+        """
+        Take a session from the current generation
+
+        Returns:
+            The generation and session, or (None, None) when no model is
+            loaded or the session cap has been reached
+        """
+        with self._lock:
+            generation = self.current
+            if generation is None:
+                return None, None
+            if sum(g.active_sessions for g in self._all()) >= self.max_sessions:
+                logger.warning(f"Session limit reached ({self.max_sessions}), rejecting connection")
+                return None, None
+            # Under the lock so the generation can't be retired and freed in between
+            session = generation.pool.acquire()
+        return (generation, session) if session is not None else (None, None)
+
+    def release(self, generation: ModelGeneration, session: RecognizerSession):
+        """
+        Return a session to the generation it came from
+
+        Args:
+            generation: Generation returned with the session by acquire()
+            session: Session to release
+        """
+        pool = generation.pool
+        if pool is not None:
+            pool.release(session)
+
+        with self._lock:
+            free = generation.retired and generation.active_sessions == 0 and generation in self._retired
+            if free:
+                self._retired.remove(generation)
+                self._served_by_freed += generation.pool.sessions_served
+        if free:
+            generation.free()
+            logger.info(f"Freed model generation {generation.generation}, its last session ended")
+
+    def reload(self, model_path: Optional[str] = None, commands_config: Optional[str] = None,
+               reload_model: bool = True, wait: bool = False) -> bool:
+        """
+        Load a new model and/or vocabulary in the background and swap it in
+
+        Args:
+            model_path: New model directory. Defaults to the current one.
+            commands_config: New vocabulary file. Defaults to the current one.
+            reload_model: Load the model from disk even if the path is
+                unchanged. When False and the path is the same, the loaded
+                model is reused and only the vocabulary changes.
+            wait: Block until the reload has finished
+
+        Returns:
+            False if a reload is already in progress, True otherwise
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        self.reload_state = self.LOADING
+        self.reload_error = None
+
+        self._reload_thread = threading.Thread(
+            target=self._reload,
+            args=(model_path, commands_config, reload_model),
+            name="model-reload",
+            daemon=True,
+        )
+        self._reload_thread.start()
+        if wait:
+            self.wait_reload()
+        return True
+
+    def wait_reload(self, timeout: Optional[float] = None):
+        """Block until the reload in progress, if any, has finished"""
+        thread = self._reload_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def status(self) -> dict:
+        """Current and retiring generations and the state of the last reload, for the admin API"""
+        with self._lock:
+            current = self.current
+            retired = list(self._retired)
+        status = {
+            "reload": self.reload_state,
+            "reloads": self.reloads,
+            "current": current.describe() if current is not None else None,
+            "retiring": [g.describe() for g in retired],
+            "watching": self._watcher is not None,
+        }
+        if self.reload_error:
+            status["error"] = self.reload_error
+        return status
+
+    def watch(self, interval: float):
+        """
+        Poll the model directory and vocabulary file and reload when they change
+
+        A changed vocabulary file only rebuilds the vocabulary; a changed
+        model directory also loads the model again. Replace model files
+        atomically (e.g. unpack next to the old one and rename) so that a
+        half-copied model is never picked up.
+
+        Args:
+            interval: Seconds between checks
+        """
+        if self._watcher is not None or interval <= 0:
+            return
+        self._stop_watching.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name="model-watch", daemon=True)
+        self._watcher.start()
+        logger.info(f"Watching model and vocabulary files every {interval:g}s")
+
+    def stop_watching(self):
+        """Stop the file watch thread"""
+        self._stop_watching.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+        self._watcher = None
+
+    def _all(self) -> List[ModelGeneration]:
+        """Current and retiring generations, called with the lock held"""
+        return ([self.current] if self.current is not None else []) + self._retired
+
+    def _build(self, model_path: Optional[str], commands_config: Optional[str],
+               base: Optional[ModelGeneration] = None,
+               report: Callable[[str], None] = lambda stage: None) -> ModelGeneration:
+        """
+        Load a model and vocabulary and build a session pool on them
+
+        Args:
+            model_path: Vosk model directory, or None for the default
+            commands_config: JSON vocabulary file, or None for play/pause
+            base: Generation whose loaded model is reused instead of loading it again
+            report: Callback taking the name of the current stage
+
+        Returns:
+            The new, not yet installed, generation
+        """
+        report("vocabulary")
+        matcher = CommandMatcher.from_file(commands_config) if commands_config else CommandMatcher.default()
+
+        report("model")
+        start = time.time()
+        if base is not None:
+            model = base.speech_model.with_vocabulary(matcher.vocabulary())
+        else:
+            model = SpeechModel(model_path, mode=self.mode, vocabulary=matcher.vocabulary(),
+                                backend=self.backend, backend_options=self.backend_options)
+        load_seconds = time.time() - start
+
+        report("sessions")
+        pool = SessionPool(
+            model,
+            max_sessions=self.max_sessions,
+            preload=self.preload,
+            command_matcher=matcher,
+            metrics=self.metrics,
+            log_sample_every=self.log_sample_every,
+            commit_policy=self.commit_policy,
+        )
+
+        metadata = {
+            **model.backend.describe(),
+            "backend": model.backend.name,
+            "path": model.model_path,
+            "mode": model.mode,
+            "word_timing": model.word_timing,
+            "commit_policy": self.commit_policy.as_dict(),
+            "commands": sorted(matcher.commands),
+            "phrases": matcher.phrase_count,
+            "load_seconds": round(load_seconds, 3),
+            "preloaded_sessions": pool.idle_sessions,
+        }
+        with self._lock:
+            self._generations += 1
+            number = self._generations
+        return ModelGeneration(number, model, matcher, pool, commands_config, metadata)
+
+    def _install(self, generation: ModelGeneration):
+        """Make a generation current and retire the previous one"""
+        with self._lock:
+            previous, self.current = self.current, generation
+            self.model_path = generation.model_path
+            self.commands_config = generation.commands_config
+            free = False
+            if previous is not None:
+                previous.retired = True
+                if previous.active_sessions == 0:
+                    free = True
+                    self._served_by_freed += previous.pool.sessions_served
+                else:
+                    self._retired.append(previous)
+
+        logger.info(f"Model generation {generation.generation} is now current "
+                    f"({generation.metadata['backend']}, {generation.model_path}, "
+                    f"{generation.metadata['phrases']} command phrases)")
+        if previous is not None:
+            if free:
+                previous.free()
+                logger.info(f"Freed model generation {previous.generation}, it had no sessions")
+            else:
+                logger.info(f"Model generation {previous.generation} retires after its "
+                            f"{previous.active_sessions} sessions end")
+
+    def _reload(self, model_path: Optional[str], commands_config: Optional[str], reload_model: bool):
+        """Body of the reload thread"""
+        try:
+            current = self.current
+            path = model_path or self.model_path
+            config = commands_config if commands_config is not None else self.commands_config
+
+            reuse = (not reload_model and current is not None and current.speech_model is not None
+                     and path == current.model_path)
+            logger.info(f"Reloading {'vocabulary' if reuse else 'model'} (model {path}, commands {config})")
+            generation = self._build(path, config, base=current if reuse else None)
+            self._install(generation)
+            self.reloads += 1
+            self.reload_state = self.IDLE
+        except Exception as e:
+            self.reload_error = f"{type(e).__name__}: {e}"
+            self.reload_state = self.FAILED
+            logger.error(f"Error reloading model: {e}")
+            logger.error(traceback.format_exc())
+        finally:
+            self._reload_lock.release()
+
+    def _watch(self, interval: float):
+        """Body of the file watch thread"""
+        # Compare against what the first load actually read
+        while self.current is None:
+            if self._stop_watching.wait(interval):
+                return
+        model_seen = _tree_signature(self.model_path)
+        config_seen = _file_signature(self.commands_config)
+        while not self._stop_watching.wait(interval):
+            try:
+                model_now = _tree_signature(self.model_path)
+                config_now = _file_signature(self.commands_config)
+                if model_now == model_seen and config_now == config_seen:
+                    continue
+
+                model_changed = model_now != model_seen
+                logger.info(f"{'Model' if model_changed else 'Vocabulary'} files changed, reloading")
+                if self.reload(reload_model=model_changed, wait=True):
+                    model_seen, config_seen = model_now, config_now
+            except Exception as e:
+                logger.error(f"Error watching model files: {e}")
+
+def _file_signature(path: Optional[str]) -> Optional[Tuple[float, int]]:
+    """Modification time and size of a file, None if it doesn't exist"""
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime, stat.st_size
+
+def _tree_signature(path: Optional[str]) -> Optional[tuple]:
+    """
+    Where a directory points and the signature of every file under it
+
+    Repointing a symlinked model directory counts as a change too. A single
+    file, such as a stand-in script, is signed on its own.
+    """
+    if path and os.path.isfile(path):
+        return os.path.realpath(path), _file_signature(path)
+    if not path or not os.path.isdir(path):
+        return None
+    real = os.path.realpath(path)
+    files: Dict[str, Optional[Tuple[float, int]]] = {}
+    for root, _, names in os.walk(real):
+        for name in names:
+            full = os.path.join(root, name)
+            files[os.path.relpath(full, real)] = _file_signature(full)
+    return real, files
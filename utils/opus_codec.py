@@ -0,0 +1,85 @@
+import logging
+import time
+from typing import Optional
+
+try:
+    import opuslib
+except Exception:  # pragma: no cover - ImportError, or opuslib failing to find libopus
+    opuslib = None
+
+logger = logging.getLogger(__name__)
+
+# Whether Opus streams can be accepted
+OPUS_AVAILABLE = opuslib is not None
+
+# Longest frame an Opus packet can hold
+MAX_FRAME_MS = 120
+
+class OpusStreamDecoder:
+    """
+    Per-connection Opus decoder producing 16 kHz mono 16-bit PCM
+
+    Each binary message from the client carries one Opus packet. The decoder
+    keeps its state across packets, as Opus requires, so every session needs
+    its own. The session's AudioProcessor runs it on the decode thread, in
+    packet order, and the PCM it produces continues down the same path as
+    uncompressed audio.
+    """
+
+    def __init__(self, sample_rate: int = 16000, channels: int = 1, metrics=None):
+        """
+        Args:
+            sample_rate: Output sample rate, Opus decodes to any of 8, 12, 16, 24 or 48 kHz
+            channels: Output channels
+            metrics: Optional SessionMetrics for decode timing
+
+        Raises:
+            RuntimeError: If opuslib or libopus is not installed
+        """
+        if opuslib is None:
+            raise RuntimeError("Opus support needs opuslib and libopus (pip install opuslib)")
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.metrics = metrics
+        self.max_frame_samples = sample_rate * MAX_FRAME_MS // 1000
+        self._decoder = opuslib.Decoder(sample_rate, channels)
+
+        self.packets = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.errors = 0
+
+    def decode(self, packet: bytes) -> Optional[bytes]:
+        """
+        Decode one packet
+
+        Args:
+            packet: One Opus packet as sent by the client
+
+        Returns:
+            Interleaved 16-bit PCM, or None if the packet could not be decoded
+        """
+        start = time.perf_counter()
+        try:
+            pcm = self._decoder.decode(bytes(packet), self.max_frame_samples)
+        except Exception as e:
+            self.errors += 1
+            logger.debug("Could not decode Opus packet of %d bytes: %s", len(packet), e)
+            return None
+        if self.metrics is not None:
+            self.metrics.audio_decode.observe(time.perf_counter() - start)
+
+        self.packets += 1
+        self.bytes_in += len(packet)
+        self.bytes_out += len(pcm)
+        return pcm
+
+    def as_dict(self) -> dict:
+        """Summary for the end-of-session log"""
+        return {
+            "packets": self.packets,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "compression": round(self.bytes_out / self.bytes_in, 1) if self.bytes_in else None,
+            "errors": self.errors,
+        }
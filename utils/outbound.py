@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, List, Optional
+
+from utils import fast_json
+
+logger = logging.getLogger(__name__)
+
+# Message types sent to clients
+PARTIAL = "partial"
+FINAL = "final"
+COMMAND = "command"
+
+# Internal message field set by the session: when the command word ended, in seconds
+# after the audio batch arrived. MessageSender removes it before sending.
+WORD_END = "_word_end"
+
+def build_message(recognition, command: Optional[str] = None) -> dict:
+    """
+    Turn a recognizer result into an outbound message
+
+    Every message has "type" ("partial", "final" or "command"), "text" and
+    "ts" (server time in seconds since the epoch). Command messages add
+    "command" and "final". "confidence", "start" and "end" (seconds of
+    stream audio) are only present when the recognizer reports word timing.
+    For clients that frame their audio, MessageSender adds "seq", the
+    sequence number of the newest frame the result covers.
+
+    Args:
+        recognition: Result from SpeechModel.decode()
+        command: Command detected in the text, if any
+
+    Returns:
+        Message ready to be encoded
+    """
+    message = {
+        "type": COMMAND if command else (FINAL if recognition.is_final else PARTIAL),
+        "text": recognition.text,
+        "ts": round(time.time(), 3),
+    }
+    if command:
+        message["command"] = command
+        message["final"] = recognition.is_final
+    if recognition.confidence is not None:
+        message["confidence"] = round(recognition.confidence, 3)
+    if recognition.start is not None:
+        message["start"] = recognition.start
+        message["end"] = recognition.end
+    return message
+
+class MessageSender:
+    """
+    Per-connection outbound queue that batches messages into frames
+
+    Messages are pushed without waiting for the socket. A sender task writes
+    whatever has accumulated as one frame: a single JSON object, or a JSON
+    array when several messages are batched. A partial that is followed by
+    another partial or a final in the same batch is dropped, since the client
+    would overwrite it immediately.
+
+    Partials are also throttled: after a frame has been sent, partials wait
+    until partial_window has passed and are then merged into one update.
+    Finals and commands are never held back.
+    """
+
+    def __init__(self, send: Callable[[str], Awaitable[None]], metrics=None, partial_window: float = 0.0,
+                 captured_at: Optional[Callable[[int], Optional[float]]] = None):
+        """
+        Initialize the sender
+
+        Args:
+            send: Coroutine that writes one text frame to the client
+            metrics: Optional SessionMetrics for frame counts and chunk-to-response latency
+            partial_window: Minimum seconds between frames that only carry partials
+            captured_at: Optional lookup from a client sequence number to the
+                estimated time.monotonic() the frame was captured, for end-to-end latency
+        """
+        self.send = send
+        self.metrics = metrics
+        self.partial_window = partial_window
+        self.captured_at = captured_at
+        self._pending: List[tuple] = []
+        self._wake = asyncio.Event()
+        self._urgent = asyncio.Event()  # a final or command is waiting
+        self._last_sent = float("-inf")
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        self._finishing = False  # sending what is pending, then stopping
+
+    def start(self):
+        """Start the sender task on the running event loop"""
+        self._task = asyncio.create_task(self._run())
+
+    async def push(self, message: dict, received_at: Optional[float] = None, seq: Optional[int] = None):
+        """
+        Queue a message for the next frame
+
+        Args:
+            message: Message from build_message()
+            received_at: time.monotonic() when the audio behind it arrived
+            seq: Client sequence number of the newest frame behind it. It is
+                added to the message so the client can time the round trip.
+        """
+        if self._closed:
+            return
+        if seq is not None:
+            message["seq"] = seq
+        word_end = message.pop(WORD_END, None)
+        word_end_at = received_at + word_end if word_end is not None and received_at is not None else None
+        self._pending.append((message, received_at, seq, word_end_at))
+        if message["type"] != PARTIAL:
+            self._urgent.set()
+        self._wake.set()
+
+    async def close(self, flush: bool = False):
+        """
+        Stop the sender task
+
+        Args:
+            flush: Send the pending messages first, without waiting for the
+                partial window, instead of discarding them
+        """
+        if flush and not self._closed and self._task is not None and not self._task.done():
+            self._finishing = True
+        else:
+            self._closed = True
+            self._pending = []
+        self._wake.set()
+        self._urgent.set()
+        if self._task is not None:
+            try:
+                await self._task
+            except Exception as e:
+                logger.error(f"Sender task ended with error: {e}")
+
+    @staticmethod
+    def coalesce(messages: List[dict]) -> List[dict]:
+        """Drop partials superseded by a later partial or final in the same batch"""
+        kept = []
+        for i, message in enumerate(messages):
+            if message["type"] == PARTIAL and any(m["type"] in (PARTIAL, FINAL) for m in messages[i + 1:]):
+                continue
+            kept.append(message)
+        return kept
+
+    async def _run(self):
+        """Send accumulated messages as one frame whenever there are any"""
+        while not self._closed:
+            await self._wake.wait()
+            self._wake.clear()
+            if not self._pending and self._finishing:
+                self._closed = True
+            if self._closed or not self._pending:
+                continue
+
+            # Hold partials back until the window since the last frame has passed
+            delay = self._last_sent + self.partial_window - time.monotonic()
+            if delay > 0 and not self._urgent.is_set() and not self._finishing:
+                try:
+                    await asyncio.wait_for(self._urgent.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                if self._closed:
+                    break
+            self._urgent.clear()
+            self._wake.clear()
+
+            batch, self._pending = self._pending, []
+            messages = self.coalesce([item[0] for item in batch]) if len(batch) > 1 else [batch[0][0]]
+            frame = messages[0] if len(messages) == 1 else messages
+
+            try:
+                await self.send(fast_json.dumps(frame))
+                self._last_sent = time.monotonic()
+            except Exception as e:
+                logger.info(f"Stopping sender, could not deliver frame: {e}")
+                self._closed = True
+                break
+            if self._finishing:
+                self._wake.set()
+
+            if self.metrics is not None:
+                self.metrics.frames_sent += 1
+                self.metrics.messages_sent += len(messages)
+                now = time.monotonic()
+                for _, received_at, seq, word_end_at in batch:
+                    if received_at is not None:
+                        self.metrics.chunk_response.observe(now - received_at)
+                    if word_end_at is not None:
+                        self.metrics.command_latency.observe(max(0.0, now - word_end_at))
+                    if seq is not None and self.captured_at is not None:
+                        captured = self.captured_at(seq)
+                        if captured is not None:
+                            self.metrics.end_to_end.observe(now - captured)
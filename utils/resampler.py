@@ -0,0 +1,248 @@
+import logging
+import math
+from fractions import Fraction
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Sample formats a client may declare, with their NumPy dtype
+SAMPLE_FORMATS = {
+    "s16le": np.dtype("<i2"),  # signed 16-bit integers
+    "f32le": np.dtype("<f4"),  # 32-bit floats in [-1, 1]
+}
+
+class StreamingResampler:
+    """
+    Rational-ratio polyphase resampler that keeps its filter state across chunks
+
+    The rate change in_rate -> out_rate is reduced to up/down factors L/M.
+    A windowed-sinc low-pass designed at L times the input rate is split
+    into L phases of K taps each; every output sample is one K-tap dot
+    product with the phase that lands on it, so the zero-stuffed upsampled
+    signal is never built. The last K-1 input samples are carried over to
+    the next chunk, so chunk boundaries are seamless.
+
+    All scratch space is preallocated and grown on demand, and the dot
+    products are matrix products written into it, so steady-state calls
+    allocate no sample buffers, only a few array views. Not thread-safe;
+    each stream needs its own.
+    """
+
+    def __init__(self, in_rate: int, out_rate: int = 16000, zero_crossings: int = 16, rolloff: float = 0.9,
+                 beta: float = 8.0):
+        """
+        Args:
+            in_rate: Input sample rate in Hz
+            out_rate: Output sample rate in Hz
+            zero_crossings: Filter half-width in zero crossings of the sinc,
+                more is sharper and costs more per sample
+            rolloff: Cutoff as a fraction of the lower Nyquist frequency
+            beta: Kaiser window shape, higher trades transition width for stopband attenuation
+        """
+        ratio = Fraction(out_rate, in_rate)
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.up = ratio.numerator
+        self.down = ratio.denominator
+
+        # Prototype low-pass at the upsampled rate, cut at the lower of the two Nyquist rates
+        stretch = max(self.up, self.down)
+        cutoff = rolloff * 0.5 / stretch
+        length = 2 * zero_crossings * stretch + 1
+        n = np.arange(length) - (length - 1) / 2
+        prototype = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(length, beta)
+        prototype *= self.up / prototype.sum()  # zero-stuffing divides the level by L, the filter makes it up
+
+        # Split into phases: phase p holds taps p, p + L, p + 2L, ..., reversed so
+        # that a phase dots with input samples in ascending order
+        self._length = length
+        self.taps = math.ceil(length / self.up)
+        padded = np.zeros(self.taps * self.up)
+        padded[:length] = prototype
+        self._phases = np.ascontiguousarray(padded.reshape(self.taps, self.up).T[:, ::-1], dtype=np.float32)
+
+        # Input history: the previous chunk's last K-1 samples lead the next chunk
+        self._history = np.zeros(self.taps - 1, dtype=np.float32)
+        # Position of the next output in upsampled samples, relative to the start of the next chunk
+        self._position = 0
+
+        self._ext = np.zeros(0, dtype=np.float32)
+        self._steps = np.zeros(0, dtype=np.int64)
+        self._offsets = np.zeros((0, self.taps), dtype=np.int64)
+        self._gather = np.zeros((0, self.taps), dtype=np.int64)
+        self._index = np.zeros(0, dtype=np.int64)
+        self._phase = np.zeros(0, dtype=np.int64)
+        self._windows = np.zeros((0, self.taps), dtype=np.float32)
+        self._coefs = np.zeros((0, self.taps), dtype=np.float32)
+        self._ones = np.ones(self.taps, dtype=np.float32)
+        self._out = np.zeros(0, dtype=np.float32)
+
+    @property
+    def delay(self) -> float:
+        """Group delay of the filter in seconds"""
+        return (self._length - 1) / 2 / (self.in_rate * self.up)
+
+    def reset(self):
+        """Forget the filter state, for a new stream"""
+        self._history[:] = 0
+        self._position = 0
+
+    def max_output(self, n_in: int) -> int:
+        """Upper bound on the outputs produced by a chunk of n_in samples"""
+        return (n_in * self.up) // self.down + 1
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Resample the next chunk of a stream
+
+        Args:
+            samples: Mono float32 input samples
+
+        Returns:
+            Resampled float32 samples. A view into the resampler's scratch
+            space, only valid until the next call.
+        """
+        n_in = len(samples)
+        keep = self.taps - 1
+        self._reserve(n_in)
+
+        # History followed by the new samples
+        ext = self._ext[:keep + n_in]
+        ext[:keep] = self._history
+        ext[keep:] = samples
+
+        # Outputs whose newest input sample falls inside this chunk
+        total = n_in * self.up
+        n_out = max(0, -(-(total - self._position) // self.down))
+        out = self._out[:n_out]
+
+        if self.up == 1:
+            # Integer decimation (48 or 32 kHz): one phase, and the windows are a strided view of
+            # the input. Copied into contiguous rows, one matrix-vector product is the fastest.
+            itemsize = ext.itemsize
+            windows = np.ndarray((n_out, self.taps), dtype=np.float32, buffer=ext, offset=self._position * itemsize,
+                                 strides=(self.down * itemsize, itemsize))
+            np.copyto(self._windows[:n_out], windows)
+            np.matmul(self._windows[:n_out], self._phases[0], out=out)
+        else:
+            index, phase = self._index[:n_out], self._phase[:n_out]
+            np.add(self._steps[:n_out], self._position, out=index)
+            np.remainder(index, self.up, out=phase)
+            np.floor_divide(index, self.up, out=index)
+
+            # Gather each output's K input samples and its phase's taps, then one dot product per
+            # row. take() on a sliding window view would copy the whole view, so the samples are
+            # gathered from the flat buffer with a 2-D index. Its rows are built from a pretiled
+            # 0..K-1 matrix, as a broadcasting add would allocate a ufunc buffer, and mode="clip"
+            # lets take() write straight into out.
+            gather = self._gather[:n_out]
+            np.copyto(gather, index[:, None])
+            gather += self._offsets[:n_out]
+            np.take(ext, gather, out=self._windows[:n_out], mode="clip")
+            np.take(self._phases, phase, axis=0, out=self._coefs[:n_out], mode="clip")
+            # The row sums are a product with a vector of ones; einsum() would allocate a
+            # buffer on every call even with out=
+            windows = self._windows[:n_out]
+            np.multiply(windows, self._coefs[:n_out], out=windows)
+            np.matmul(windows, self._ones, out=out)
+
+        self._position += n_out * self.down - total
+        self._history[:] = ext[n_in:]
+        return out
+
+    def _reserve(self, n_in: int):
+        """Grow the scratch arrays to hold a chunk of n_in samples"""
+        if len(self._ext) >= self.taps - 1 + n_in:
+            return
+        size = max(n_in, 2 * (len(self._ext) - self.taps + 1))
+        n_out = self.max_output(size)
+        self._ext = np.zeros(self.taps - 1 + size, dtype=np.float32)
+        self._out = np.zeros(n_out, dtype=np.float32)
+        self._windows = np.zeros((n_out, self.taps), dtype=np.float32)
+        if self.up == 1:
+            return  # integer decimation needs no gather space
+        self._steps = np.arange(n_out, dtype=np.int64) * self.down
+        self._index = np.zeros(n_out, dtype=np.int64)
+        self._phase = np.zeros(n_out, dtype=np.int64)
+        self._offsets = np.tile(np.arange(self.taps, dtype=np.int64), (n_out, 1))
+        self._gather = np.zeros((n_out, self.taps), dtype=np.int64)
+        self._coefs = np.zeros((n_out, self.taps), dtype=np.float32)
+
+class InputConverter:
+    """
+    Turn a client's native audio into 16 kHz mono 16-bit samples
+
+    Interleaved frames are decoded from the declared sample format,
+    downmixed by averaging the channels and resampled with a
+    StreamingResampler. Like the resampler it keeps state across calls and
+    reuses its buffers.
+    """
+
+    def __init__(self, sample_rate: int, channels: int = 1, sample_format: str = "s16le", out_rate: int = 16000):
+        """
+        Args:
+            sample_rate: Client sample rate in Hz
+            channels: Interleaved channels per frame
+            sample_format: "s16le" or "f32le"
+            out_rate: Rate the recognizer expects
+
+        Raises:
+            ValueError: If the format is not supported
+        """
+        if sample_format not in SAMPLE_FORMATS:
+            raise ValueError(f"Unknown sample format: {sample_format}")
+        if channels < 1:
+            raise ValueError(f"Invalid channel count: {channels}")
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_format = sample_format
+        self.dtype = SAMPLE_FORMATS[sample_format]
+        self.frame_bytes = self.dtype.itemsize * channels
+
+        # Floats are scaled to the int16 range, so both formats resample in the same units
+        self._scale = (32768.0 if self.dtype.kind == "f" else 1.0) / channels
+        self.resampler = StreamingResampler(sample_rate, out_rate) if sample_rate != out_rate else None
+
+        self._mono = np.zeros(0, dtype=np.float32)
+        self._pcm = np.zeros(0, dtype=np.int16)
+
+    def reset(self):
+        """Forget the resampler state, for a new stream"""
+        if self.resampler is not None:
+            self.resampler.reset()
+
+    def convert(self, data: bytes) -> np.ndarray:
+        """
+        Convert the next chunk of client audio
+
+        Args:
+            data: Interleaved frames in the declared format. A trailing
+                partial frame is ignored.
+
+        Returns:
+            16 kHz mono int16 samples. A view into the converter's scratch
+            space, only valid until the next call.
+        """
+        frames = len(data) // self.frame_bytes
+        interleaved = np.frombuffer(data, dtype=self.dtype, count=frames * self.channels).reshape(frames, self.channels)
+
+        if len(self._mono) < frames:
+            self._mono = np.zeros(frames, dtype=np.float32)
+        mono = self._mono[:frames]
+        # Channel by channel: a reduction over a short axis is several times slower
+        mono[:] = interleaved[:, 0]
+        for channel in range(1, self.channels):
+            mono += interleaved[:, channel]
+        mono *= self._scale
+
+        resampled = self.resampler.process(mono) if self.resampler is not None else mono
+
+        n = len(resampled)
+        if len(self._pcm) < n:
+            self._pcm = np.zeros(max(n, 2 * len(self._pcm)), dtype=np.int16)
+        np.rint(resampled, out=resampled)
+        np.clip(resampled, -32768, 32767, out=resampled)
+        pcm = self._pcm[:n]
+        pcm[:] = resampled
+        return pcm
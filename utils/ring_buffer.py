@@ -0,0 +1,124 @@
+import numpy as np
+from typing import Tuple
+
+class RingBuffer:
+    """
+    Fixed-capacity audio ring buffer backed by a preallocated NumPy array
+
+    Writes copy samples straight into the backing array and never allocate.
+    Reads return views into the backing array when the requested range is
+    contiguous, and a view into a preallocated scratch array when it wraps
+    around. Returned arrays are only valid until the next write.
+    """
+
+    def __init__(self, capacity: int, dtype=np.int16):
+        """
+        Initialize the ring buffer
+
+        Args:
+            capacity: Maximum number of samples held
+            dtype: Sample type of the backing array
+        """
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=dtype)
+        self._scratch = np.zeros(capacity, dtype=dtype)
+        self._start = 0  # index of the oldest sample
+        self._size = 0
+
+    def __len__(self) -> int:
+        """Number of samples currently buffered"""
+        return self._size
+
+    @property
+    def free(self) -> int:
+        """Number of samples that can be written without overwriting old audio"""
+        return self.capacity - self._size
+
+    def clear(self):
+        """Discard all buffered samples"""
+        self._start = 0
+        self._size = 0
+
+    def write(self, samples: np.ndarray) -> int:
+        """
+        Append samples, overwriting the oldest audio if the buffer is full
+
+        Args:
+            samples: 1-D array of samples
+
+        Returns:
+            Number of previously buffered samples that were overwritten
+        """
+        n = len(samples)
+        if n == 0:
+            return 0
+
+        # Only the newest `capacity` samples can survive
+        if n >= self.capacity:
+            dropped = self._size + n - self.capacity
+            self._data[:] = samples[n - self.capacity:]
+            self._start = 0
+            self._size = self.capacity
+            return dropped
+
+        dropped = max(0, n - self.free)
+        end = (self._start + self._size) % self.capacity
+        first = min(n, self.capacity - end)
+        self._data[end:end + first] = samples[:first]
+        if first < n:
+            self._data[:n - first] = samples[first:]
+
+        if dropped:
+            self._start = (self._start + dropped) % self.capacity
+        self._size = min(self.capacity, self._size + n)
+        return dropped
+
+    def peek(self, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        View the oldest n samples without consuming them
+
+        Args:
+            n: Number of samples to view, capped at the buffered amount
+
+        Returns:
+            Two views whose concatenation is the requested range. The second
+            is empty unless the range wraps around the end of the buffer.
+        """
+        n = min(n, self._size)
+        first = min(n, self.capacity - self._start)
+        return self._data[self._start:self._start + first], self._data[:n - first]
+
+    def consume(self, n: int):
+        """
+        Discard the oldest n samples
+
+        Args:
+            n: Number of samples to discard, capped at the buffered amount
+        """
+        n = min(n, self._size)
+        self._start = (self._start + n) % self.capacity
+        self._size -= n
+        if self._size == 0:
+            self._start = 0
+
+    def read(self, n: int) -> np.ndarray:
+        """
+        Remove and return the oldest n samples
+
+        Args:
+            n: Number of samples to read, capped at the buffered amount
+
+        Returns:
+            Contiguous array of samples, valid until the next write or read
+        """
+        head, tail = self.peek(n)
+        if len(tail):
+            out = self._scratch[:len(head) + len(tail)]
+            out[:len(head)] = head
+            out[len(head):] = tail
+        else:
+            out = head
+        self.consume(len(out))
+        return out
@@ -0,0 +1,349 @@
+import itertools
+import logging
+import threading
+import time
+import uuid
+from typing import List, Optional, Union
+
+from models.asr_model import Recognition, StreamState
+from utils.audio_processor import AudioProcessor
+from utils.command_handler import CommandHandler
+from utils.command_matcher import CommandMatcher
+from utils.commit_policy import CommitPolicy
+from utils.log_pipeline import LogSampler, session_logger
+from utils.outbound import WORD_END, build_message
+from utils.transcript_diff import TranscriptDiff
+from utils.metrics import MetricsRegistry, SessionMetrics
+
+logger = logging.getLogger(__name__)
+
+class RecognizerSession:
+    """
+    Recognition state for a single audio stream
+
+    Each session owns its own recognizer, audio processor and command handler,
+    so concurrent clients never share buffers or decoder state. The heavy Vosk
+    model itself is shared through the SpeechModel.
+
+    Commands are committed from partial results according to the
+    CommitPolicy, and a command committed early is not repeated by the final
+    result of the same utterance.
+    """
+
+    def __init__(self, speech_model, session_id: int, command_matcher: Optional[CommandMatcher] = None,
+                 log_sample_every: int = 50, commit_policy: Optional[CommitPolicy] = None):
+        """
+        Initialize a session
+
+        Args:
+            speech_model: Loaded SpeechModel used to create the recognizer
+            session_id: Identifier used in logs
+            command_matcher: Compiled command vocabulary shared between sessions
+            log_sample_every: Log one in this many transcriptions at DEBUG level
+            commit_policy: When commands in partial results are sent, defaults to CommitPolicy()
+        """
+        self.session_id = session_id
+        self.speech_model = speech_model
+        self.recognizer = speech_model.create_recognizer()
+        self.audio_processor = AudioProcessor()
+        self.command_handler = CommandHandler(command_matcher)
+        self.stream_state = StreamState()
+        self.commit_policy = commit_policy or CommitPolicy()
+        self.transcript_diff = TranscriptDiff(self.commit_policy.stable_partials, self.commit_policy.min_confidence)
+        self.metrics = SessionMetrics()
+        self.log_sampler = LogSampler(log_sample_every)
+
+        # Commands sent from partials of the current utterance, and audio fed to the recognizer
+        self.early_commands = set()
+        self.decoded_samples = 0
+        self.start_trace()
+
+    def start_trace(self):
+        """Give the session a new trace ID for the connection it is about to serve"""
+        self.trace_id = f"{self.session_id}-{uuid.uuid4().hex[:8]}"
+        self.log = session_logger(logger, self.trace_id)
+
+    def process_chunk(self, audio_bytes: Union[bytes, List[bytes]], now: Optional[float] = None) -> Optional[dict]:
+        """
+        Run one chunk of client audio through the recognition pipeline
+
+        Args:
+            audio_bytes: Raw PCM audio from the client, or a list of compressed
+                packets when the audio processor has a packet decoder
+            now: Time of the chunk in seconds, used for the command cooldown.
+                Defaults to the wall clock; offline callers pass audio time.
+
+        Returns:
+            Outbound message for the result (see utils/outbound.py), or None
+            if there is nothing to send
+        """
+        metrics = self.metrics
+        processor = self.audio_processor
+
+        # The processor only returns new audio, so each sample is decoded once
+        start = time.perf_counter()
+        processed_audio = processor.process_audio(audio_bytes)
+        metrics.audio_process.observe(time.perf_counter() - start)
+        force_final = self.commit_policy.finalize_on_silence and processor.speech_ended
+        if processed_audio is None and not force_final:
+            return None
+
+        start = time.perf_counter()
+        result = Recognition()
+        if processed_audio is not None:
+            result = self.speech_model.decode(processed_audio, self.recognizer, self.stream_state)
+            self.decoded_samples += len(processed_audio)
+        if force_final and not result.is_final:
+            # Speech has ended, so don't wait for the recognizer's own endpointing
+            result = self.speech_model.decode_final(self.recognizer, self.stream_state)
+            metrics.forced_finals += 1
+        metrics.transcribe.observe(time.perf_counter() - start)
+        return self._handle_result(result, now)
+
+    def finish(self, now: Optional[float] = None) -> List[dict]:
+        """
+        Decode the audio still buffered at the end of a stream and finish its last utterance
+
+        Args:
+            now: Time of the end of the stream, used for the command cooldown
+
+        Returns:
+            Outbound messages for the remaining results, possibly none
+        """
+        messages = []
+        tail = self.audio_processor.flush()
+        if tail is not None:
+            result = self.speech_model.decode(tail, self.recognizer, self.stream_state)
+            self.decoded_samples += len(tail)
+            messages.append(self._handle_result(result, now))
+        messages.append(self._handle_result(self.speech_model.decode_final(self.recognizer, self.stream_state), now))
+        return [message for message in messages if message]
+
+    def _handle_result(self, result: Recognition, now: Optional[float] = None) -> Optional[dict]:
+        """
+        Check a recognizer result for new commands and build its message
+
+        Args:
+            result: Decoded result
+            now: Time of the result, used for the command cooldown
+
+        Returns:
+            Outbound message, or None if the result adds nothing
+        """
+        metrics = self.metrics
+        text = result.text
+        if not text:
+            if result.is_final:
+                self._end_utterance()
+            return None
+
+        # Only words that became stable since the last result are checked for commands
+        words = result.words if result.words and len(result.words) == len(text.split()) else None
+        confidences = [word.get("conf", 1.0) for word in words] if words is not None else None
+        update = self.transcript_diff.update(text, result.is_final, confidences)
+        command = None
+        if update.has_new_tokens:
+            start = time.perf_counter()
+            command = self.command_handler.process_tokens(update.tokens, update.new_from, now)
+            metrics.process_command.observe(time.perf_counter() - start)
+
+        # A command already sent from a partial of this utterance is not repeated by its final
+        if command and result.is_final and command in self.early_commands:
+            metrics.deduplicated_commands += 1
+            self.log.debug("Final result repeats early command %s", command)
+            command = None
+        elif command and not result.is_final:
+            self.early_commands.add(command)
+            metrics.early_commands += 1
+        if result.is_final:
+            self._end_utterance()
+
+        # Vosk repeats partials while a word is spoken, those are not forwarded
+        if not update.changed and not command:
+            metrics.unchanged_partials += 1
+            return None
+
+        if result.is_final:
+            metrics.final_results += 1
+        else:
+            metrics.partial_results += 1
+
+        # Per-chunk events are sampled, and cost nothing unless DEBUG is on
+        if self.log.isEnabledFor(logging.DEBUG) and self.log_sampler.sample():
+            self.log.debug("Transcription (%s): %s", "final" if result.is_final else "partial", text)
+
+        message = build_message(result, command)
+        if command:
+            metrics.count_command(command)
+            self.log.info("Command detected: %s", command)
+            word_end = self._word_end(update.tokens, words)
+            if word_end is not None:
+                message[WORD_END] = word_end
+        return message
+
+    def _end_utterance(self):
+        """Forget the per-utterance state after a final result"""
+        self.transcript_diff.reset()
+        self.early_commands.clear()
+
+    def _word_end(self, tokens: List[str], words: Optional[List[dict]]) -> Optional[float]:
+        """
+        When the command's last word ended, relative to the arrival of the current batch
+
+        The word's end in stream audio is counted back from the newest audio of
+        the batch, which assumes the client streams in real time.
+
+        Args:
+            tokens: Stable words the command was found in
+            words: Per-word entries of the result, aligned with its text, or None
+
+        Returns:
+            Seconds after the batch's first frame arrived, or None without word timing
+        """
+        phrase = self.command_handler.last_phrase
+        if words is None or not phrase:
+            return None
+        last = phrase.split()[-1]
+        for i in range(len(tokens) - 1, -1, -1):
+            if tokens[i] == last:
+                end = words[i].get("end")
+                break
+        else:
+            return None
+        if end is None:
+            return None
+
+        processor = self.audio_processor
+        sample_rate = processor.sample_rate
+        decoded_after = self.decoded_samples / sample_rate - end
+        buffered = len(processor.ring) / sample_rate
+        return processor.last_input_seconds - decoded_after - buffered
+
+    def reset(self):
+        """Clear all per-stream state so the session can be reused"""
+        if self.recognizer is not None:
+            self.recognizer.Reset()
+        self.stream_state.reset()
+        self.transcript_diff.reset()
+        self.early_commands.clear()
+        self.decoded_samples = 0
+        self.audio_processor.reset()
+        self.command_handler.reset()
+
+class SessionPool:
+    """
+    Bounded pool of recognizer sessions sharing one loaded model
+
+    Sessions are handed out per connection and returned on disconnect, where
+    they are reset and kept for reuse so that new connections don't pay for
+    recognizer construction.
+    """
+
+    def __init__(self, speech_model, max_sessions: int = 100, preload: int = 0,
+                 command_matcher: Optional[CommandMatcher] = None, metrics: Optional[MetricsRegistry] = None,
+                 log_sample_every: int = 50, commit_policy: Optional[CommitPolicy] = None):
+        """
+        Initialize the pool
+
+        Args:
+            speech_model: Loaded SpeechModel shared by all sessions
+            max_sessions: Maximum number of sessions that may be live at once
+            preload: Number of idle sessions to create up front
+            command_matcher: Compiled command vocabulary shared by all sessions
+            metrics: Registry the sessions report to while they are handed out
+            log_sample_every: Log one in this many transcriptions per session at DEBUG level
+            commit_policy: When sessions send commands heard in partial results
+        """
+        self.speech_model = speech_model
+        self.max_sessions = max_sessions
+        self.command_matcher = command_matcher or CommandMatcher.default()
+        self.metrics = metrics or MetricsRegistry()
+        self.log_sample_every = log_sample_every
+        self.commit_policy = commit_policy or CommitPolicy()
+
+        self._idle: List[RecognizerSession] = []
+        self._active = 0
+        self.sessions_served = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+        for _ in range(min(preload, max_sessions)):
+            self._idle.append(self._new_session(next(self._ids)))
+
+        if preload:
+            logger.info(f"Preloaded {len(self._idle)} recognizer sessions")
+
+    @property
+    def active_sessions(self) -> int:
+        """Number of sessions currently handed out"""
+        return self._active
+
+    @property
+    def idle_sessions(self) -> int:
+        """Number of reset sessions waiting for reuse"""
+        return len(self._idle)
+
+    def clear(self):
+        """Drop the idle sessions, e.g. when the pool's model is being retired"""
+        with self._lock:
+            self._idle = []
+
+    def acquire(self) -> Optional[RecognizerSession]:
+        """
+        Take a session for a new connection
+
+        Returns:
+            A ready session, or None if the live session cap has been reached
+        """
+        with self._lock:
+            if self._active >= self.max_sessions:
+                logger.warning(f"Session limit reached ({self.max_sessions}), rejecting connection")
+                return None
+            self._active += 1
+            self.sessions_served += 1
+            session = self._idle.pop() if self._idle else None
+            if session is None:
+                session_id = next(self._ids)
+
+        if session is None:
+            # Build outside the lock, recognizer construction is the slow part
+            try:
+                session = self._new_session(session_id)
+            except Exception:
+                with self._lock:
+                    self._active -= 1
+                raise
+
+        else:
+            session.start_trace()
+
+        self.metrics.register(session.metrics)
+        return session
+
+    def _new_session(self, session_id: int) -> RecognizerSession:
+        """Build a session with the pool's shared settings"""
+        return RecognizerSession(self.speech_model, session_id, self.command_matcher, self.log_sample_every,
+                                 self.commit_policy)
+
+    def release(self, session: RecognizerSession):
+        """
+        Return a session to the pool after its connection has closed
+
+        Args:
+            session: Session previously returned by acquire()
+        """
+        # Keep the session's counts in the totals and start it afresh
+        self.metrics.retire(session.metrics)
+        session.metrics = SessionMetrics()
+
+        try:
+            session.reset()
+            reusable = True
+        except Exception as e:
+            logger.error(f"Error resetting session {session.session_id}: {e}")
+            reusable = False
+
+        with self._lock:
+            self._active -= 1
+            if reusable and len(self._idle) + self._active < self.max_sessions:
+                self._idle.append(session)
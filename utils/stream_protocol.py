@@ -0,0 +1,288 @@
+import logging
+import struct
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+from utils import fast_json
+from utils.resampler import SAMPLE_FORMATS
+
+logger = logging.getLogger(__name__)
+
+# Header of a framed audio message: sequence number (uint32) and client
+# capture time in milliseconds since the epoch (float64), little-endian
+FRAME_HEADER = struct.Struct("<Id")
+
+# Audio framings a client can declare in its hello
+FRAMING_RAW = "raw"        # bare 16-bit PCM, what clients without a hello send
+FRAMING_SEQ_TS = "seq-ts"  # FRAME_HEADER followed by 16-bit PCM
+FRAMINGS = (FRAMING_RAW, FRAMING_SEQ_TS)
+
+# Audio encodings, chosen from the client's list in order of its preference
+CODEC_PCM = "pcm"    # 16 kHz mono 16-bit PCM
+CODEC_OPUS = "opus"  # one Opus packet per binary message
+
+# Text message type a client sends to end its stream gracefully: the server decodes the
+# audio it still holds, sends the last results and closes the connection
+END_MESSAGE = "end"
+
+# Format the recognizer consumes; PCM in any other declared format is converted on the server
+SAMPLE_RATE = 16000
+CHANNELS = 1
+SAMPLE_FORMAT = "s16le"
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 192000
+MAX_CHANNELS = 8
+
+class StreamConfig:
+    """
+    How a client's audio stream is framed, as declared in its hello message
+
+    A client may open with a text message such as
+
+        {"type": "hello", "framing": "seq-ts", "codecs": ["opus", "pcm"],
+         "frame_ms": 20, "client_vad": true,
+         "sample_rate": 48000, "channels": 1, "sample_format": "s16le"}
+
+    PCM may be sent at the client's native rate, channel count and sample
+    format (interleaved "s16le" or "f32le"); the server converts it to
+    16 kHz mono. Opus always decodes to 16 kHz mono, so the declared format
+    does not apply to it. Clients that start sending audio right away get
+    raw framing and 16 kHz mono 16-bit PCM.
+    """
+
+    def __init__(self, framing: str = FRAMING_RAW, codec: str = CODEC_PCM, frame_ms: Optional[float] = None,
+                 client_vad: bool = False, sample_rate: int = SAMPLE_RATE, channels: int = CHANNELS,
+                 sample_format: str = SAMPLE_FORMAT):
+        """
+        Args:
+            framing: "raw" or "seq-ts"
+            codec: "pcm" or "opus"
+            frame_ms: Duration of each client frame, informational
+            client_vad: Whether the client leaves out silence itself
+            sample_rate: PCM sample rate in Hz
+            channels: Interleaved PCM channels
+            sample_format: "s16le" or "f32le"
+
+        Raises:
+            ValueError: If a field is out of range
+        """
+        if framing not in FRAMINGS:
+            raise ValueError(f"Unknown framing: {framing}")
+        if codec == CODEC_OPUS:
+            sample_rate, channels, sample_format = SAMPLE_RATE, CHANNELS, SAMPLE_FORMAT
+        if not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+            raise ValueError(f"Sample rate {sample_rate} outside {MIN_SAMPLE_RATE}-{MAX_SAMPLE_RATE} Hz")
+        if not 1 <= channels <= MAX_CHANNELS:
+            raise ValueError(f"Channel count {channels} outside 1-{MAX_CHANNELS}")
+        if sample_format not in SAMPLE_FORMATS:
+            raise ValueError(f"Unknown sample format: {sample_format}, expected one of {list(SAMPLE_FORMATS)}")
+        self.framing = framing
+        self.codec = codec
+        self.frame_ms = frame_ms
+        self.client_vad = client_vad
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_format = sample_format
+
+    @property
+    def framed(self) -> bool:
+        """Whether every audio message starts with FRAME_HEADER"""
+        return self.framing == FRAMING_SEQ_TS
+
+    @property
+    def frame_bytes(self) -> int:
+        """Bytes per interleaved PCM frame, one sample of every channel"""
+        return SAMPLE_FORMATS[self.sample_format].itemsize * self.channels
+
+    @property
+    def bytes_per_second(self) -> int:
+        """PCM data rate of the declared format"""
+        return self.frame_bytes * self.sample_rate
+
+    @property
+    def native(self) -> bool:
+        """Whether the PCM is already in the recognizer's format"""
+        return (self.sample_rate, self.channels, self.sample_format) == (SAMPLE_RATE, CHANNELS, SAMPLE_FORMAT)
+
+    @classmethod
+    def from_hello(cls, text: str, codecs=(CODEC_PCM,)) -> "StreamConfig":
+        """
+        Parse a client hello
+
+        Args:
+            text: JSON text message from the client
+            codecs: Codecs this server can decode
+
+        Returns:
+            The declared stream configuration, with the first codec in the
+            client's "codecs" list that the server supports
+
+        Raises:
+            ValueError: If the message is not a valid hello or no codec is shared
+        """
+        try:
+            hello = fast_json.loads(text)
+        except Exception as e:
+            raise ValueError(f"Hello is not JSON: {e}")
+        if not isinstance(hello, dict) or hello.get("type") != "hello":
+            raise ValueError("Expected a hello message")
+        offered = hello.get("codecs") or [hello.get("codec", CODEC_PCM)]
+        if not isinstance(offered, list) or not all(isinstance(c, str) for c in offered):
+            raise ValueError(f"Invalid codecs in hello: {offered!r}")
+        codec = next((c for c in offered if c in codecs), None)
+        if codec is None:
+            raise ValueError(f"No supported codec in {offered}, server accepts {list(codecs)}")
+        for field in ("framing", "sample_format"):
+            if field in hello and not isinstance(hello[field], str):
+                raise ValueError(f"Invalid {field} in hello: {hello[field]!r}")
+        frame_ms = hello.get("frame_ms")
+        try:
+            frame_ms = float(frame_ms) if frame_ms is not None else None
+            sample_rate = int(hello.get("sample_rate", SAMPLE_RATE))
+            channels = int(hello.get("channels", CHANNELS))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid audio format in hello: {e}")
+        return cls(
+            framing=hello.get("framing", FRAMING_RAW),
+            codec=codec,
+            frame_ms=frame_ms,
+            client_vad=bool(hello.get("client_vad", False)),
+            sample_rate=sample_rate,
+            channels=channels,
+            sample_format=hello.get("sample_format", SAMPLE_FORMAT),
+        )
+
+    def as_dict(self) -> dict:
+        """Accepted configuration, echoed back in the server's hello"""
+        return {"framing": self.framing, "codec": self.codec, "frame_ms": self.frame_ms,
+                "client_vad": self.client_vad, "sample_rate": self.sample_rate, "channels": self.channels,
+                "sample_format": self.sample_format}
+
+def is_end_message(text: str) -> bool:
+    """Whether a text message from the client is {"type": "end"}"""
+    try:
+        message = fast_json.loads(text)
+    except Exception:
+        return False
+    return isinstance(message, dict) and message.get("type") == END_MESSAGE
+
+def split_frame(data: bytes) -> Tuple[int, float, memoryview]:
+    """
+    Separate a framed audio message into its header fields and audio
+
+    Args:
+        data: Binary message in "seq-ts" framing
+
+    Returns:
+        Sequence number, client capture time in ms since the epoch, and a
+        view of the audio payload
+
+    Raises:
+        ValueError: If the message is shorter than the header
+    """
+    if len(data) < FRAME_HEADER.size:
+        raise ValueError(f"Frame of {len(data)} bytes is shorter than its header")
+    seq, sent_ms = FRAME_HEADER.unpack_from(data)
+    return seq, sent_ms, memoryview(data)[FRAME_HEADER.size:]
+
+class ArrivalTracker:
+    """
+    Network jitter and delay of one client's framed audio
+
+    Client and server clocks are not synchronized, so absolute one-way delay
+    can't be known. Each frame's transit time (arrival minus client
+    timestamp) includes the unknown clock offset, but the difference to the
+    session's fastest frame does not: that excess is the queueing and
+    network delay the frame picked up. Jitter is the RFC 3550 interarrival
+    jitter, a smoothed mean of the change in transit between frames.
+
+    The capture time of recent frames is kept, on the server's monotonic
+    clock, so results can be timed end to end. The estimate treats the
+    fastest frame as having had no delay, so it is a lower bound.
+    """
+
+    def __init__(self, metrics=None, history: int = 256):
+        """
+        Args:
+            metrics: Optional SessionMetrics for delay histograms and sequence counters
+            history: Number of recent frames whose capture time is kept
+        """
+        self.metrics = metrics
+        self.frames = 0
+        self.jitter = 0.0
+        self.max_delay = 0.0
+        self.gaps = 0
+        self.reordered = 0
+
+        self._min_transit: Optional[float] = None
+        self._last_transit: Optional[float] = None
+        self._last_seq: Optional[int] = None
+        self._captured = np.zeros(history, dtype=np.float64)
+        self._seqs = np.full(history, -1, dtype=np.int64)
+
+    def observe(self, seq: int, sent_ms: float):
+        """
+        Record the arrival of one framed message
+
+        Args:
+            seq: Frame sequence number
+            sent_ms: Client timestamp from the header, ms since the epoch
+        """
+        now = time.monotonic()
+        transit = time.time() - sent_ms / 1000
+        self.frames += 1
+
+        if self._min_transit is None or transit < self._min_transit:
+            self._min_transit = transit
+        delay = transit - self._min_transit
+        if delay > self.max_delay:
+            self.max_delay = delay
+
+        if self._last_transit is not None:
+            self.jitter += (abs(transit - self._last_transit) - self.jitter) / 16
+        self._last_transit = transit
+
+        # Clients only number the frames they send, so a gap means frames went missing
+        if self._last_seq is not None:
+            if seq > self._last_seq + 1:
+                self.gaps += seq - self._last_seq - 1
+            elif seq <= self._last_seq:
+                self.reordered += 1
+        if self._last_seq is None or seq > self._last_seq:
+            self._last_seq = seq
+
+        slot = seq % len(self._seqs)
+        self._seqs[slot] = seq
+        self._captured[slot] = now - delay
+
+        if self.metrics is not None:
+            self.metrics.network_delay.observe(delay)
+            self.metrics.frame_gaps = self.gaps
+            self.metrics.frames_reordered = self.reordered
+
+    def captured_at(self, seq: int) -> Optional[float]:
+        """
+        Estimated capture time of a recent frame
+
+        Args:
+            seq: Frame sequence number
+
+        Returns:
+            time.monotonic() value, or None if the frame is no longer remembered
+        """
+        slot = seq % len(self._seqs)
+        if self._seqs[slot] != seq:
+            return None
+        return float(self._captured[slot])
+
+    def as_dict(self) -> dict:
+        """Summary for the end-of-session log"""
+        return {
+            "frames": self.frames,
+            "jitter_ms": round(self.jitter * 1000, 2),
+            "max_delay_ms": round(self.max_delay * 1000, 2),
+            "gaps": self.gaps,
+            "reordered": self.reordered,
+        }
@@ -0,0 +1,101 @@
+from collections import deque
+from typing import List, NamedTuple, Optional, Sequence
+
+class TranscriptUpdate(NamedTuple):
+    """What changed between two successive recognizer results"""
+
+    changed: bool       # whether the client should be sent this result
+    tokens: List[str]   # words that are stable so far
+    new_from: int       # index in tokens of the first word not yet checked for commands
+
+    @property
+    def has_new_tokens(self) -> bool:
+        """Whether there are stable words that have not been checked yet"""
+        return len(self.tokens) > self.new_from
+
+class TranscriptDiff:
+    """
+    Per-session diff of successive recognizer results
+
+    Vosk repeats the same partial hypothesis for as long as a word is being
+    spoken, and may still revise its last words. A partial is reported as
+    changed only when its text differs from the previous one. Words count as
+    stable once stable_partials consecutive partials agree on them (their
+    common prefix), or, with min_confidence, once the recognizer is confident
+    enough in them and every word before them is stable. Each stable word is
+    handed out for command matching exactly once. A final result makes all of
+    its words stable and starts a new utterance.
+    """
+
+    def __init__(self, stable_partials: int = 2, min_confidence: Optional[float] = None):
+        """
+        Args:
+            stable_partials: Consecutive partials that must agree on a word
+            min_confidence: Word confidence that makes a word stable on its own, or None
+        """
+        self.stable_partials = stable_partials
+        self.min_confidence = min_confidence
+        self._last_text = None
+        self._recent = deque(maxlen=stable_partials)  # token lists of the latest partials
+        self._checked: List[str] = []  # stable words already handed out
+
+    def reset(self):
+        """Forget the current utterance"""
+        self._last_text = None
+        self._recent.clear()
+        self._checked = []
+
+    def update(self, text: str, is_final: bool, confidences: Optional[Sequence[float]] = None) -> TranscriptUpdate:
+        """
+        Compare a result with the previous ones
+
+        Args:
+            text: Cleaned recognizer text
+            is_final: Whether the recognizer finished the utterance
+            confidences: Per-word confidence aligned with the words of text, if known
+
+        Returns:
+            TranscriptUpdate with the stable words and where the unchecked ones start
+        """
+        tokens = text.split()
+        checked = self._checked
+
+        if is_final:
+            # Skip words already checked as long as the final agrees with them
+            new_from = len(checked) if tokens[:len(checked)] == checked else 0
+            self.reset()
+            return TranscriptUpdate(True, tokens, new_from)
+
+        changed = text != self._last_text
+        self._last_text = text
+        self._recent.append(tokens)
+
+        # Words every one of the last stable_partials partials agrees on
+        if len(self._recent) < self.stable_partials:
+            stable = []
+        else:
+            stable = tokens
+            for previous in self._recent:
+                if previous is not tokens:
+                    stable = _common_prefix(previous, stable)
+
+        # Confident words right after the stable ones are committed early
+        if self.min_confidence is not None and confidences is not None:
+            n = len(stable)
+            while n < len(tokens) and confidences[n] >= self.min_confidence:
+                n += 1
+            stable = tokens[:n]
+
+        # A revision of already-checked words restarts checking from the divergence
+        new_from = len(_common_prefix(checked, stable))
+        self._checked = stable
+        return TranscriptUpdate(changed, stable, new_from)
+
+def _common_prefix(a: List[str], b: List[str]) -> List[str]:
+    """Longest shared leading run of words"""
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return b[:n]
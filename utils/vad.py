@@ -0,0 +1,168 @@
+import logging
+from typing import Optional
+
+import numpy as np
+
+from utils.ring_buffer import RingBuffer
+
+try:
+    import webrtcvad
+except ImportError:  # pragma: no cover - depends on the environment
+    webrtcvad = None
+
+logger = logging.getLogger(__name__)
+
+class VoiceActivityDetector:
+    """
+    Streaming voice activity gate in front of the recognizer
+
+    Audio is split into fixed frames and classified with WebRTC VAD (or a
+    simple energy threshold if webrtcvad is not installed). Decisions are
+    smoothed with hysteresis: speech starts once enough of the recent frames
+    are voiced and ends only after a hangover of consecutive unvoiced frames.
+    When speech starts, the buffered pre-roll is forwarded too so word onsets
+    are not clipped.
+    """
+
+    def __init__(self, sample_rate: int = 16000, frame_duration_ms: int = 30, aggressiveness: int = 2,
+                 onset_frames: int = 3, onset_window: int = 5, hangover_ms: int = 300, preroll_ms: int = 300,
+                 energy_threshold: float = 300.0):
+        """
+        Initialize the detector
+
+        Args:
+            sample_rate: Sample rate of the incoming audio (8, 16, 32 or 48 kHz)
+            frame_duration_ms: Frame length for classification (10, 20 or 30 ms)
+            aggressiveness: WebRTC VAD mode from 0 (least) to 3 (most aggressive filtering)
+            onset_frames: Voiced frames needed within onset_window to start speech
+            onset_window: Number of most recent frames considered for onset
+            hangover_ms: Unvoiced audio needed to end speech
+            preroll_ms: Audio kept from before the onset and forwarded with it
+            energy_threshold: Mean absolute amplitude treated as speech when webrtcvad is unavailable
+        """
+        self.sample_rate = sample_rate
+        self.frame_samples = sample_rate * frame_duration_ms // 1000
+        self.onset_frames = onset_frames
+        self.onset_window = onset_window
+        self.hangover_frames = max(1, hangover_ms // frame_duration_ms)
+        self.energy_threshold = energy_threshold
+
+        if webrtcvad is not None:
+            self._vad = webrtcvad.Vad(aggressiveness)
+        else:
+            logger.warning("webrtcvad not installed, falling back to energy-based voice detection")
+            self._vad = None
+
+        # Partial frame left over from the previous call
+        self._remainder = np.zeros(self.frame_samples, dtype=np.int16)
+        self._remainder_len = 0
+
+        # Recent unvoiced audio, forwarded when speech starts
+        self._preroll = RingBuffer(max(self.frame_samples, sample_rate * preroll_ms // 1000))
+
+        # Output space for the speech forwarded by one call, grown on demand
+        self._out = np.zeros(sample_rate, dtype=np.int16)
+
+        self.reset()
+
+    def reset(self):
+        """Forget all state so the detector can serve a new stream"""
+        self._remainder_len = 0
+        self._preroll.clear()
+        self._recent = 0  # bitmask of the last onset_window decisions
+        self._silent_run = 0
+        self.in_speech = False
+        self.speech_ended = False
+        self.total_frames = 0
+        self.speech_frames = 0
+
+    @property
+    def speech_ratio(self) -> float:
+        """Fraction of frames forwarded as speech so far"""
+        return self.speech_frames / self.total_frames if self.total_frames else 0.0
+
+    def process(self, samples: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Classify new audio and return the part that should be decoded
+
+        Args:
+            samples: New 16-bit PCM samples
+
+        Returns:
+            Speech audio (including pre-roll and hangover) as a view valid until
+            the next call, or None if nothing should be forwarded. After the
+            call, speech_ended is True if a speech segment closed during it.
+        """
+        self.speech_ended = False
+        out_len = 0
+
+        pos = 0
+        n = len(samples)
+
+        # Complete the frame left over from the previous call
+        if self._remainder_len:
+            take = min(self.frame_samples - self._remainder_len, n)
+            self._remainder[self._remainder_len:self._remainder_len + take] = samples[:take]
+            self._remainder_len += take
+            pos = take
+            if self._remainder_len == self.frame_samples:
+                out_len = self._frame(self._remainder, out_len)
+                self._remainder_len = 0
+
+        while pos + self.frame_samples <= n:
+            out_len = self._frame(samples[pos:pos + self.frame_samples], out_len)
+            pos += self.frame_samples
+
+        # Keep the tail for the next call
+        if pos < n:
+            tail = n - pos
+            self._remainder[:tail] = samples[pos:]
+            self._remainder_len = tail
+
+        return self._out[:out_len] if out_len else None
+
+    def _is_speech(self, frame: np.ndarray) -> bool:
+        """Classify a single frame"""
+        if self._vad is not None:
+            return self._vad.is_speech(frame.tobytes(), self.sample_rate)
+        return float(np.abs(frame.astype(np.int32)).mean()) >= self.energy_threshold
+
+    def _frame(self, frame: np.ndarray, out_len: int) -> int:
+        """Run one frame through the smoothing state machine, appending forwarded audio to the output"""
+        voiced = self._is_speech(frame)
+        self.total_frames += 1
+        self._recent = ((self._recent << 1) | int(voiced)) & ((1 << self.onset_window) - 1)
+
+        if not self.in_speech:
+            if bin(self._recent).count("1") >= self.onset_frames:
+                # Speech onset: forward the pre-roll, which includes the frames that triggered it
+                self.in_speech = True
+                self._silent_run = 0
+                head, tail = self._preroll.peek(len(self._preroll))
+                out_len = self._append(head, out_len)
+                out_len = self._append(tail, out_len)
+                self.speech_frames += (len(head) + len(tail)) // self.frame_samples
+                self._preroll.clear()
+            else:
+                self._preroll.write(frame)
+                return out_len
+
+        # In speech: forward everything until the hangover runs out
+        self.speech_frames += 1
+        out_len = self._append(frame, out_len)
+        self._silent_run = 0 if voiced else self._silent_run + 1
+        if self._silent_run >= self.hangover_frames:
+            self.in_speech = False
+            self.speech_ended = True
+            self._recent = 0
+        return out_len
+
+    def _append(self, audio: np.ndarray, out_len: int) -> int:
+        """Copy audio into the output buffer, growing it if needed"""
+        end = out_len + len(audio)
+        if end > len(self._out):
+            grown = np.zeros(max(end, 2 * len(self._out)), dtype=np.int16)
+            grown[:out_len] = self._out[:out_len]
+            self._out = grown
+        self._out[out_len:end] = audio
+        return end
@@ -0,0 +1,125 @@
+import mmap
+import os
+import time
+from typing import List, Optional
+
+import numpy as np
+
+# Columns of a worker's row, all stored as float64
+FIELDS = (
+    "pid",
+    "core",               # CPU the worker is pinned to, -1 if not pinned
+    "started_at",         # time.time() the worker started
+    "heartbeat_at",       # time.time() of the last report
+    "active_sessions",
+    "max_sessions",
+    "decode_queue_depth",
+    "sessions_served",
+    "rss_bytes",
+    "pss_bytes",          # proportional share, counts pages shared with other workers once
+)
+
+_COLUMN = {name: i for i, name in enumerate(FIELDS)}
+
+class WorkerBoard:
+    """
+    Health and load of every worker process, in shared memory
+
+    The table lives in an anonymous shared mapping created by the launcher
+    before it forks, so every worker sees the same memory. Each worker only
+    writes its own row, which is why no locking is needed; a reader may see
+    a row that is mid-update, which is fine for monitoring.
+    """
+
+    def __init__(self, workers: int):
+        """
+        Args:
+            workers: Number of worker rows
+        """
+        self.workers = workers
+        self._mm = mmap.mmap(-1, workers * len(FIELDS) * 8)
+        self._table = np.ndarray((workers, len(FIELDS)), dtype=np.float64, buffer=self._mm)
+        self._table[:] = 0
+
+    def update(self, index: int, **values: float):
+        """
+        Write some fields of one worker's row
+
+        Args:
+            index: Worker index
+            **values: Field names from FIELDS and their values
+        """
+        row = self._table[index]
+        for name, value in values.items():
+            row[_COLUMN[name]] = value
+
+    def clear(self, index: int):
+        """Blank a worker's row, e.g. after it exited"""
+        self._table[index] = 0
+
+    def snapshot(self, stale_after: float = 5.0) -> List[dict]:
+        """
+        Read all rows
+
+        Args:
+            stale_after: A worker whose last heartbeat is older than this is
+                reported as unhealthy
+
+        Returns:
+            One dict per worker with its fields, "worker" index and "healthy"
+        """
+        now = time.time()
+        rows = []
+        for index, row in enumerate(self._table.copy()):
+            entry = {"worker": index}
+            for name, value in zip(FIELDS, row):
+                entry[name] = float(value) if name.endswith("_at") else int(value)
+            entry["healthy"] = entry["pid"] > 0 and now - entry["heartbeat_at"] < stale_after
+            rows.append(entry)
+        return rows
+
+def memory_usage(include_pss: bool = False) -> dict:
+    """
+    Resident memory of this process, read from /proc on Linux
+
+    Args:
+        include_pss: Also read the proportional set size, which is slower
+
+    Returns:
+        {"rss_bytes": ..., "pss_bytes": ...}, zero where unavailable
+    """
+    usage = {"rss_bytes": 0, "pss_bytes": 0}
+    try:
+        with open("/proc/self/statm") as f:
+            usage["rss_bytes"] = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, IndexError, ValueError):
+        pass
+    if include_pss:
+        usage["pss_bytes"] = _read_pss()
+    return usage
+
+def _read_pss() -> int:
+    """Proportional set size from smaps_rollup, in bytes"""
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, IndexError, ValueError):
+        pass
+    return 0
+
+def pin_to_core(core: Optional[int]) -> bool:
+    """
+    Restrict this process to one CPU
+
+    Args:
+        core: CPU number, or None to leave the affinity alone
+
+    Returns:
+        True if the process was pinned
+    """
+    if core is None or not hasattr(os, "sched_setaffinity"):
+        return False
+    os.sched_setaffinity(0, {core})
+    return True